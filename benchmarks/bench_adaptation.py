@@ -0,0 +1,56 @@
+"""Wall time of few-shot adaptation to a new word and the size of its delta checkpoint.
+
+Uses a randomly initialized model, random word vectors and synthetic images
+(no dataset or GloVe download); the timing does not depend on the weights:
+
+    python benchmarks/bench_adaptation.py --shots 5 --steps 300 --threads 4
+"""
+
+import argparse
+import io
+import os
+import sys
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from cada_vqvae.adaptation import adapt_to_word, encode_images, save_delta
+from cada_vqvae.distributed import SyntheticImages
+from cada_vqvae.embeddings import FASHION_MNIST_CLASSES, ClassEmbeddingTable
+from cada_vqvae.models import CADA_VAE
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shots", type=int, default=5)
+    parser.add_argument("--steps", type=int, default=300)
+    parser.add_argument("--replay-per-class", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=torch.get_num_threads())
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    rng = np.random.default_rng(0)
+    model = CADA_VAE(20, 512, 100)
+    class_embeddings = ClassEmbeddingTable(
+        FASHION_MNIST_CLASSES, {word: rng.standard_normal(100).astype(np.float32) for word in FASHION_MNIST_CLASSES})
+    replay_images = SyntheticImages(args.replay_per_class * 10)
+    replay = encode_images(model, replay_images.data, replay_images.targets)
+    support = SyntheticImages(args.shots, num_classes=1, seed=1).data
+    vector = rng.standard_normal(100).astype(np.float32)
+
+    result = adapt_to_word(model, "jacket", vector, support, class_embeddings, replay, steps=args.steps)
+    delta = io.BytesIO()
+    save_delta(model, delta, {"jacket": vector})
+    full = io.BytesIO()
+    torch.save(model.state_dict(), full)
+
+    print(f"adapt {args.shots} shots, {args.steps} steps, {args.threads} threads: {result.seconds:.2f} s "
+          f"({result.seconds / args.steps * 1e3:.2f} ms/step)")
+    print(f"delta checkpoint {delta.tell() / 1024:.1f} KiB vs full model {full.tell() / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
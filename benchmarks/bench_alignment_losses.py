@@ -0,0 +1,105 @@
+"""Blocked mmd_loss/contrastive_loss vs. the meta-learning notebook's dense versions.
+
+Checks that the biased MMD and the contrastive loss match the notebook on a
+small batch, then times forward + backward per batch size. On CUDA it also
+reports the peak memory of each step; the dense versions are skipped above
+``--dense-limit`` samples.
+
+    python benchmarks/bench_alignment_losses.py --batch-sizes 256 1024 4096 16384 --block-size 1024
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import torch
+import torch.nn.functional as F
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from cada_vqvae.losses import contrastive_loss, mmd_loss
+
+
+def notebook_mmd_loss(x_samples, y_samples, gamma=1.0):
+    def rbf_kernel(x, y, gamma):
+        diff = x.unsqueeze(1) - y.unsqueeze(0)
+        return torch.exp(-gamma * torch.sum(diff ** 2, dim=2))
+
+    K_xx = rbf_kernel(x_samples, x_samples, gamma)
+    K_yy = rbf_kernel(y_samples, y_samples, gamma)
+    K_xy = rbf_kernel(x_samples, y_samples, gamma)
+    return K_xx.mean() + K_yy.mean() - 2 * K_xy.mean()
+
+
+def notebook_contrastive_loss(features, labels, temperature=0.5):
+    batch_size = features.shape[0]
+    features = F.normalize(features, dim=1)
+    similarity_matrix = torch.matmul(features, features.T) / temperature
+    labels = labels.view(-1, 1)
+    positive_mask = torch.eq(labels, labels.T).float()
+    mask_no_diag = torch.ones_like(similarity_matrix) - torch.eye(batch_size, device=features.device)
+    positive_mask = positive_mask * mask_no_diag
+    logits_max, _ = torch.max(similarity_matrix, dim=1, keepdim=True)
+    logits = similarity_matrix - logits_max.detach()
+    exp_logits = torch.exp(logits) * mask_no_diag
+    log_prob = logits - torch.log(exp_logits.sum(1, keepdim=True))
+    mean_log_prob_pos = (positive_mask * log_prob).sum(1) / (positive_mask.sum(1) + 1e-8)
+    return -mean_log_prob_pos.mean()
+
+
+def measure(fn, device, steps):
+    """Seconds per forward + backward and peak CUDA memory in bytes (``None`` on the CPU)."""
+    fn().backward()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+    start = time.perf_counter()
+    for _ in range(steps):
+        fn().backward()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    seconds = (time.perf_counter() - start) / steps
+    return seconds, torch.cuda.max_memory_allocated() if device.type == "cuda" else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[256, 1024, 4096])
+    parser.add_argument("--latent-size", type=int, default=20)
+    parser.add_argument("--block-size", type=int, default=1024)
+    parser.add_argument("--dense-limit", type=int, default=4096, help="largest batch run through the dense versions")
+    parser.add_argument("--steps", type=int, default=5)
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    torch.manual_seed(0)
+    x = torch.randn(300, args.latent_size, device=device)
+    y = torch.randn(300, args.latent_size, device=device) + 0.5
+    labels = torch.randint(0, 10, (300,), device=device)
+    assert torch.allclose(mmd_loss(x, y, block_size=64), notebook_mmd_loss(x, y), atol=1e-5)
+    assert torch.allclose(contrastive_loss(x, labels, block_size=64), notebook_contrastive_loss(x, labels), atol=1e-4)
+
+    print(f"device={device} latent_size={args.latent_size} block_size={args.block_size}")
+    for batch_size in args.batch_sizes:
+        x = torch.randn(batch_size, args.latent_size, device=device, requires_grad=True)
+        y = torch.randn(batch_size, args.latent_size, device=device, requires_grad=True)
+        labels = torch.randint(0, 10, (batch_size,), device=device)
+        cases = {
+            "mmd biased (blocked)": lambda: mmd_loss(x, y, block_size=args.block_size),
+            "mmd unbiased (blocked)": lambda: mmd_loss(x, y, estimator="unbiased", block_size=args.block_size),
+            "mmd linear": lambda: mmd_loss(x, y, estimator="linear"),
+            "contrastive (blocked)": lambda: contrastive_loss(x, labels, block_size=args.block_size),
+        }
+        if batch_size <= args.dense_limit:
+            cases["mmd (notebook)"] = lambda: notebook_mmd_loss(x, y)
+            cases["contrastive (notebook)"] = lambda: notebook_contrastive_loss(x, labels)
+        for name, fn in cases.items():
+            seconds, peak = measure(fn, device, args.steps)
+            memory = f"  peak {peak / 2**20:8.1f} MiB" if peak is not None else ""
+            print(f"B={batch_size:<6} {name:<24} {seconds * 1e3:9.2f} ms{memory}")
+
+
+if __name__ == "__main__":
+    main()
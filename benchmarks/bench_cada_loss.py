@@ -0,0 +1,90 @@
+"""Fused CADALoss vs. the original cada_vae_loss (forward + backward + readback).
+
+    python benchmarks/bench_cada_loss.py --batch-size 64 --compile
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from cada_vqvae.losses import CADALoss, cada_vae_loss
+
+
+def make_outputs(batch_size, latent_size, device):
+    def leaf(*shape):
+        return torch.randn(*shape, device=device, requires_grad=True)
+    x = torch.rand(batch_size, 28 * 28, device=device)
+    c = torch.rand(batch_size, 100, device=device)
+    outputs = (leaf(batch_size, 28 * 28), leaf(batch_size, 100), leaf(batch_size, latent_size),
+               leaf(batch_size, latent_size), leaf(batch_size, latent_size), leaf(batch_size, latent_size),
+               leaf(batch_size, latent_size), leaf(()), leaf(()))
+    return outputs, x, c
+
+
+def legacy_step(outputs, x, c, beta, gamma, delta):
+    recon_x, recon_c, mu_x, logvar_x, mu_c, logvar_c, z_e, quantization_loss, commitment_loss = outputs
+    losses = cada_vae_loss(recon_x, x, recon_c, c, recon_x, recon_c, mu_x, logvar_x, z_e,
+                           quantization_loss, commitment_loss, beta, gamma, delta)
+    losses[0].backward()
+    return [loss.item() for loss in losses]
+
+
+def fused_step(criterion, outputs, x, c):
+    losses = criterion(outputs, x, c)
+    losses[0].backward()
+    return losses.tolist()
+
+
+def time_per_step(fn, device, steps):
+    for _ in range(10):
+        fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(steps):
+        fn()
+    return (time.perf_counter() - start) / steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--latent-size", type=int, default=20)
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--compile", action="store_true", help="also time a torch.compile'd CADALoss")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    torch.manual_seed(0)
+    beta, gamma, delta = 1.0, 2.0, 1.0
+    outputs, x, c = make_outputs(args.batch_size, args.latent_size, device)
+    criterion = CADALoss(beta, gamma, delta, cross_reconstruction=False)
+
+    # Same-modality mode must reproduce the original function
+    legacy = torch.tensor(legacy_step(outputs, x, c, beta, gamma, delta))
+    fused = torch.tensor(fused_step(criterion, outputs, x, c))
+    assert torch.allclose(legacy, fused, rtol=1e-4), (legacy, fused)
+
+    results = {
+        "cada_vae_loss + 8x .item()": time_per_step(lambda: legacy_step(outputs, x, c, beta, gamma, delta),
+                                                    device, args.steps),
+        "CADALoss + 1x .tolist()": time_per_step(lambda: fused_step(criterion, outputs, x, c), device, args.steps),
+    }
+    if args.compile:
+        compiled = torch.compile(criterion)
+        results["compiled CADALoss"] = time_per_step(lambda: fused_step(compiled, outputs, x, c), device, args.steps)
+
+    print(f"device={device} batch_size={args.batch_size}")
+    baseline = next(iter(results.values()))
+    for name, seconds in results.items():
+        print(f"{name:<28} {seconds * 1e6:9.1f} us/step  ({baseline / seconds:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
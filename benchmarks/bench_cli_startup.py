@@ -0,0 +1,80 @@
+"""Startup time of ``python -m cada_vqvae`` and the modules each subcommand pulls in.
+
+Times fresh interpreters (median of ``--repeats``) for ``import cada_vqvae``,
+``--help`` and ``generate`` from an exported generator, which is written
+first with random weights. Also checks that the ``generate`` path never
+imports the training-only dependencies:
+
+    python benchmarks/bench_cli_startup.py --repeats 10
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+HEAVY_MODULES = ("torchvision", "gensim", "sklearn", "matplotlib", "cv2")
+
+# Runs the CLI in-process, then reports which heavy modules got imported
+_CHECK_IMPORTS = """
+import sys
+from cada_vqvae.cli import main
+main(sys.argv[1:])
+print("HEAVY:" + ",".join(name for name in {heavy!r} if name in sys.modules))
+"""
+
+
+def _run(args, env):
+    return subprocess.run([sys.executable] + args, cwd=ROOT, env=env, check=True, capture_output=True, text=True)
+
+
+def startup_time(args, env, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        _run(args, env)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--samples", type=int, default=1, help="images per word in the generate run")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(ROOT))
+    with tempfile.TemporaryDirectory() as tmp:
+        generator = os.path.join(tmp, "generator.pt")
+        # Random word vectors through the Python API, so the export needs no GloVe download
+        _run(["-c", "import numpy as np\n"
+                    "from cada_vqvae.export import export_generator\n"
+                    "from cada_vqvae.models import CADA_VAE\n"
+                    "words = ['dress', 'boot']\n"
+                    "vectors = {w: np.random.default_rng(0).standard_normal(100).astype(np.float32) for w in words}\n"
+                    f"export_generator(CADA_VAE(20, 512, 100), words, vectors, {generator!r})"], env)
+        generate = ["generate", "--exported", generator, "--words", "dress", "boot", "--samples", str(args.samples)]
+
+        commands = {
+            "python -c pass": ["-c", "pass"],
+            "import torch": ["-c", "import torch"],
+            "import cada_vqvae": ["-c", "import cada_vqvae"],
+            "cada_vqvae --help": ["-m", "cada_vqvae", "--help"],
+            "cada_vqvae generate --exported": ["-m", "cada_vqvae"] + generate,
+        }
+        for name, command in commands.items():
+            print(f"{name:<34} {startup_time(command, env, args.repeats) * 1e3:>9.1f} ms")
+
+        heavy = _run(["-c", _CHECK_IMPORTS.format(heavy=HEAVY_MODULES)] + generate, env).stdout
+        imported = heavy.rsplit("HEAVY:", 1)[1].strip()
+        print(f"heavy modules imported by generate: {imported or 'none'}")
+        if imported:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
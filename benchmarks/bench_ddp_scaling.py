@@ -0,0 +1,45 @@
+"""Scaling efficiency of data-parallel CPU training from 1 to N processes.
+
+Every run trains on the same synthetic dataset with the same per-rank batch
+size; efficiency is ``throughput(N) / (N * throughput(1))``.
+
+    python benchmarks/bench_ddp_scaling.py --max-procs 8 --samples 60000
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from cada_vqvae.distributed import build_parser, launch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-procs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--samples", type=int, default=60000, help="synthetic training images")
+    parser.add_argument("--epochs", type=int, default=2, help="the last epoch is timed (the first warms up)")
+    parser.add_argument("--batch-size", type=int, default=64, help="per-rank batch size")
+    args = parser.parse_args()
+
+    procs = [1]
+    while procs[-1] * 2 <= args.max_procs:
+        procs.append(procs[-1] * 2)
+    if procs[-1] != args.max_procs:
+        procs.append(args.max_procs)
+
+    train_args = build_parser().parse_args(["--synthetic", str(args.samples), "--epochs", str(args.epochs),
+                                            "--batch-size", str(args.batch_size), "--log-interval", "0"])
+    print(f"{'procs':>5} {'threads/rank':>12} {'samples/s':>10} {'speedup':>8} {'efficiency':>10}")
+    baseline = None
+    for nproc in procs:
+        throughput = launch(train_args, nproc)["samples_per_sec"][-1]
+        baseline = baseline or throughput
+        speedup = throughput / baseline
+        threads = max(1, (os.cpu_count() or 1) // nproc)
+        print(f"{nproc:>5} {threads:>12} {throughput:>10.0f} {speedup:>7.2f}x {speedup / nproc:>9.0%}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Meta-training throughput (tasks/s) against the number of tasks per step.
+
+Uses random images and word vectors, so no dataset download is needed.
+
+    python benchmarks/bench_meta_tasks.py --tasks-per-step 1 4 16 64
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from cada_vqvae.distributed import SyntheticImages
+from cada_vqvae.embeddings import FASHION_MNIST_CLASSES, ClassEmbeddingTable
+from cada_vqvae.meta import EpisodeSampler, meta_train
+from cada_vqvae.models import CADA_VAE
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks-per-step", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--tasks", type=int, default=2048, help="tasks trained per measurement")
+    parser.add_argument("--way", type=int, default=5)
+    parser.add_argument("--shot", type=int, default=3)
+    parser.add_argument("--query", type=int, default=10)
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    rng = np.random.default_rng(0)
+    word_vectors = {word: rng.standard_normal(100).astype(np.float32) for word in FASHION_MNIST_CLASSES}
+    class_embeddings = ClassEmbeddingTable(FASHION_MNIST_CLASSES, word_vectors).to(device)
+    sampler = EpisodeSampler(SyntheticImages(300), args.way, args.shot, args.query,
+                             generator=torch.Generator().manual_seed(0), device=device)
+
+    print(f"{'tasks/step':>10} {'tasks/s':>10}")
+    for tasks_per_step in args.tasks_per_step:
+        model = CADA_VAE(20, 512, 100).to(device)
+        optimizer = torch.optim.Adam(model.parameters(), lr=1e-5)
+        meta_train(model, sampler, class_embeddings, optimizer, num_steps=3, tasks_per_step=tasks_per_step,
+                   log_interval=0)
+        steps = max(1, args.tasks // tasks_per_step)
+        result = meta_train(model, sampler, class_embeddings, optimizer, num_steps=steps,
+                            tasks_per_step=tasks_per_step, log_interval=0)
+        print(f"{tasks_per_step:>10} {result['tasks_per_sec']:>10.1f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Per-step cost of the per-sample semantic-embedding lookup vs. ClassEmbeddingTable.
+
+Uses random vectors in place of GloVe so it runs without gensim:
+
+    python benchmarks/bench_semantic_embedding.py --batch-size 64 --device cpu
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from cada_vqvae.embeddings import FASHION_MNIST_CLASSES, ClassEmbeddingTable
+
+
+def get_semantic_embedding(labels, word_vectors):
+    # Lookup as done in the training script before the table existed
+    return torch.stack([torch.tensor(word_vectors[FASHION_MNIST_CLASSES[label]]) for label in labels], dim=0)
+
+
+def _sync(device):
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+
+
+def time_per_step(fn, device, steps):
+    for _ in range(10):
+        fn()
+    _sync(device)
+    start = time.perf_counter()
+    for _ in range(steps):
+        fn()
+    _sync(device)
+    return (time.perf_counter() - start) / steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    rng = np.random.default_rng(0)
+    word_vectors = {w: rng.standard_normal(100).astype(np.float32) for w in FASHION_MNIST_CLASSES}
+    table = ClassEmbeddingTable(FASHION_MNIST_CLASSES, word_vectors).to(device)
+    target = torch.randint(0, len(FASHION_MNIST_CLASSES), (args.batch_size,), device=device)
+
+    legacy = time_per_step(
+        lambda: get_semantic_embedding(target.cpu().numpy(), word_vectors).to(device), device, args.steps)
+    indexed = time_per_step(lambda: table(target), device, args.steps)
+
+    assert torch.equal(get_semantic_embedding(target.cpu().numpy(), word_vectors).to(device), table(target))
+    print(f"device={device} batch_size={args.batch_size}")
+    print(f"per-sample lookup : {legacy * 1e6:9.1f} us/step")
+    print(f"embedding table   : {indexed * 1e6:9.1f} us/step")
+    print(f"saved per step    : {(legacy - indexed) * 1e6:9.1f} us ({legacy / indexed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
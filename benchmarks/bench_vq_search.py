@@ -0,0 +1,88 @@
+"""Latency and memory of VectorQuantizer code search against codebook size.
+
+Compares the original full distance matrix, the blocked exact search and the
+approximate coarse-to-fine search on random codebooks:
+
+    python benchmarks/bench_vq_search.py --sizes 512 4096 16384 65536 --queries 4096
+
+Peak memory is measured with ``torch.cuda.max_memory_allocated`` on CUDA. On
+the CPU it is the size of the largest temporary buffer each method allocates.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from cada_vqvae.codebook_search import CodebookSearch
+
+
+def full_matrix_search(flat_inputs, weight):
+    # Search as done by the original VectorQuantizer.forward
+    distances = torch.sum(flat_inputs**2, dim=1, keepdim=True) + \
+                torch.sum(weight**2, dim=1) - \
+                2 * torch.matmul(flat_inputs, weight.t())
+    return torch.argmin(distances, dim=1)
+
+
+def measure(fn, device, repeats):
+    fn()  # warm-up (also builds caches and the approximate index)
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+        baseline = torch.cuda.memory_allocated()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = fn()
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    latency = (time.perf_counter() - start) / repeats
+    peak = torch.cuda.max_memory_allocated() - baseline if device.type == "cuda" else None
+    return result, latency, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 4096, 16384, 65536])
+    parser.add_argument("--queries", type=int, default=4096)
+    parser.add_argument("--dim", type=int, default=20, help="latent size of the codes")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--num-probes", type=int, default=8)
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+
+    device = torch.device(args.device)
+    torch.manual_seed(0)
+    element_size = torch.tensor([], dtype=torch.float32).element_size()
+    print(f"{'codes':>7} {'method':>12} {'ms/search':>10} {'peak MiB':>9} {'recall@1':>9}")
+    for size in args.sizes:
+        weight = torch.randn(size, args.dim, device=device)
+        inputs = torch.randn(args.queries, args.dim, device=device)
+        exact = CodebookSearch()
+        approx = CodebookSearch(approximate=True, num_probes=args.num_probes)
+
+        reference, latency, peak = measure(lambda: full_matrix_search(inputs, weight), device, args.repeats)
+        analytic = {
+            "full-matrix": args.queries * size,
+            "blocked": min(args.queries, exact._rows_per_block(size)) * size,
+        }
+        rows = [("full-matrix", latency, peak, reference)]
+        for name, search in (("blocked", exact), ("approximate", approx)):
+            result, latency, peak = measure(lambda: search.search(inputs, weight), device, args.repeats)
+            rows.append((name, latency, peak, result))
+        lists = approx._index[2]
+        candidates = args.num_probes * lists.shape[1]
+        analytic["approximate"] = min(args.queries, approx._rows_per_block(candidates * args.dim)) * candidates * args.dim
+
+        for name, latency, peak, result in rows:
+            peak = peak if peak is not None else analytic[name] * element_size
+            recall = (result == reference).float().mean().item()
+            print(f"{size:>7} {name:>12} {latency * 1e3:>10.2f} {peak / 2**20:>9.1f} {recall:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Load test for the micro-batching generation server.
+
+Against a running instance:
+
+    python -m cada_vqvae.serve --port 8080 &
+    python benchmarks/load_test_server.py --url http://127.0.0.1:8080 --concurrency 64 --requests 2000
+
+Or let the script start the server itself, once with one request per forward
+(``--max-batch-size 1``) and once with micro-batching, and compare:
+
+    python benchmarks/load_test_server.py --compare [--checkpoint checkpoints/best.pt]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.parse
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+WORDS = ["shirt", "trouser", "pullover", "dress", "coat", "sandal", "sneaker", "bag", "boot"]
+
+
+async def _request(reader, writer, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        key, _, value = line.decode().partition(":")
+        if key.lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def _client(host, port, queue, latencies, samples):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            status, _ = await _request(reader, writer, "POST", "/generate",
+                                       {"words": [WORDS[i % len(WORDS)]], "samples": samples})
+            if status != 200:
+                raise RuntimeError(f"request failed with HTTP {status}")
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def run_load(url, concurrency, num_requests, samples):
+    parsed = urllib.parse.urlparse(url)
+    queue = asyncio.Queue()
+    for i in range(num_requests):
+        queue.put_nowait(i)
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(parsed.hostname, parsed.port, queue, latencies, samples)
+                           for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(parsed.hostname, parsed.port)
+    _, stats = await _request(reader, writer, "GET", "/stats")
+    writer.close()
+
+    latencies = np.array(latencies) * 1000.0
+    return {
+        "requests_per_sec": num_requests / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "server_mean_batch_images": stats["mean_batch_images"],
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until_up(port, process, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError("server did not start")
+
+
+def spawn_and_load(max_batch_size, args):
+    port = _free_port()
+    command = [sys.executable, "-m", "cada_vqvae.serve", "--port", str(port),
+               "--max-batch-size", str(max_batch_size), "--max-wait-ms", str(args.max_wait_ms)]
+    if args.checkpoint:
+        command += ["--checkpoint", args.checkpoint]
+    process = subprocess.Popen(command, cwd=ROOT)
+    try:
+        _wait_until_up(port, process)
+        return asyncio.run(run_load(f"http://127.0.0.1:{port}", args.concurrency, args.requests, args.samples))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def _print_result(label, result):
+    print(f"{label:<24} {result['requests_per_sec']:9.1f} req/s  p50 {result['p50_ms']:7.2f} ms  "
+          f"p99 {result['p99_ms']:7.2f} ms  mean batch {result['server_mean_batch_images']:.1f} images")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--compare", action="store_true",
+                        help="spawn servers with --max-batch-size 1 and --max-batch-size N and compare")
+    parser.add_argument("--checkpoint", help="passed to spawned servers")
+    parser.add_argument("--max-batch-size", type=int, default=64, help="batch size of the batched spawned server")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--samples", type=int, default=1, help="images per request")
+    args = parser.parse_args()
+
+    if not args.compare:
+        _print_result(args.url, asyncio.run(run_load(args.url, args.concurrency, args.requests, args.samples)))
+        return
+
+    unbatched = spawn_and_load(1, args)
+    batched = spawn_and_load(args.max_batch_size, args)
+    _print_result("one request per forward", unbatched)
+    _print_result(f"micro-batched (<= {args.max_batch_size})", batched)
+    print(f"throughput gain: {batched['requests_per_sec'] / unbatched['requests_per_sec']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
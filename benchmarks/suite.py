@@ -0,0 +1,212 @@
+"""CPU benchmark suite for the model, quantizer, data path and generation.
+
+Runs every benchmark on the CPU with random data (no dataset or word-vector
+download) and writes the results as JSON; ``compare`` flags regressions of a
+new run against a saved baseline:
+
+    python benchmarks/suite.py run --out baseline.json
+    python benchmarks/suite.py run --out current.json
+    python benchmarks/suite.py compare baseline.json current.json --threshold 0.10
+
+Every result is a time in seconds (lower is better) or a rate (``*_per_sec``,
+higher is better); ``compare`` exits with status 1 when any result regressed
+by more than ``--threshold``.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from cada_vqvae.data import TensorBatchLoader
+from cada_vqvae.distributed import SyntheticImages
+from cada_vqvae.embeddings import FASHION_MNIST_CLASSES, ClassEmbeddingTable
+from cada_vqvae.generation import generate
+from cada_vqvae.losses import CADALoss
+from cada_vqvae.models import CADA_VAE, VectorQuantizer
+from cada_vqvae.trainer import Trainer
+
+LATENT_SIZE = 20
+
+
+def _word_vectors():
+    rng = np.random.default_rng(0)
+    return {word: rng.standard_normal(100).astype(np.float32) for word in FASHION_MNIST_CLASSES}
+
+
+def _median_time(fn, repeats, warmup=3):
+    """Median wall time of ``fn()`` over ``repeats`` calls (robust to scheduler noise)."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def bench_forward_backward(batch_sizes, repeats):
+    """Forward + CADALoss + backward of ``CADA_VAE`` per batch size."""
+    results = {}
+    model = CADA_VAE(LATENT_SIZE, 512, 100)
+    criterion = CADALoss()
+    for batch_size in batch_sizes:
+        x = torch.rand(batch_size, 28 * 28)
+        c = torch.rand(batch_size, 100)
+
+        def step():
+            model.zero_grad(set_to_none=True)
+            losses = criterion(model(x, c, cross_reconstruction=True), x, c)
+            losses[0].backward()
+
+        def forward():
+            with torch.no_grad():
+                model(x, c, cross_reconstruction=True)
+
+        results[f"forward/batch_{batch_size}"] = _median_time(forward, repeats)
+        results[f"forward_backward/batch_{batch_size}"] = _median_time(step, repeats)
+    return results
+
+
+def bench_vector_quantizer(codebook_sizes, repeats, batch_size=256):
+    """``VectorQuantizer.forward`` in training mode per codebook size."""
+    results = {}
+    inputs = torch.randn(batch_size, LATENT_SIZE)
+    for size in codebook_sizes:
+        vq = VectorQuantizer(size, LATENT_SIZE).train()
+        results[f"vq_forward/codes_{size}"] = _median_time(lambda: vq(inputs), repeats)
+    return results
+
+
+def bench_semantic_embedding(repeats, batch_size=64):
+    """Per-sample word-vector lookup (the script's ``get_semantic_embedding``) vs. ``ClassEmbeddingTable``."""
+    word_vectors = _word_vectors()
+    table = ClassEmbeddingTable(FASHION_MNIST_CLASSES, word_vectors)
+    labels = torch.randint(0, len(FASHION_MNIST_CLASSES), (batch_size,))
+
+    def per_sample():
+        torch.stack([torch.tensor(word_vectors[FASHION_MNIST_CLASSES[label]]) for label in labels], dim=0)
+
+    return {
+        "semantic_embedding/per_sample": _median_time(per_sample, repeats * 10),
+        "semantic_embedding/table": _median_time(lambda: table(labels), repeats * 10),
+    }
+
+
+def bench_epoch(num_samples, batch_size=64):
+    """Training samples per second over one full epoch of synthetic FashionMNIST-shaped data."""
+    torch.manual_seed(0)
+    model = CADA_VAE(LATENT_SIZE, 512, 100)
+    trainer = Trainer(model, torch.optim.Adam(model.parameters(), lr=1e-5),
+                      ClassEmbeddingTable(FASHION_MNIST_CLASSES, _word_vectors()),
+                      criterion=CADALoss(), log_interval=0, log_fn=lambda *_: None)
+    loader = TensorBatchLoader(SyntheticImages(num_samples), batch_size=batch_size, shuffle=True)
+    trainer.train_epoch(loader)
+    return {"epoch/samples_per_sec": trainer.samples_per_sec[-1]}
+
+
+def bench_generation(repeats, samples=(1, 64, 1024)):
+    """Per-image latency of ``generate`` for one word at several sample counts."""
+    model = CADA_VAE(LATENT_SIZE, 512, 100).eval()
+    embedding = torch.rand(1, 100)
+    results = {}
+    for count in samples:
+        seconds = _median_time(lambda: generate(model, embedding, samples_per_word=count, seed=0), repeats)
+        results[f"generation/per_image_{count}"] = seconds / count
+    return results
+
+
+def run(args):
+    torch.set_num_threads(args.threads)
+    results = {}
+    results.update(bench_forward_backward(args.batch_sizes, args.repeats))
+    results.update(bench_vector_quantizer(args.codebook_sizes, args.repeats))
+    results.update(bench_semantic_embedding(args.repeats))
+    results.update(bench_epoch(args.epoch_samples))
+    results.update(bench_generation(args.repeats))
+
+    report = {
+        "meta": {
+            "torch": torch.__version__,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "threads": args.threads,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    for name, value in results.items():
+        unit = "/s" if name.endswith("_per_sec") else "ms"
+        shown = value if unit == "/s" else value * 1e3
+        print(f"{name:<36} {shown:>12.3f} {unit}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def compare(args):
+    """Print the relative change of every result; return the names that regressed beyond the threshold."""
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    with open(args.current) as f:
+        current = json.load(f)["results"]
+
+    regressions = []
+    print(f"{'benchmark':<36} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name in sorted(set(baseline) | set(current)):
+        if name not in baseline or name not in current:
+            print(f"{name:<36} {'(only in ' + ('current' if name in current else 'baseline') + ')':>34}")
+            continue
+        old, new = baseline[name], current[name]
+        # Positive change means slower, for times and rates alike
+        change = (old / new - 1) if name.endswith("_per_sec") else (new / old - 1)
+        flag = ""
+        if change > args.threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        elif change < -args.threshold:
+            flag = "  improved"
+        print(f"{name:<36} {old:>12.4g} {new:>12.4g} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the suite")
+    run_parser.add_argument("--out", help="write results to this JSON file")
+    run_parser.add_argument("--threads", type=int, default=torch.get_num_threads())
+    run_parser.add_argument("--repeats", type=int, default=20)
+    run_parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64, 256, 1024])
+    run_parser.add_argument("--codebook-sizes", type=int, nargs="+", default=[128, 512, 2048, 8192])
+    run_parser.add_argument("--epoch-samples", type=int, default=60000)
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown that counts")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        regressions = compare(args)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
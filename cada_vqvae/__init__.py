@@ -0,0 +1,42 @@
+"""Reusable building blocks for the CADA-VQVAE few-shot image generation experiments.
+
+Importing the package is cheap: the names below are resolved on first access,
+so torch and the other dependencies load only when something is used.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "CADA_VAE": "cada_vqvae.models",
+    "VectorQuantizer": "cada_vqvae.models",
+    "load_model": "cada_vqvae.models",
+    "CADALoss": "cada_vqvae.losses",
+    "cada_vae_loss": "cada_vqvae.losses",
+    "LOSS_COMPONENTS": "cada_vqvae.losses",
+    "Trainer": "cada_vqvae.trainer",
+    "TensorBatchLoader": "cada_vqvae.data",
+    "ClassEmbeddingTable": "cada_vqvae.embeddings",
+    "FASHION_MNIST_CLASSES": "cada_vqvae.embeddings",
+    "load_word_vectors": "cada_vqvae.word_vectors",
+    "generate": "cada_vqvae.generation",
+    "CheckpointManager": "cada_vqvae.checkpoint",
+    "BackgroundValidator": "cada_vqvae.validation",
+    "GenerationEvaluator": "cada_vqvae.quality",
+    "adapt_to_word": "cada_vqvae.adaptation",
+    "load_delta": "cada_vqvae.adaptation",
+    "load_exported": "cada_vqvae.export",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
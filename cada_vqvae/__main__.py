@@ -0,0 +1,3 @@
+from cada_vqvae.cli import main
+
+main()
@@ -0,0 +1,190 @@
+"""Few-shot adaptation of a trained ``CADA_VAE`` to a new class word.
+
+Only the semantic branch has to learn where a new word belongs in the latent
+space; the image VAE already encodes and decodes any FashionMNIST-like image.
+``adapt_to_word`` freezes ``image_encoder``/``image_decoder``, runs the image
+encoder once over the support images (and over a small stratified replay set
+of the existing classes, so they are not forgotten) and fine-tunes
+``semantic_encoder``/``semantic_decoder`` for a few hundred steps against
+those cached ``(x, mu_x, logvar_x)`` tensors with the usual ``CADALoss``
+objective. The frozen image decoder still runs to get the cross-alignment
+gradient, but the image encoder never runs inside the loop.
+
+The result is stored as a delta checkpoint holding the semantic branch and
+the new word vectors only (well under a tenth of the full model):
+
+    replay = replay_latents(model, train_dataset, per_class=32)
+    result = adapt_to_word(model, "jacket", word_vectors["jacket"], support_images, class_embeddings, replay)
+    save_delta(model, "jacket.delta.pt", {"jacket": word_vectors["jacket"]})
+    ...
+    new_words = load_delta(model, "jacket.delta.pt")
+"""
+
+import collections
+import hashlib
+import time
+
+import numpy as np
+import torch
+
+from cada_vqvae.embeddings import ClassEmbeddingTable
+from cada_vqvae.losses import LOSS_COMPONENTS, CADALoss
+
+ADAPTED_MODULES = ("semantic_encoder", "semantic_decoder")
+
+ImageLatents = collections.namedtuple("ImageLatents", ["images", "mu_x", "logvar_x", "labels"])
+AdaptationResult = collections.namedtuple("AdaptationResult", ["label", "class_embeddings", "losses", "seconds"])
+
+
+def _as_flat_images(images):
+    """``(N, 784)`` floats in ``[0, 1]`` from uint8 or float images of shape ``(N, 28, 28)`` or ``(N, 784)``."""
+    images = torch.as_tensor(np.asarray(images) if not torch.is_tensor(images) else images)
+    if images.dtype == torch.uint8:
+        images = images.float().div_(255)
+    return images.float().reshape(len(images), -1)
+
+
+@torch.no_grad()
+def encode_images(model, images, labels, batch_size=1024):
+    """``ImageLatents`` of ``images`` under ``model.image_encoder``, on the model's device."""
+    device = next(model.parameters()).device
+    images = _as_flat_images(images).to(device)
+    labels = torch.as_tensor(labels, dtype=torch.long, device=device)
+    encoder = model.image_encoder
+    was_training = encoder.training
+    encoder.eval()
+    mu_x, logvar_x = zip(*(encoder(images[start:start + batch_size]) for start in range(0, len(images), batch_size)))
+    encoder.train(was_training)
+    return ImageLatents(images, torch.cat(mu_x), torch.cat(logvar_x), labels)
+
+
+def replay_latents(model, dataset, per_class=32, seed=0):
+    """Cached image latents of a stratified sample of ``dataset`` (``.data``/``.targets``), per existing class."""
+    from cada_vqvae.latents import stratified_sample
+
+    targets = torch.as_tensor(dataset.targets, dtype=torch.long)
+    indices = torch.from_numpy(stratified_sample(targets.numpy(), per_class, seed))
+    return encode_images(model, torch.as_tensor(dataset.data)[indices], targets[indices])
+
+
+def _concat(*latents):
+    return ImageLatents(*(torch.cat(tensors) for tensors in zip(*latents)))
+
+
+def adapt_to_word(model, word, word_vector, support_images, class_embeddings, replay=None, steps=300,
+                  batch_size=256, lr=1e-3, criterion=None, seed=0, log_interval=0, log_fn=print):
+    """Fine-tune the semantic branch of ``model`` in place so ``word`` generates like ``support_images``.
+
+    The semantic branch runs in train mode, so its VQ codebook adapts too:
+    the codebook rows are optimized (or, with an EMA codebook, updated from
+    the EMA statistics), usage counts accumulate and dead codes may be
+    reset. All of that is ``semantic_encoder`` state and goes into the
+    delta. Every module's train/eval mode is restored afterwards.
+
+    Args:
+        model: A trained ``CADA_VAE``; its image branch is left untouched.
+        word: The new class word.
+        word_vector: Its 100-d word vector.
+        support_images: The few example images, uint8 or ``[0, 1]`` floats,
+            ``(K, 28, 28)`` or ``(K, 784)``.
+        class_embeddings: ``ClassEmbeddingTable`` of the existing classes; the
+            new word gets the next label.
+        replay: Optional ``ImageLatents`` of existing classes (see
+            ``replay_latents``), mixed into every batch.
+        steps, batch_size, lr: Optimization of the semantic branch (Adam).
+        criterion: ``CADALoss`` to optimize (default ``CADALoss()``).
+
+    Returns:
+        ``AdaptationResult`` with the new label, a ``ClassEmbeddingTable``
+        extended by ``word``, the per-step total losses and the wall time.
+    """
+    start = time.perf_counter()
+    criterion = criterion or CADALoss(cross_reconstruction=True)
+    device = next(model.parameters()).device
+    label = len(class_embeddings.classes)
+    vector = torch.as_tensor(np.asarray(word_vector, dtype=np.float32), device=device)
+    table = torch.cat([class_embeddings.table.to(device), vector.unsqueeze(0)])
+    extended = ClassEmbeddingTable.from_table(list(class_embeddings.classes) + [word], table,
+                                              aliases=dict(zip(class_embeddings.classes, class_embeddings.words)))
+
+    latents = encode_images(model, support_images, torch.full((len(support_images),), label))
+    if replay is not None:
+        latents = _concat(latents, ImageLatents(*(t.to(device) for t in replay)))
+
+    frozen = [p for name in ("image_encoder", "image_decoder") for p in getattr(model, name).parameters()]
+    requires_grad = [p.requires_grad for p in frozen]
+    for p in frozen:
+        p.requires_grad_(False)
+    semantic = [getattr(model, name) for name in ADAPTED_MODULES]
+    parameters = [p for module in semantic for p in module.parameters()]
+    optimizer = torch.optim.Adam(parameters, lr=lr)
+    generator = torch.Generator().manual_seed(seed)
+    modes = [(module, module.training) for module in model.modules()]
+    for module in semantic:
+        module.train()
+
+    losses = []
+    try:
+        for step in range(steps):
+            rows = torch.randperm(len(latents.labels), generator=generator)[:batch_size].to(device)
+            x, mu_x, logvar_x, labels = (t[rows] for t in latents)
+            c = table[labels]
+
+            mu_c, logvar_c, z_q, z_e, quantization_loss, commitment_loss = model.semantic_encoder(c)
+            recon_x_from_c = model.image_decoder(model.reparameterize(mu_c, logvar_c))
+            z_x = model.reparameterize(mu_x, logvar_x)
+            recon_c, recon_c_from_x = model.semantic_decoder(torch.cat([z_q, z_x])).chunk(2)
+            # The image VAE terms are constant here: pass x as its own reconstruction
+            outputs = (x, recon_c, mu_x, logvar_x, mu_c, logvar_c, z_e, quantization_loss, commitment_loss,
+                       recon_x_from_c, recon_c_from_x)
+            step_losses = criterion(outputs, x, c)
+
+            optimizer.zero_grad(set_to_none=True)
+            step_losses[0].backward()
+            optimizer.step()
+            losses.append(step_losses.detach())
+            if log_interval and (step + 1) % log_interval == 0:
+                components = dict(zip(LOSS_COMPONENTS, step_losses.tolist()))
+                log_fn(f'Adapt {word!r} step {step + 1}: ' + ', '.join(
+                    f'{name}: {components[name]:.4f}' for name in ("ca_loss", "da_loss", "vq_vae_loss", "loss_c")))
+    finally:
+        for p, flag in zip(frozen, requires_grad):
+            p.requires_grad_(flag)
+        for module, training in modes:
+            module.training = training
+
+    total_losses = torch.stack(losses)[:, 0].tolist() if losses else []
+    return AdaptationResult(label, extended, total_losses, time.perf_counter() - start)
+
+
+def _fingerprint(model):
+    """Hash of the frozen image branch, identifying the base model a delta applies to."""
+    digest = hashlib.sha1()
+    for name in ("image_encoder", "image_decoder"):
+        for value in getattr(model, name).state_dict().values():
+            digest.update(value.detach().cpu().numpy().tobytes())
+    return digest.hexdigest()
+
+
+def save_delta(model, path, word_vectors):
+    """Write the adapted semantic branch and the new words' vectors (``{word: vector}``) to ``path``."""
+    state = {
+        "base": _fingerprint(model),
+        "modules": {name: getattr(model, name).state_dict() for name in ADAPTED_MODULES},
+        "word_vectors": {word: np.asarray(vector, dtype=np.float32) for word, vector in word_vectors.items()},
+    }
+    torch.save(state, path)
+
+
+def load_delta(model, path, map_location="cpu"):
+    """Apply a delta written by ``save_delta`` to ``model``; returns its ``{word: vector}``.
+
+    Raises ``ValueError`` when ``model``'s image branch is not the one the
+    delta was adapted from.
+    """
+    state = torch.load(path, map_location=map_location, weights_only=False)
+    if state["base"] != _fingerprint(model):
+        raise ValueError(f"{path} was adapted from a different base model")
+    for name in ADAPTED_MODULES:
+        getattr(model, name).load_state_dict(state["modules"][name])
+    return state["word_vectors"]
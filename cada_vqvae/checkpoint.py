@@ -0,0 +1,166 @@
+"""Periodic, atomic, asynchronous checkpoints.
+
+``CheckpointManager`` snapshots a (nested) state dict to CPU memory on the
+calling thread, then serializes it on a background thread so the training
+step does not wait for the disk. Files are written to a temporary name and
+renamed into place, the newest ``keep_last`` checkpoints are kept, and the
+checkpoint with the best metric is kept separately as ``best.pt``.
+"""
+
+import glob
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+import torch
+
+CHECKPOINT_PATTERN = re.compile(r"ckpt-(\d+)\.pt$")
+
+
+def snapshot_to_cpu(state):
+    """Copy every tensor in a nested dict/list structure to CPU memory."""
+    if torch.is_tensor(state):
+        return state.detach().to("cpu", copy=True)
+    if isinstance(state, dict):
+        return {key: snapshot_to_cpu(value) for key, value in state.items()}
+    if isinstance(state, (list, tuple)):
+        return type(state)(snapshot_to_cpu(value) for value in state)
+    return state
+
+
+def _atomic_save(obj, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        torch.save(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class CheckpointManager:
+    """Decides when to checkpoint and writes checkpoints in the background.
+
+    Args:
+        directory: Where ``ckpt-<step>.pt``, ``best.pt`` and ``best.json`` live.
+        keep_last: Number of most recent step checkpoints kept on disk.
+        every_steps: Save every this many steps (``None`` disables).
+        every_minutes: Save when this much wall time passed since the last save.
+        mode: ``"min"`` or ``"max"``, how metrics passed to ``save`` compare.
+
+    At most one write is in flight: a new ``save`` first waits for the
+    previous one. Errors from the writer thread are re-raised by the next
+    ``save`` or ``wait`` call.
+    """
+
+    def __init__(self, directory, keep_last=3, every_steps=None, every_minutes=None, mode="min"):
+        self.directory = directory
+        self.keep_last = keep_last
+        self.every_steps = every_steps
+        self.every_minutes = every_minutes
+        self.mode = mode
+        os.makedirs(directory, exist_ok=True)
+
+        self._thread = None
+        self._error = None
+        self._last_save_time = time.monotonic()
+        self._best_metric = None
+        best_info = os.path.join(directory, "best.json")
+        if os.path.exists(best_info):
+            with open(best_info) as f:
+                self._best_metric = json.load(f)["metric"]
+
+    def should_save(self, step):
+        if self.every_steps and step % self.every_steps == 0:
+            return True
+        if self.every_minutes and time.monotonic() - self._last_save_time >= 60 * self.every_minutes:
+            return True
+        return False
+
+    def _is_better(self, metric):
+        if metric is None:
+            return False
+        if self._best_metric is None:
+            return True
+        return metric < self._best_metric if self.mode == "min" else metric > self._best_metric
+
+    def save(self, state, step, metric=None, blocking=False):
+        """Snapshot ``state`` now and write it as the checkpoint of ``step``.
+
+        ``metric`` (e.g. the validation loss) makes this checkpoint a
+        candidate for ``best.pt``.
+        """
+        snapshot = snapshot_to_cpu(state)
+        self.wait()
+        is_best = self._is_better(metric)
+        if is_best:
+            self._best_metric = metric
+        self._last_save_time = time.monotonic()
+        self._thread = threading.Thread(target=self._write, args=(snapshot, step, metric, is_best), daemon=True)
+        self._thread.start()
+        if blocking:
+            self.wait()
+
+    def _path(self, step):
+        return os.path.join(self.directory, f"ckpt-{step:09d}.pt")
+
+    def _write(self, snapshot, step, metric, is_best):
+        try:
+            path = self._path(step)
+            _atomic_save(snapshot, path)
+            if is_best:
+                self._copy_to_best(path, step, metric)
+            for old_path in self.checkpoints()[:-self.keep_last]:
+                os.remove(old_path)
+        except BaseException as exc:
+            self._error = exc
+
+    def _copy_to_best(self, path, step, metric):
+        best_path = os.path.join(self.directory, "best.pt")
+        shutil.copyfile(path, best_path + ".tmp")
+        os.replace(best_path + ".tmp", best_path)
+        info_path = os.path.join(self.directory, "best.json")
+        with open(info_path + ".tmp", "w") as f:
+            json.dump({"step": step, "metric": metric}, f)
+        os.replace(info_path + ".tmp", info_path)
+
+    def report_metric(self, step, metric):
+        """Score the already saved checkpoint of ``step``, e.g. with a validation loss computed later.
+
+        It becomes ``best.pt`` if ``metric`` is the best so far and the
+        checkpoint has not been rotated out yet. Returns whether it did.
+        """
+        self.wait()
+        path = self._path(step)
+        if not self._is_better(metric) or not os.path.exists(path):
+            return False
+        self._best_metric = metric
+        self._copy_to_best(path, step, metric)
+        return True
+
+    def wait(self):
+        """Block until the in-flight write (if any) is on disk."""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Writing a checkpoint failed") from error
+
+    def checkpoints(self):
+        """Paths of the step checkpoints on disk, oldest first."""
+        paths = [p for p in glob.glob(os.path.join(self.directory, "ckpt-*.pt")) if CHECKPOINT_PATTERN.search(p)]
+        return sorted(paths, key=lambda p: int(CHECKPOINT_PATTERN.search(p).group(1)))
+
+    def latest(self):
+        paths = self.checkpoints()
+        return paths[-1] if paths else None
+
+    def load_latest(self, map_location="cpu"):
+        """The newest checkpoint's state, or ``None`` when there is none."""
+        path = self.latest()
+        if path is None:
+            return None
+        return torch.load(path, map_location=map_location, weights_only=False)
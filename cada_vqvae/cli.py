@@ -0,0 +1,362 @@
+"""Command-line entry points: ``python -m cada_vqvae {train,generate,visualize,adapt,evaluate,export}``.
+
+Each subcommand imports only what it needs, so ``generate`` from an exported
+generator starts without loading torchvision, gensim, sklearn or matplotlib.
+
+    python -m cada_vqvae train --epochs 50 --plot-dir plots
+    python -m cada_vqvae generate --checkpoint checkpoints --words dress boot --samples 8 --grid samples.png
+    python -m cada_vqvae export --checkpoint checkpoints --out generator.pt --quantize
+    python -m cada_vqvae generate --exported generator.pt --words dress --samples 64 --out dress.npy
+    python -m cada_vqvae visualize --checkpoint checkpoints --out latent_space.png
+    python -m cada_vqvae adapt --checkpoint checkpoints --word jacket --images jacket.npy --out jacket.delta.pt
+    python -m cada_vqvae generate --checkpoint checkpoints --delta jacket.delta.pt --words jacket --grid jacket.png
+    python -m cada_vqvae evaluate --checkpoint checkpoints --samples 1000 --out quality.json
+"""
+
+import argparse
+import json
+import os
+import sys
+
+
+def _add_model_args(parser):
+    parser.add_argument("--latent-size", type=int, default=20)
+    parser.add_argument("--num-embeddings", type=int, default=512)
+
+
+def add_objective_args(parser):
+    """Loss weights and codebook options shared by ``train`` and ``python -m cada_vqvae.distributed``."""
+    parser.add_argument("--beta", type=float, default=1.0, help="weight of the KL term")
+    parser.add_argument("--gamma", type=float, default=2.0, help="weight of the cross-alignment loss")
+    parser.add_argument("--delta", type=float, default=1.0, help="weight of the distribution-alignment loss")
+    parser.add_argument("--no-cross-reconstruction", dest="cross_reconstruction", action="store_false",
+                        help="train without the cross-reconstruction terms")
+    parser.add_argument("--mmd-gamma", type=float,
+                        help="align mu_x and z_e with an RBF-kernel MMD of this bandwidth instead of L2")
+    parser.add_argument("--mmd-estimator", choices=["biased", "unbiased", "linear"], default="biased")
+    parser.add_argument("--contrast-weight", type=float, default=0.0,
+                        help="weight of a supervised contrastive loss on mu_x")
+    parser.add_argument("--ema-codebook", action="store_true",
+                        help="update the VQ codebook with EMAs instead of quantization_loss gradients")
+    parser.add_argument("--dead-code-threshold", type=float, default=None,
+                        help="re-initialize codes whose decayed usage falls below this")
+
+
+def objective_from_args(args):
+    """``(criterion, vq_kwargs)`` for the options of ``add_objective_args``."""
+    from cada_vqvae.losses import CADALoss
+
+    criterion = CADALoss(beta=args.beta, gamma=args.gamma, delta=args.delta,
+                         cross_reconstruction=args.cross_reconstruction, mmd_gamma=args.mmd_gamma,
+                         mmd_estimator=args.mmd_estimator, lambda_contrast=args.contrast_weight)
+    return criterion, {"use_ema": args.ema_codebook, "dead_code_threshold": args.dead_code_threshold}
+
+
+def _fashion_mnist(data_dir, train):
+    from torchvision import datasets
+    return datasets.FashionMNIST(data_dir, train=train, download=True)
+
+
+def _word_targets(dataset, words):
+    """``dataset`` (FashionMNIST) with its labels re-indexed into the vocabulary ``words``."""
+    import torch
+
+    from cada_vqvae.data import SharedImages
+    from cada_vqvae.embeddings import FASHION_MNIST_CLASSES
+
+    missing = sorted(set(FASHION_MNIST_CLASSES) - set(words))
+    if missing:
+        raise ValueError(f"the shard vocabulary lacks the FashionMNIST words {missing}; pass --val-shard-dir")
+    lookup = torch.tensor([words.index(word) for word in FASHION_MNIST_CLASSES])
+    return SharedImages(dataset.data, lookup[torch.as_tensor(dataset.targets)])
+
+
+def train(args):
+    import torch
+
+    from cada_vqvae.checkpoint import CheckpointManager
+    from cada_vqvae.data import TensorBatchLoader
+    from cada_vqvae.embeddings import FASHION_MNIST_CLASSES, ClassEmbeddingTable
+    from cada_vqvae.models import CADA_VAE
+    from cada_vqvae.profiling import StepProfiler
+    from cada_vqvae.trainer import Trainer
+    from cada_vqvae.word_vectors import load_word_vectors
+
+    device = torch.device(args.device or ("cuda" if torch.cuda.is_available() else "cpu"))
+    classes = list(FASHION_MNIST_CLASSES)
+    if args.shard_dir:
+        from torch.utils.data import DataLoader
+
+        from cada_vqvae.shards import ShardedImageDataset, collate_word_targets, load_word_targets
+
+        # The shards carry their own vocabulary; samples are embedded through their word index
+        train_dataset = ShardedImageDataset(args.shard_dir, shuffle=True, return_words=True)
+        classes = list(train_dataset.words)
+        train_loader = DataLoader(train_dataset, batch_size=args.batch_size, num_workers=2,
+                                  collate_fn=collate_word_targets)
+        if args.val_shard_dir:
+            val_dataset = load_word_targets(args.val_shard_dir, words=classes)
+        else:
+            val_dataset = _word_targets(_fashion_mnist(args.data_dir, False), classes)
+    else:
+        train_loader = TensorBatchLoader(_fashion_mnist(args.data_dir, True), batch_size=args.batch_size, shuffle=True)
+        val_dataset = _fashion_mnist(args.data_dir, False)
+    val_loader = TensorBatchLoader(val_dataset, batch_size=args.batch_size)
+    validator = None
+    if args.background_val:
+        from cada_vqvae.validation import BackgroundValidator
+        validator = BackgroundValidator(val_dataset, subset_per_class=args.val_subset_per_class,
+                                        subset_every_steps=args.val_subset_every,
+                                        full_every_epochs=args.val_full_every, threads=args.val_threads)
+
+    criterion, vq_kwargs = objective_from_args(args)
+    model = CADA_VAE(args.latent_size, args.num_embeddings, 100, **vq_kwargs).to(device)
+    class_embeddings = ClassEmbeddingTable(classes, load_word_vectors(classes)).to(device)
+    optimizer = torch.optim.Adam(model.parameters(), lr=args.lr)
+    checkpoint_manager = CheckpointManager(args.checkpoint_dir, keep_last=3, every_steps=args.checkpoint_every)
+    profiler = None
+    if args.profile:
+        profile_start, profile_end = (int(step) for step in args.profile.split(":"))
+        profiler = StepProfiler(model, profile_start, profile_end)
+
+    trainer = Trainer(model, optimizer, class_embeddings, criterion=criterion,
+                      amp_dtype=getattr(torch, args.amp) if args.amp else None, compile=args.compile,
+                      log_interval=args.log_interval, checkpoint_manager=checkpoint_manager, profiler=profiler,
+                      validator=validator)
+    if args.resume:
+        trainer.resume_from()
+    train_losses, val_losses = trainer.fit(train_loader, val_loader, args.epochs)
+    if validator is not None:
+        validator.close()
+
+    with open(os.path.join(args.checkpoint_dir, "losses.json"), "w") as f:
+        json.dump({"train": train_losses, "val": val_losses, "val_subset": trainer.val_subset_losses}, f)
+    if args.plot_dir or args.show:
+        from cada_vqvae.plots import plot_individual_losses, plot_loss_curves, plot_total_loss
+        if args.plot_dir:
+            os.makedirs(args.plot_dir, exist_ok=True)
+        for name, plot in (("losses", plot_loss_curves), ("losses_detailed", plot_individual_losses),
+                           ("total_loss", plot_total_loss)):
+            plot(train_losses, val_losses, os.path.join(args.plot_dir, f"{name}.png") if args.plot_dir else None)
+    return trainer
+
+
+def _images_from_exported(args):
+    import torch
+
+    from cada_vqvae.export import load_exported
+
+    generator, vocabulary = load_exported(args.exported)
+    missing = [word for word in args.words if word not in vocabulary]
+    if missing:
+        raise SystemExit(f"words not in the exported vocabulary: {', '.join(missing)}")
+    indices = torch.tensor([vocabulary.index(word) for word in args.words]).repeat_interleave(args.samples)
+    latent_size = generator.fc_mu.out_features
+    noise_generator = torch.Generator().manual_seed(args.seed) if args.seed is not None else None
+    eps = torch.randn(len(indices), latent_size, generator=noise_generator)
+    with torch.no_grad():
+        images = generator.generate_words(indices, eps)
+    return images.reshape(len(args.words), args.samples, 28, 28).numpy()
+
+
+def generate_images(args):
+    import numpy as np
+
+    if args.exported:
+        images = _images_from_exported(args)
+        if args.out:
+            np.save(args.out, images)
+    else:
+        from cada_vqvae.generation import generate
+        from cada_vqvae.models import load_model
+        from cada_vqvae.word_vectors import load_word_vectors
+
+        model = load_model(args.checkpoint, args.latent_size, args.num_embeddings, device=args.device or "cpu")
+        adapted_words = {}
+        if args.delta:
+            from cada_vqvae.adaptation import load_delta
+            adapted_words = load_delta(model, args.delta)
+        known = [word for word in args.words if word not in adapted_words]
+        word_vectors = load_word_vectors(known) if known else {}
+        vectors = [adapted_words[word] if word in adapted_words else word_vectors[word] for word in args.words]
+        images = generate(model, vectors, samples_per_word=args.samples, seed=args.seed, out=args.out)
+    if args.grid:
+        from cada_vqvae.generation import save_image_grid
+        save_image_grid(images, args.grid)
+    print(f"Generated {images.shape[0] * images.shape[1]} images for {len(args.words)} words"
+          + (f" -> {args.out}" if args.out else ""))
+    return images
+
+
+def visualize(args):
+    from cada_vqvae.latents import LatentExport, export_latents, project
+    from cada_vqvae.plots import plot_latent_space
+
+    if args.reuse and os.path.exists(os.path.join(args.export_dir, "meta.json")):
+        latents = LatentExport(args.export_dir)
+    else:
+        from cada_vqvae.data import TensorBatchLoader
+        from cada_vqvae.embeddings import FASHION_MNIST_CLASSES, ClassEmbeddingTable
+        from cada_vqvae.models import load_model
+        from cada_vqvae.word_vectors import load_word_vectors
+
+        device = args.device or "cpu"
+        model = load_model(args.checkpoint, args.latent_size, args.num_embeddings, device=device)
+        classes = list(FASHION_MNIST_CLASSES)
+        class_embeddings = ClassEmbeddingTable(classes, load_word_vectors(classes)).to(device)
+        loader = TensorBatchLoader(_fashion_mnist(args.data_dir, args.split == "train"), batch_size=1024)
+        latents = export_latents(model, loader, class_embeddings, args.export_dir, device=device)
+
+    sample, labels = latents.sample(args.field, per_class=args.per_class, seed=args.seed)
+    plot_latent_space(project(sample, method=args.method, seed=args.seed), labels, args.out)
+
+
+def adapt(args):
+    import numpy as np
+    import torch
+
+    from cada_vqvae.adaptation import adapt_to_word, replay_latents, save_delta
+    from cada_vqvae.embeddings import FASHION_MNIST_CLASSES, ClassEmbeddingTable
+    from cada_vqvae.models import load_model
+    from cada_vqvae.word_vectors import load_word_vectors
+
+    torch.set_num_threads(args.threads or torch.get_num_threads())
+    model = load_model(args.checkpoint, args.latent_size, args.num_embeddings)
+    classes = list(FASHION_MNIST_CLASSES)
+    word_vectors = load_word_vectors(classes + [args.word])
+    class_embeddings = ClassEmbeddingTable(classes, word_vectors)
+    replay = None
+    if args.replay_per_class:
+        replay = replay_latents(model, _fashion_mnist(args.data_dir, True), per_class=args.replay_per_class)
+
+    support_images = np.load(args.images)
+    result = adapt_to_word(model, args.word, word_vectors[args.word], support_images, class_embeddings, replay,
+                           steps=args.steps, lr=args.lr, log_interval=args.log_interval)
+    save_delta(model, args.out, {args.word: word_vectors[args.word]})
+    print(f"Adapted {args.word!r} from {len(support_images)} images in {result.seconds:.2f}s "
+          f"(loss {result.losses[0]:.4f} -> {result.losses[-1]:.4f}) -> {args.out} "
+          f"({os.path.getsize(args.out) / 1024:.1f} KiB)")
+    return result
+
+
+def evaluate(args):
+    from cada_vqvae.embeddings import FASHION_MNIST_CLASSES, ClassEmbeddingTable
+    from cada_vqvae.models import load_model
+    from cada_vqvae.quality import GenerationEvaluator, format_report
+    from cada_vqvae.word_vectors import load_word_vectors
+
+    evaluator = GenerationEvaluator.from_cache(_fashion_mnist(args.data_dir, False),
+                                               _fashion_mnist(args.data_dir, True), args.cache_dir)
+    device = args.device or "cpu"
+    model = load_model(args.checkpoint, args.latent_size, args.num_embeddings, device=device)
+    classes = list(FASHION_MNIST_CLASSES)
+    class_embeddings = ClassEmbeddingTable(classes, load_word_vectors(classes)).to(device)
+    report = evaluator(model, class_embeddings, samples_per_class=args.samples, seed=args.seed)
+    print(format_report(report))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m cada_vqvae", description="CADA-VQVAE few-shot image generation.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = commands.add_parser("train", help="train CADA_VAE on FashionMNIST")
+    _add_model_args(train_parser)
+    train_parser.add_argument("--epochs", type=int, default=50)
+    train_parser.add_argument("--batch-size", type=int, default=64)
+    train_parser.add_argument("--lr", type=float, default=1e-5)
+    add_objective_args(train_parser)
+    train_parser.add_argument("--amp", choices=["bfloat16", "float16"], help="autocast dtype")
+    train_parser.add_argument("--compile", action="store_true", help="torch.compile the train step")
+    train_parser.add_argument("--data-dir", default="./data")
+    train_parser.add_argument("--shard-dir", help="stream training images from memory-mapped shards")
+    train_parser.add_argument("--val-shard-dir",
+                              help="validate on this shard directory instead of FashionMNIST (with --shard-dir)")
+    train_parser.add_argument("--checkpoint-dir", default="./checkpoints")
+    train_parser.add_argument("--checkpoint-every", type=int, default=1000, help="steps between checkpoints")
+    train_parser.add_argument("--resume", action="store_true", help="continue from the latest checkpoint")
+    train_parser.add_argument("--profile", metavar="START:END", help="profile these training steps")
+    train_parser.add_argument("--background-val", action="store_true",
+                              help="validate weight snapshots in a background process while training continues")
+    train_parser.add_argument("--val-subset-per-class", type=int, help="size per class of the frequent-check subset")
+    train_parser.add_argument("--val-subset-every", type=int, help="steps between subset checks")
+    train_parser.add_argument("--val-full-every", type=int, default=1, help="epochs between full validations")
+    train_parser.add_argument("--val-threads", type=int, default=1, help="threads of the validation process")
+    train_parser.add_argument("--log-interval", type=int, default=100)
+    train_parser.add_argument("--plot-dir", help="save the loss curves here")
+    train_parser.add_argument("--show", action="store_true", help="show the loss curves")
+    train_parser.add_argument("--device")
+    train_parser.set_defaults(func=train)
+
+    generate_parser = commands.add_parser("generate", help="generate images for words")
+    source = generate_parser.add_mutually_exclusive_group()
+    source.add_argument("--checkpoint", help="checkpoint file or directory (random weights if omitted)")
+    source.add_argument("--exported", help="generator written by the export command (loads with torch only)")
+    _add_model_args(generate_parser)
+    generate_parser.add_argument("--words", nargs="+", required=True)
+    generate_parser.add_argument("--samples", type=int, default=1, help="images per word")
+    generate_parser.add_argument("--seed", type=int, default=None)
+    generate_parser.add_argument("--out", help="write the (words, samples, 28, 28) array to this .npy file")
+    generate_parser.add_argument("--grid", help="write a PNG grid (one row per word)")
+    generate_parser.add_argument("--delta", help="apply a delta checkpoint written by the adapt command")
+    generate_parser.add_argument("--device")
+    generate_parser.set_defaults(func=generate_images)
+
+    visualize_parser = commands.add_parser("visualize", help="plot a 2-D projection of the latent space")
+    visualize_parser.add_argument("--checkpoint", help="checkpoint file or directory")
+    _add_model_args(visualize_parser)
+    visualize_parser.add_argument("--split", choices=["train", "test"], default="train")
+    visualize_parser.add_argument("--data-dir", default="./data")
+    visualize_parser.add_argument("--export-dir", default="data/latents")
+    visualize_parser.add_argument("--reuse", action="store_true", help="plot an existing export without the model")
+    visualize_parser.add_argument("--field", choices=["z_e", "mu_x"], default="z_e")
+    visualize_parser.add_argument("--per-class", type=int, default=500)
+    visualize_parser.add_argument("--method", choices=["tsne", "pca"], default="tsne")
+    visualize_parser.add_argument("--seed", type=int, default=0)
+    visualize_parser.add_argument("--out", help="save the figure instead of showing it")
+    visualize_parser.add_argument("--device")
+    visualize_parser.set_defaults(func=visualize)
+
+    adapt_parser = commands.add_parser("adapt", help="adapt the semantic branch to a new word from a few images")
+    adapt_parser.add_argument("--checkpoint", required=True, help="checkpoint file or directory of the base model")
+    _add_model_args(adapt_parser)
+    adapt_parser.add_argument("--word", required=True)
+    adapt_parser.add_argument("--images", required=True, help=".npy file of (K, 28, 28) support images")
+    adapt_parser.add_argument("--steps", type=int, default=300)
+    adapt_parser.add_argument("--lr", type=float, default=1e-3)
+    adapt_parser.add_argument("--replay-per-class", type=int, default=32,
+                              help="cached FashionMNIST images per existing class mixed into every batch (0: none)")
+    adapt_parser.add_argument("--data-dir", default="./data")
+    adapt_parser.add_argument("--threads", type=int)
+    adapt_parser.add_argument("--log-interval", type=int, default=100)
+    adapt_parser.add_argument("--out", default="adapted.delta.pt")
+    adapt_parser.set_defaults(func=adapt)
+
+    evaluate_parser = commands.add_parser("evaluate", help="score generations: per-class accuracy and FID")
+    evaluate_parser.add_argument("--checkpoint", help="checkpoint file or directory")
+    _add_model_args(evaluate_parser)
+    evaluate_parser.add_argument("--samples", type=int, default=1000, help="images generated per class")
+    evaluate_parser.add_argument("--seed", type=int, default=0)
+    evaluate_parser.add_argument("--data-dir", default="./data")
+    evaluate_parser.add_argument("--cache-dir", default=os.path.join("data", "quality"),
+                                 help="where the classifier and the real-image statistics are cached")
+    evaluate_parser.add_argument("--out", help="write the report to this JSON file")
+    evaluate_parser.add_argument("--device")
+    evaluate_parser.set_defaults(func=evaluate)
+
+    # Parsed by cada_vqvae.export; listed here for --help
+    commands.add_parser("export", add_help=False, help="export the generation path for CPU inference")
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv[:1] == ["export"]:
+        # Options (including -h) belong to the export module's own parser
+        from cada_vqvae import export
+        return export.main(argv[1:])
+    args = build_parser().parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,158 @@
+"""Nearest-codeword search for ``VectorQuantizer``.
+
+The original quantizer materializes the full ``(N, num_embeddings)`` distance
+matrix and recomputes ``||e||^2`` for the whole codebook on every call, which
+is fine for 512 codes but not for 16k-64k. ``CodebookSearch`` computes the
+distances in row blocks with a capped number of elements, caches the codebook
+norms while the weights are frozen, and optionally answers queries
+approximately through a coarse-to-fine (inverted-list) index for inference.
+"""
+
+import math
+
+import torch
+
+
+class CodebookSearch:
+    """Exact blocked or approximate coarse-to-fine nearest-code search.
+
+    Args:
+        max_block_elements: Upper bound on the number of distance entries
+            materialized at once; caps the peak memory of a search.
+        approximate: Use the inverted-list index instead of the exact search.
+            ``VectorQuantizer`` only honours this in eval mode.
+        num_lists: Number of coarse centroids of the index (defaults to
+            ``sqrt(num_embeddings)``).
+        num_probes: Coarse lists scanned per query; more probes trade speed
+            for recall.
+        kmeans_iters: Lloyd iterations used to build the coarse centroids.
+        seed: Seed for the centroid initialisation.
+
+    Cached state (codebook norms, the index) is only meant for a codebook that
+    does not change between searches; pass ``cache=False`` while training.
+    Fused optimizers and writes through ``weight.data`` do not reliably bump
+    the tensor's version counter, so call ``invalidate()`` whenever the
+    weights change outside training (``VectorQuantizer`` does so on
+    ``train()``/``eval()`` and ``load_state_dict``). A different codebook
+    tensor, shape, dtype or device still rebuilds the cache on its own.
+
+    Under ``torch.compile`` searches are exact and uncached: the cache key
+    and the index build are host-side and would break the graph.
+    """
+
+    def __init__(self, max_block_elements=1 << 22, approximate=False, num_lists=None, num_probes=8,
+                 kmeans_iters=10, seed=0):
+        self.max_block_elements = max_block_elements
+        self.approximate = approximate
+        self.num_lists = num_lists
+        self.num_probes = num_probes
+        self.kmeans_iters = kmeans_iters
+        self.seed = seed
+        self.invalidate()
+
+    def invalidate(self):
+        """Drop cached norms and the approximate index."""
+        self._norms_key = None
+        self._norms = None
+        self._index_key = None
+        self._index = None
+
+    @staticmethod
+    def _key(weight):
+        return (weight.data_ptr(), tuple(weight.shape), weight.dtype, weight.device)
+
+    def codebook_norms(self, weight, cache=True):
+        """``||e||^2`` for every code, cached until ``invalidate()`` unless ``cache=False``."""
+        if not cache:
+            return weight.detach().pow(2).sum(dim=1)
+        key = self._key(weight)
+        if key != self._norms_key:
+            self._norms = weight.detach().pow(2).sum(dim=1)
+            self._norms_key = key
+        return self._norms
+
+    def _rows_per_block(self, columns):
+        return max(1, self.max_block_elements // max(1, columns))
+
+    @staticmethod
+    def _nearest_exact(inputs, codes, norms, rows_per_block):
+        indices = torch.empty(inputs.shape[0], dtype=torch.long, device=inputs.device)
+        for start in range(0, inputs.shape[0], rows_per_block):
+            block = inputs[start:start + rows_per_block]
+            # ||x||^2 is constant along a row, so it cannot change the argmin
+            distances = torch.addmm(norms, block, codes.t(), alpha=-2)
+            indices[start:start + rows_per_block] = distances.argmin(dim=1)
+        return indices
+
+    def build_index(self, weight):
+        """Cluster the codebook into inverted lists (done lazily by ``search``)."""
+        codes = weight.detach()
+        num_codes = codes.shape[0]
+        num_lists = min(num_codes, self.num_lists or max(1, int(math.sqrt(num_codes))))
+        generator = torch.Generator(device="cpu").manual_seed(self.seed)
+        init = torch.randperm(num_codes, generator=generator)[:num_lists].to(codes.device)
+        centroids = codes[init].clone()
+
+        ones = torch.ones(num_codes, dtype=codes.dtype, device=codes.device)
+        for _ in range(self.kmeans_iters):
+            assignment = self._nearest_exact(codes, centroids, centroids.pow(2).sum(dim=1),
+                                             self._rows_per_block(num_lists))
+            sums = torch.zeros_like(centroids).index_add_(0, assignment, codes)
+            counts = torch.zeros(num_lists, dtype=codes.dtype, device=codes.device).index_add_(0, assignment, ones)
+            centroids = torch.where(counts.unsqueeze(1) > 0, sums / counts.clamp(min=1).unsqueeze(1), centroids)
+        assignment = self._nearest_exact(codes, centroids, centroids.pow(2).sum(dim=1),
+                                         self._rows_per_block(num_lists))
+
+        # Pad the inverted lists into one (num_lists, max_list_size) table; -1 marks padding
+        order = torch.argsort(assignment, stable=True)
+        sizes = torch.bincount(assignment, minlength=num_lists)
+        offsets = torch.cumsum(sizes, dim=0) - sizes
+        sorted_lists = assignment[order]
+        positions = torch.arange(num_codes, device=codes.device) - offsets[sorted_lists]
+        lists = torch.full((num_lists, int(sizes.max())), -1, dtype=torch.long, device=codes.device)
+        lists[sorted_lists, positions] = order
+
+        self._index = (centroids, centroids.pow(2).sum(dim=1), lists)
+        self._index_key = self._key(weight)
+        return self._index
+
+    def _nearest_approximate(self, inputs, weight, norms):
+        if self._index_key != self._key(weight):
+            self.build_index(weight)
+        centroids, centroid_norms, lists = self._index
+        codes = weight.detach()
+        num_probes = min(self.num_probes, centroids.shape[0])
+        candidates_per_row = num_probes * lists.shape[1]
+        rows_per_block = self._rows_per_block(candidates_per_row * codes.shape[1])
+
+        indices = torch.empty(inputs.shape[0], dtype=torch.long, device=inputs.device)
+        for start in range(0, inputs.shape[0], rows_per_block):
+            block = inputs[start:start + rows_per_block]
+            coarse = torch.addmm(centroid_norms, block, centroids.t(), alpha=-2)
+            probes = coarse.topk(num_probes, dim=1, largest=False).indices
+            candidates = lists[probes].reshape(block.shape[0], -1)
+            valid = candidates >= 0
+            candidates = candidates.clamp(min=0)
+            distances = norms[candidates] - 2 * torch.bmm(codes[candidates], block.unsqueeze(2)).squeeze(2)
+            distances = distances.masked_fill(~valid, float("inf"))
+            best = distances.argmin(dim=1, keepdim=True)
+            indices[start:start + rows_per_block] = candidates.gather(1, best).squeeze(1)
+        return indices
+
+    @torch.no_grad()
+    def search(self, inputs, weight, approximate=None, cache=True):
+        """Index of the nearest code in ``weight`` for every row of ``inputs``.
+
+        With ``cache=False`` the codebook norms are recomputed and no cached
+        state is read or written, for a codebook that changes every step.
+        """
+        approximate = self.approximate if approximate is None else approximate
+        if torch.compiler.is_compiling():
+            approximate, cache = False, False
+        if approximate and not cache:
+            raise ValueError("approximate search needs the cached index (cache=True)")
+        inputs = inputs.detach()
+        norms = self.codebook_norms(weight, cache=cache)
+        if approximate:
+            return self._nearest_approximate(inputs, weight, norms)
+        return self._nearest_exact(inputs, weight.detach(), norms, self._rows_per_block(weight.shape[0]))
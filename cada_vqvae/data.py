@@ -0,0 +1,136 @@
+"""Pre-decoded in-memory batching for FashionMNIST-style datasets.
+
+Going through ``DataLoader`` sends every 28x28 sample through PIL,
+``transforms.ToTensor()`` and a ``Lambda`` one at a time, which costs more
+than the model's forward pass. ``TensorBatchLoader`` keeps the raw uint8
+images as one contiguous tensor and turns each batch into float pixels with
+a single vectorized op.
+"""
+
+import math
+
+import numpy as np
+import torch
+from torch.utils.data import RandomSampler
+
+
+class SharedImages:
+    """``.data``/``.targets`` view over tensors (e.g. in shared memory), as ``TensorBatchLoader`` expects."""
+
+    def __init__(self, data, targets):
+        self.data = data
+        self.targets = targets
+
+    def __len__(self):
+        return len(self.data)
+
+
+class TensorBatchLoader:
+    """Drop-in replacement for ``DataLoader(dataset, batch_size, shuffle)``.
+
+    Args:
+        dataset: A torchvision MNIST-family dataset (anything exposing uint8
+            ``.data`` of shape ``(N, H, W)`` and integer ``.targets``). Its
+            ``transform`` is bypassed; batches match ``ToTensor()`` followed by
+            flattening, i.e. ``(B, H*W)`` floats in ``[0, 1]``.
+        batch_size: Samples per batch; the last batch may be smaller.
+        shuffle: Draw a fresh permutation every epoch.
+        generator: Optional ``torch.Generator`` driving the shuffle. With the
+            same generator state (or the same global seed when ``None``) the
+            batches are identical to ``DataLoader(dataset, batch_size,
+            shuffle, generator=generator)``.
+        device: Keep the whole uint8 dataset on this device and build batches
+            there. ``None`` keeps it on the CPU.
+        pin_memory: Return CPU batches in pinned memory, like ``DataLoader``.
+        mean, std: Optional normalization applied after scaling to ``[0, 1]``.
+        rank, world_size: Yield only this rank's share of every epoch, like
+            ``DistributedSampler``: the epoch's order is split round-robin
+            across ``world_size`` ranks, padded by repeating samples so every
+            rank gets the same number of batches. All ranks must use
+            identically seeded generators.
+        pad: With ``world_size > 1``, pad the ranks' shares to equal size.
+            Pass ``False`` for validation, where repeated samples would be
+            counted twice by a cross-rank mean; ranks then differ by at most
+            one sample.
+    """
+
+    def __init__(self, dataset, batch_size=1, shuffle=False, generator=None, device=None,
+                 pin_memory=False, mean=None, std=None, rank=0, world_size=1, pad=True):
+        if not hasattr(dataset, "data") or not hasattr(dataset, "targets"):
+            raise TypeError("TensorBatchLoader needs a dataset exposing .data and .targets, "
+                            f"got {type(dataset).__name__}")
+        images = dataset.data
+        if not torch.is_tensor(images):
+            images = torch.from_numpy(np.asarray(images))
+        self.images = images.reshape(len(images), -1).contiguous()
+        self.targets = torch.as_tensor(dataset.targets, dtype=torch.long)
+        if device is not None:
+            self.images = self.images.to(device)
+            self.targets = self.targets.to(device)
+
+        self.dataset = dataset
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.generator = generator
+        self.pin_memory = pin_memory and self.images.device.type == "cpu"
+        self.mean = mean
+        self.std = std
+        self.rank = rank
+        self.world_size = world_size
+        self.pad = pad
+
+    def _num_samples(self):
+        if not self.pad:
+            return len(range(self.rank, len(self.images), self.world_size))
+        return math.ceil(len(self.images) / self.world_size)
+
+    def __len__(self):
+        return math.ceil(self._num_samples() / self.batch_size)
+
+    def _permutation(self):
+        n = len(self.images)
+        # Consume the RNG exactly like DataLoader's iterator does (one draw for
+        # its base seed, then RandomSampler), so both paths see the same order
+        torch.empty((), dtype=torch.int64).random_(generator=self.generator)
+        if not self.shuffle:
+            return None
+        order = torch.tensor(list(RandomSampler(range(n), generator=self.generator)), dtype=torch.long)
+        return order.to(self.images.device)
+
+    def _rank_order(self):
+        order = self._permutation()
+        if self.world_size == 1:
+            return order
+        n = len(self.images)
+        if order is None:
+            order = torch.arange(n, device=self.images.device)
+        padding = self._num_samples() * self.world_size - n if self.pad else 0
+        if padding:
+            order = torch.cat([order, order[:padding]])
+        return order[self.rank::self.world_size]
+
+    def _convert(self, images):
+        images = images.float().div_(255)
+        if self.mean is not None:
+            images = images.sub_(self.mean).div_(self.std)
+        if self.pin_memory:
+            images = images.pin_memory()
+        return images
+
+    def batches(self, start_batch=0):
+        """Iterate over one epoch, optionally skipping the first ``start_batch`` batches."""
+        order = self._rank_order()
+        n = self._num_samples()
+        for start in range(start_batch * self.batch_size, n, self.batch_size):
+            end = min(start + self.batch_size, n)
+            if order is None:
+                images, targets = self.images[start:end], self.targets[start:end]
+            else:
+                index = order[start:end]
+                images, targets = self.images[index], self.targets[index]
+            if self.pin_memory:
+                targets = targets.pin_memory()
+            yield self._convert(images), targets
+
+    def __iter__(self):
+        return self.batches()
@@ -0,0 +1,187 @@
+"""Data-parallel CPU training of ``CADA_VAE`` over ``torch.distributed`` (gloo).
+
+Every rank trains a replica on its share of the training set;
+``DistributedDataParallel`` all-reduces the gradients (including the
+codebook's when it is trained by gradient) and ``VectorQuantizer`` all-reduces
+its EMA statistics. Intra-op threads are split between the ranks so N
+processes do not oversubscribe the cores.
+
+Launch with the built-in spawner:
+
+    python -m cada_vqvae.distributed --nproc 4 --epochs 1
+
+or under ``torchrun``, which sets ``RANK``/``WORLD_SIZE``/``MASTER_ADDR``:
+
+    torchrun --nproc-per-node 4 -m cada_vqvae.distributed --epochs 1
+
+``--synthetic N`` trains on N random images instead of FashionMNIST (no
+download or word vectors needed), which is what
+``benchmarks/bench_ddp_scaling.py`` uses to measure scaling efficiency.
+"""
+
+import argparse
+import os
+import socket
+
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+
+from cada_vqvae.cli import add_objective_args, objective_from_args
+from cada_vqvae.data import TensorBatchLoader
+from cada_vqvae.embeddings import FASHION_MNIST_CLASSES, ClassEmbeddingTable
+from cada_vqvae.models import CADA_VAE
+from cada_vqvae.trainer import Trainer
+
+
+def threads_per_rank(local_world_size):
+    """Even share of the machine's cores for one of ``local_world_size`` ranks on this host."""
+    return max(1, (os.cpu_count() or 1) // local_world_size)
+
+
+def init_process_group(rank=None, world_size=None, backend="gloo", threads=None):
+    """Join the process group described by the arguments or by ``torchrun``'s environment.
+
+    Sets the intra-op thread count of this rank to ``threads`` (default: an
+    even share of the cores). Returns ``(rank, world_size)``.
+    """
+    rank = int(os.environ.get("RANK", 0)) if rank is None else rank
+    world_size = int(os.environ.get("WORLD_SIZE", 1)) if world_size is None else world_size
+    local_world_size = int(os.environ.get("LOCAL_WORLD_SIZE", world_size))
+    torch.set_num_threads(threads or threads_per_rank(local_world_size))
+    os.environ.setdefault("MASTER_ADDR", "127.0.0.1")
+    os.environ.setdefault("MASTER_PORT", "29500")
+    dist.init_process_group(backend, rank=rank, world_size=world_size)
+    return rank, world_size
+
+
+def wrap_model(model, criterion=None):
+    """``DistributedDataParallel`` around ``model`` for CPU training.
+
+    Buffers are not broadcast: ``VectorQuantizer`` all-reduces the per-batch
+    code counts (and EMA sums) before updating ``code_usage``,
+    ``batch_perplexity``, ``cluster_size`` and ``ema_embed_sum``, so those
+    stay identical on every rank, and dead-code resets broadcast rank 0's
+    codebook. Only the recent-input ring buffer differs per rank (and only
+    rank 0's is used). Without cross reconstructions (the default
+    ``cada_vae_loss``), ``mu_c``/``logvar_c`` do not enter the loss, so
+    unused parameters have to be tolerated.
+    """
+    cross_reconstruction = criterion is not None and criterion.cross_reconstruction
+    return DistributedDataParallel(model, broadcast_buffers=False, find_unused_parameters=not cross_reconstruction)
+
+
+class SyntheticImages:
+    """Random uint8 ``(N, 28, 28)`` images and labels exposing ``.data``/``.targets`` like FashionMNIST."""
+
+    def __init__(self, num_samples, num_classes=10, seed=0):
+        generator = torch.Generator().manual_seed(seed)
+        self.data = torch.randint(0, 256, (num_samples, 28, 28), dtype=torch.uint8, generator=generator)
+        self.targets = torch.randint(0, num_classes, (num_samples,), generator=generator)
+
+    def __len__(self):
+        return len(self.data)
+
+
+def _datasets_and_vectors(args):
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        word_vectors = {word: rng.standard_normal(100).astype(np.float32) for word in FASHION_MNIST_CLASSES}
+        return SyntheticImages(args.synthetic), SyntheticImages(max(args.synthetic // 6, 1), seed=1), word_vectors
+
+    from torchvision import datasets
+
+    from cada_vqvae.word_vectors import load_word_vectors
+
+    train_dataset = datasets.FashionMNIST(args.data_dir, train=True, download=True)
+    val_dataset = datasets.FashionMNIST(args.data_dir, train=False, download=True)
+    return train_dataset, val_dataset, load_word_vectors(FASHION_MNIST_CLASSES)
+
+
+def train_worker(rank, world_size, args, result_queue=None):
+    """Entry point of one rank: builds the data, model and ``Trainer`` and runs ``args.epochs`` epochs."""
+    rank, world_size = init_process_group(rank, world_size, threads=args.threads)
+    try:
+        torch.manual_seed(args.seed)
+        train_dataset, val_dataset, word_vectors = _datasets_and_vectors(args)
+        # Same seed on every rank: the epoch order is drawn identically and split by rank
+        generator = torch.Generator().manual_seed(args.seed)
+        train_loader = TensorBatchLoader(train_dataset, batch_size=args.batch_size, shuffle=True,
+                                         generator=generator, rank=rank, world_size=world_size)
+        # Unpadded, so no validation sample is counted twice in the cross-rank mean
+        val_loader = TensorBatchLoader(val_dataset, batch_size=args.batch_size, rank=rank, world_size=world_size,
+                                       pad=False)
+
+        criterion, vq_kwargs = objective_from_args(args)
+        model = CADA_VAE(args.latent_size, args.num_embeddings, 100, **vq_kwargs)
+        class_embeddings = ClassEmbeddingTable(FASHION_MNIST_CLASSES, word_vectors)
+        ddp_model = wrap_model(model, criterion)
+        optimizer = torch.optim.Adam(ddp_model.parameters(), lr=args.lr)
+
+        checkpoint_manager = None
+        if rank == 0 and args.checkpoint_dir:
+            from cada_vqvae.checkpoint import CheckpointManager
+            checkpoint_manager = CheckpointManager(args.checkpoint_dir)
+        trainer = Trainer(ddp_model, optimizer, class_embeddings, criterion=criterion,
+                          log_interval=args.log_interval if rank == 0 else 0,
+                          log_fn=print if rank == 0 else (lambda *_: None),
+                          checkpoint_manager=checkpoint_manager)
+        trainer.fit(train_loader, val_loader, args.epochs)
+        if rank == 0 and result_queue is not None:
+            result_queue.put({"world_size": world_size, "samples_per_sec": trainer.samples_per_sec,
+                              "val_total_loss": trainer.val_losses["total_loss"]})
+    finally:
+        dist.destroy_process_group()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def launch(args, nproc):
+    """Run ``train_worker`` in ``nproc`` local processes; returns rank 0's result dict."""
+    os.environ["MASTER_ADDR"] = "127.0.0.1"
+    os.environ["MASTER_PORT"] = str(_free_port())
+    # The spawner owns the whole machine, so torchrun's variables must not leak in
+    os.environ["LOCAL_WORLD_SIZE"] = str(nproc)
+    context = mp.get_context("spawn")
+    result_queue = context.SimpleQueue()
+    mp.start_processes(train_worker, args=(nproc, args, result_queue), nprocs=nproc, start_method="spawn")
+    return result_queue.get()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Data-parallel CPU training of CADA_VAE (gloo).")
+    parser.add_argument("--nproc", type=int, default=None,
+                        help="spawn this many local ranks (omit under torchrun)")
+    parser.add_argument("--threads", type=int, default=None, help="intra-op threads per rank (default: cores / ranks)")
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=64, help="per-rank batch size")
+    parser.add_argument("--lr", type=float, default=1e-5)
+    parser.add_argument("--latent-size", type=int, default=20)
+    parser.add_argument("--num-embeddings", type=int, default=512)
+    add_objective_args(parser)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default="./data")
+    parser.add_argument("--synthetic", type=int, default=0, metavar="N", help="train on N random images")
+    parser.add_argument("--checkpoint-dir", default=None)
+    parser.add_argument("--log-interval", type=int, default=100)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.nproc is None:
+        # Started by torchrun (or as a single process)
+        train_worker(None, None, args)
+    else:
+        result = launch(args, args.nproc)
+        print(f"{args.nproc} ranks: {result['samples_per_sec'][-1]:.0f} samples/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Device-resident class-embedding table.
+
+``get_semantic_embedding`` in the training script builds one tensor per
+sample from a word-vector lookup on the CPU, which forces a device sync and
+dozens of small allocations per batch. ``ClassEmbeddingTable`` looks every
+class word up once and turns the per-batch lookup into a single index op on
+the label tensor, wherever the labels already live.
+"""
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+# FashionMNIST label -> word. Label 0 ("T-shirt/top") and label 6 ("Shirt")
+# intentionally share the word "shirt".
+FASHION_MNIST_CLASSES = [
+    "shirt", "trouser", "pullover", "dress", "coat",
+    "sandal", "shirt", "sneaker", "bag", "boot"
+]
+
+
+class ClassEmbeddingTable(nn.Module):
+    """``(num_classes, embedding_dim)`` table of class word vectors.
+
+    Args:
+        classes: Word for every class label, indexed by label.
+        word_vectors: Anything supporting ``word_vectors[word]`` (gensim
+            ``KeyedVectors`` or a ``WordVectorStore``).
+        aliases: Optional ``{class_name: word}`` mapping for class names that
+            are not in the word-vector vocabulary (e.g. ``"ankle boot"``).
+
+    Classes that resolve to the same word (such as the duplicated "shirt")
+    share a single lookup and get identical rows.
+    """
+
+    def __init__(self, classes, word_vectors, aliases=None):
+        super(ClassEmbeddingTable, self).__init__()
+        aliases = aliases or {}
+        self.classes = list(classes)
+        self.words = [aliases.get(cls, cls) for cls in self.classes]
+
+        unique_words = list(dict.fromkeys(self.words))
+        vectors = np.stack([np.asarray(word_vectors[w], dtype=np.float32) for w in unique_words])
+        rows = torch.tensor([unique_words.index(w) for w in self.words], dtype=torch.long)
+        self.register_buffer("table", torch.from_numpy(vectors)[rows])
+
+    @classmethod
+    def from_table(cls, classes, table, aliases=None):
+        """Wrap an existing ``(num_classes, embedding_dim)`` tensor without copying it (e.g. one in shared memory).
+
+        ``aliases`` resolves ``words`` as in the constructor; pass the source
+        table's ``dict(zip(classes, words))`` to keep its lookup words.
+        """
+        aliases = aliases or {}
+        module = cls.__new__(cls)
+        nn.Module.__init__(module)
+        module.classes = list(classes)
+        module.words = [aliases.get(cls, cls) for cls in module.classes]
+        module.register_buffer("table", table)
+        return module
+
+    @property
+    def embedding_dim(self):
+        return self.table.shape[1]
+
+    def forward(self, labels):
+        """Return the embeddings of ``labels`` (a LongTensor on the table's device)."""
+        return self.table[labels]
@@ -0,0 +1,155 @@
+"""Standalone, optionally int8-quantized export of the semantic-to-image path.
+
+Generation only needs ``semantic_encoder`` (without the codebook: ``generate``
+samples from ``mu_c``/``logvar_c``), ``reparameterize`` and
+``image_decoder``. ``export_generator`` extracts that path into a TorchScript
+file holding the word vectors of a vocabulary, optionally with every
+``nn.Linear`` dynamically quantized to int8, and reports latency, serialized
+size and output drift against the eager float32 model:
+
+    python -m cada_vqvae.export --checkpoint checkpoints/best.pt --out generator.pt --quantize
+
+Loading the artifact needs only torch (no gensim, no training code):
+
+    generator, words = load_exported("generator.pt")
+    images = generator.generate_words(torch.tensor([words.index("dress")]), torch.randn(1, 20))
+"""
+
+import argparse
+import copy
+import io
+import json
+import os
+import statistics
+import time
+
+import torch
+import torch.nn as nn
+
+VOCAB_FILE = "vocab.json"
+
+
+class SemanticToImage(nn.Module):
+    """``word vector -> (mu_c, logvar_c) -> reparameterize -> image`` as one module.
+
+    ``forward(embeddings, eps)`` takes ``(N, 100)`` word vectors and ``(N,
+    latent_size)`` standard normal noise and returns ``(N, 784)`` images in
+    ``[0, 1]``. The vocabulary's vectors are kept as the ``vectors`` buffer for
+    ``generate_words``.
+    """
+
+    def __init__(self, model, vectors):
+        super(SemanticToImage, self).__init__()
+        semantic_encoder = model.semantic_encoder
+        self.encoder = semantic_encoder.encoder
+        self.fc_mu = semantic_encoder.fc_mu
+        self.fc_logvar = semantic_encoder.fc_logvar
+        self.decoder = model.image_decoder.decoder
+        self.register_buffer("vectors", vectors)
+
+    def forward(self, embeddings, eps):
+        z_e = self.encoder(embeddings)
+        mu_c = self.fc_mu(z_e)
+        logvar_c = self.fc_logvar(z_e)
+        latent_c = mu_c + eps * torch.exp(0.5 * logvar_c)
+        return self.decoder(latent_c).clamp(0, 1)
+
+    @torch.jit.export
+    def generate_words(self, word_indices, eps):
+        """Images for rows ``word_indices`` of the vocabulary."""
+        return self.forward(self.vectors[word_indices], eps)
+
+
+def load_exported(path, map_location="cpu"):
+    """``(module, words)`` of an artifact written by ``export_generator``."""
+    extra_files = {VOCAB_FILE: ""}
+    module = torch.jit.load(path, map_location=map_location, _extra_files=extra_files)
+    return module.eval(), json.loads(extra_files[VOCAB_FILE])
+
+
+def _median_ms(fn, repeats=50):
+    for _ in range(5):
+        fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1e3
+
+
+def _serialized_size(module):
+    buffer = io.BytesIO()
+    torch.jit.save(module, buffer)
+    return buffer.tell()
+
+
+@torch.no_grad()
+def export_generator(model, words, word_vectors, out, quantize=False, batch_size=64, seed=0):
+    """Write the generation path of ``model`` for ``words`` to ``out`` and return a report dict.
+
+    The report compares the exported module with the eager float32 one on
+    the same noise: median latency per batch of ``batch_size`` images,
+    serialized size (the bytes on disk, not resident memory), and the
+    mean/max absolute pixel difference. ``model`` itself is left untouched;
+    the export works on a CPU copy in eval mode.
+    """
+    model = copy.deepcopy(model).cpu().eval()
+    vectors = torch.stack([torch.as_tensor(word_vectors[word], dtype=torch.float32) for word in words])
+    eager = SemanticToImage(model, vectors).eval()
+    exported = eager
+    if quantize:
+        exported = torch.ao.quantization.quantize_dynamic(eager, {nn.Linear}, dtype=torch.qint8)
+    scripted = torch.jit.script(exported)
+    torch.jit.save(scripted, out, _extra_files={VOCAB_FILE: json.dumps(list(words))})
+
+    generator = torch.Generator().manual_seed(seed)
+    latent_size = eager.fc_mu.out_features
+    indices = torch.arange(batch_size) % len(words)
+    eps = torch.randn(batch_size, latent_size, generator=generator)
+    reference = eager.generate_words(indices, eps)
+    loaded, _ = load_exported(out)
+    output = loaded.generate_words(indices, eps)
+    drift = (output - reference).abs()
+
+    return {
+        "quantized": quantize,
+        "batch_size": batch_size,
+        "eager_fp32_ms": _median_ms(lambda: eager.generate_words(indices, eps)),
+        "exported_ms": _median_ms(lambda: loaded.generate_words(indices, eps)),
+        "eager_fp32_bytes": _serialized_size(torch.jit.script(eager)),
+        "exported_bytes": os.path.getsize(out),
+        "mean_abs_drift": drift.mean().item(),
+        "max_abs_drift": drift.max().item(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the semantic-to-image generation path for CPU inference.")
+    parser.add_argument("--checkpoint", help="Trainer checkpoint or model state dict (random weights if omitted)")
+    parser.add_argument("--out", default="generator.pt")
+    parser.add_argument("--quantize", action="store_true", help="int8 dynamic quantization of the Linear layers")
+    parser.add_argument("--words", nargs="+", help="vocabulary to embed (default: the FashionMNIST class words)")
+    parser.add_argument("--latent-size", type=int, default=20)
+    parser.add_argument("--num-embeddings", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=64, help="images per batch in the latency report")
+    args = parser.parse_args(argv)
+
+    from cada_vqvae.embeddings import FASHION_MNIST_CLASSES
+    from cada_vqvae.models import load_model
+    from cada_vqvae.word_vectors import load_word_vectors
+
+    words = args.words or list(dict.fromkeys(FASHION_MNIST_CLASSES))
+    model = load_model(args.checkpoint, args.latent_size, args.num_embeddings)
+    report = export_generator(model, words, load_word_vectors(words), args.out, quantize=args.quantize,
+                              batch_size=args.batch_size)
+    print(f"Wrote {args.out} ({len(words)} words, {'int8 dynamic' if args.quantize else 'float32'})")
+    print(f"latency per {report['batch_size']} images: eager fp32 {report['eager_fp32_ms']:.3f} ms, "
+          f"exported {report['exported_ms']:.3f} ms")
+    print(f"size: eager fp32 {report['eager_fp32_bytes'] / 1024:.1f} KiB, "
+          f"exported {report['exported_bytes'] / 1024:.1f} KiB")
+    print(f"drift vs eager fp32: mean {report['mean_abs_drift']:.2e}, max {report['max_abs_drift']:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Batched semantic-to-image generation.
+
+Generation runs ``semantic_encoder`` once over all requested words, then
+decodes ``reparameterize`` samples through ``image_decoder`` in fixed-size
+chunks, writing each chunk straight into the output array (optionally a
+``.npy`` file on disk), so thousands of images per word is one call.
+"""
+
+import numpy as np
+import torch
+
+IMAGE_SHAPE = (28, 28)
+
+
+def as_embeddings(inputs, word_vectors=None):
+    """``(W, 100)`` float tensor from a list of words, a list of vectors or a tensor."""
+    if torch.is_tensor(inputs):
+        return inputs.float()
+    vectors = []
+    for item in inputs:
+        if isinstance(item, str):
+            if word_vectors is None:
+                raise ValueError(f"word_vectors is required to look up {item!r}")
+            item = word_vectors[item]
+        vectors.append(np.asarray(item, dtype=np.float32))
+    return torch.from_numpy(np.stack(vectors))
+
+
+def _make_generator(seed, device):
+    if seed is None:
+        return None
+    return torch.Generator(device=device).manual_seed(seed)
+
+
+@torch.no_grad()
+def generate(model, inputs, word_vectors=None, samples_per_word=1, chunk_size=1024, seed=None, device=None,
+             out=None, latent_cache=None):
+    """Generate ``samples_per_word`` images for every word or embedding in ``inputs``.
+
+    Args:
+        model: A trained ``CADA_VAE``.
+        inputs: Words (looked up in ``word_vectors``), word vectors, or a
+            ``(W, 100)`` tensor of embeddings.
+        samples_per_word: Images drawn per word.
+        chunk_size: Images decoded per forward of ``image_decoder``.
+        seed: Seed for the latent noise. The same seed and ``chunk_size``
+            give the same images.
+        device: Device to run on (defaults to the model's).
+        out: Optional ``.npy`` path; images are streamed into it through a
+            memory map instead of being held in RAM.
+        latent_cache: Optional ``SemanticLatentCache`` for ``model``; cached
+            words skip the semantic encoder.
+
+    Returns:
+        ``(W, samples_per_word, 28, 28)`` float32 array in ``[0, 1]`` (a
+        ``numpy.memmap`` when ``out`` is given).
+    """
+    model.eval()
+    device = torch.device(device) if device is not None else next(model.parameters()).device
+    # The semantic encoder runs once for all words; only the noise differs per sample
+    if latent_cache is not None:
+        mu_c, logvar_c = latent_cache.get(inputs, word_vectors)[:2]
+    else:
+        mu_c, logvar_c = model.semantic_encoder(as_embeddings(inputs, word_vectors).to(device))[:2]
+    num_words = mu_c.shape[0]
+    std_c = torch.exp(0.5 * logvar_c)
+    generator = _make_generator(seed, device)
+
+    shape = (num_words, samples_per_word) + IMAGE_SHAPE
+    if out is not None:
+        images = np.lib.format.open_memmap(out, mode="w+", dtype=np.float32, shape=shape)
+    else:
+        images = np.empty(shape, dtype=np.float32)
+    flat_images = images.reshape(num_words * samples_per_word, -1)
+
+    total = num_words * samples_per_word
+    for start in range(0, total, chunk_size):
+        end = min(start + chunk_size, total)
+        rows = torch.arange(start, end, device=device) // samples_per_word
+        eps = torch.randn(end - start, mu_c.shape[1], generator=generator, device=device)
+        latent_c = mu_c[rows] + eps * std_c[rows]
+        flat_images[start:end] = model.image_decoder(latent_c).clamp_(0, 1).cpu().numpy()
+
+    if out is not None:
+        images.flush()
+    return images
+
+
+def save_image_grid(images, path, max_columns=16):
+    """Write a ``(W, S, H, W)`` image array as a PNG grid: one row per word, up to ``max_columns`` samples.
+
+    Rows are read one at a time, so ``images`` can be a memory-mapped ``.npy``.
+    """
+    from PIL import Image
+
+    num_words, samples = images.shape[:2]
+    columns = min(samples, max_columns)
+    height, width = images.shape[2:]
+    grid = np.zeros((num_words * height, columns * width), dtype=np.uint8)
+    for row in range(num_words):
+        tiles = np.asarray(images[row, :columns])
+        grid[row * height:(row + 1) * height] = (tiles.transpose(1, 0, 2).reshape(height, columns * width)
+                                                 * 255).round().astype(np.uint8)
+    Image.fromarray(grid).save(path)
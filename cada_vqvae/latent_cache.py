@@ -0,0 +1,154 @@
+"""LRU cache of semantic latent parameters.
+
+In eval mode ``model.semantic_encoder`` maps a given word vector to the same
+``(mu_c, logvar_c, z_q)`` every time; only the ``reparameterize`` noise
+differs between samples. ``SemanticLatentCache`` memoizes the encoder
+(including the VQ code search) per word or per embedding, so repeated
+generation for popular words costs a noise draw and an ``image_decoder``
+forward. Entries are dropped when the encoder's weights are loaded or stepped
+by an optimizer. The cache is only correct while the weights change through
+those paths: anything else (an in-place edit, a manual update loop) must be
+followed by ``invalidate()``, or stale latents are served.
+"""
+
+import collections
+import hashlib
+import weakref
+
+import numpy as np
+import torch
+from torch.optim.optimizer import register_optimizer_step_post_hook
+
+from cada_vqvae.generation import as_embeddings
+
+
+class SemanticLatentCache:
+    """Eviction-bounded ``word/embedding -> (mu_c, logvar_c, z_q)`` cache.
+
+    Args:
+        model: The ``CADA_VAE`` whose ``semantic_encoder`` is cached. It
+            should be in eval mode when the cache is queried.
+        maxsize: Maximum number of cached entries (least recently used ones
+            are evicted first).
+
+    Words are keyed by the word itself, raw vectors by a hash of their bytes.
+    Version counters miss fused optimizer updates and ``.data`` writes, so
+    invalidation is explicit: hooks clear the cache after
+    ``load_state_dict`` of the model (or its ``semantic_encoder``) and after
+    every optimizer step that updates an encoder parameter. Replaced
+    parameter tensors are detected through their storage pointers, but an
+    in-place update of an existing tensor outside an optimizer step (e.g.
+    ``p.data.add_(...)`` or ``copy_``) keeps the same pointer and is not
+    detected: whatever makes such a change must call ``invalidate()``.
+    """
+
+    def __init__(self, model, maxsize=4096):
+        self.model = model
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()
+        self._weights_version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        # The hooks only hold a weak reference, and are removed with the cache
+        ref = weakref.ref(self)
+
+        def after_load(module, incompatible_keys):
+            cache = ref()
+            if cache is not None:
+                cache.invalidate()
+
+        def after_step(optimizer, args, kwargs):
+            cache = ref()
+            if cache is not None and cache._updates_encoder(optimizer):
+                cache.invalidate()
+
+        handles = [model.semantic_encoder.register_load_state_dict_post_hook(after_load),
+                   register_optimizer_step_post_hook(after_step)]
+        weakref.finalize(self, lambda: [handle.remove() for handle in handles])
+
+    def _updates_encoder(self, optimizer):
+        encoder_params = {id(p) for p in self.model.semantic_encoder.parameters()}
+        return any(id(p) in encoder_params for group in optimizer.param_groups for p in group["params"])
+
+    def invalidate(self):
+        """Drop every entry; required after changing the encoder's weights outside the hooks."""
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+
+    def _current_weights_version(self):
+        return tuple(p.data_ptr() for p in self.model.semantic_encoder.parameters())
+
+    def _check_weights(self):
+        version = self._current_weights_version()
+        if version != self._weights_version:
+            self.invalidate()
+            self._weights_version = version
+
+    @staticmethod
+    def key(item):
+        if isinstance(item, str):
+            return ("word", item)
+        vector = item.detach().cpu().numpy() if torch.is_tensor(item) else item
+        return ("vector", hashlib.sha1(np.ascontiguousarray(vector, dtype=np.float32).tobytes()).hexdigest())
+
+    @torch.no_grad()
+    def get(self, inputs, word_vectors=None, embeddings=None):
+        """Latent parameters for every item of ``inputs``.
+
+        Args:
+            inputs: Words, word vectors, or a ``(N, 100)`` tensor.
+            word_vectors: Used to look up words that miss the cache.
+            embeddings: Optional ``(N, 100)`` tensor of the embeddings of
+                ``inputs``, used for misses instead of a lookup.
+
+        Returns:
+            ``(mu_c, logvar_c, z_q)``, each ``(N, latent_size)``, on the model's device.
+        """
+        self._check_weights()
+        items = list(inputs)
+        keys = [self.key(item) for item in items]
+
+        missing = {}
+        for i, key in enumerate(keys):
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+                missing.setdefault(key, i)
+
+        computed = {}
+        if missing:
+            positions = list(missing.values())
+            if embeddings is not None:
+                missing_embeddings = embeddings[positions].float()
+            else:
+                missing_embeddings = as_embeddings([items[i] for i in positions], word_vectors)
+            device = next(self.model.parameters()).device
+            mu_c, logvar_c, z_q = self.model.semantic_encoder(missing_embeddings.to(device))[:3]
+            for row, key in enumerate(missing):
+                computed[key] = (mu_c[row], logvar_c[row], z_q[row])
+
+        rows = [computed[key] if key in computed else self._entries[key] for key in keys]
+        for key, value in computed.items():
+            self._entries[key] = value
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return tuple(torch.stack(parts) for parts in zip(*rows))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
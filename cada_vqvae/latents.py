@@ -0,0 +1,146 @@
+"""Latent export to memory-mapped storage and bounded-cost projections.
+
+``export_latents`` runs the encoders over a loader once and streams, batch by
+batch, the image latent mean ``mu_x``, the semantic encoding ``z_e`` and its
+codebook index into ``.npy`` files next to the labels. ``LatentExport`` opens
+such a directory read-only through memory maps, so several plots or analyses
+can reuse one export. ``stratified_sample`` and ``project`` keep t-SNE cheap:
+a fixed number of points per class, optionally reduced with PCA first.
+"""
+
+import json
+import os
+
+import numpy as np
+import torch
+
+LATENT_FIELDS = ("mu_x", "z_e", "codes", "labels")
+
+
+@torch.no_grad()
+def export_latents(model, loader, class_embeddings, out_dir, num_samples=None, device=None):
+    """Write the latents of every sample yielded by ``loader`` to ``out_dir``.
+
+    Args:
+        model: A ``CADA_VAE``; only its image and semantic encoders run.
+        loader: Yields ``(images, labels)`` batches (``TensorBatchLoader``,
+            ``DataLoader`` or a sharded dataset loader).
+        class_embeddings: Maps a batch of labels to word vectors (e.g.
+            ``ClassEmbeddingTable``).
+        out_dir: Directory receiving ``mu_x.npy``, ``z_e.npy``, ``codes.npy``,
+            ``labels.npy`` and ``meta.json``.
+        num_samples: Rows to allocate. Defaults to ``len(loader.dataset)``;
+            required for loaders without a length. Export stops once it is
+            reached.
+        device: Device to run on (defaults to the model's).
+
+    Returns:
+        The ``LatentExport`` of ``out_dir``.
+    """
+    model.eval()
+    device = torch.device(device) if device is not None else next(model.parameters()).device
+    if num_samples is None:
+        try:
+            num_samples = len(loader.dataset)
+        except (AttributeError, TypeError):
+            raise ValueError("num_samples is required for loaders without a dataset length") from None
+    os.makedirs(out_dir, exist_ok=True)
+
+    semantic_encoder = model.semantic_encoder
+    latent_size = semantic_encoder.fc_mu.out_features
+    arrays = {
+        name: np.lib.format.open_memmap(os.path.join(out_dir, f"{name}.npy"), mode="w+", dtype=dtype, shape=shape)
+        for name, dtype, shape in (
+            ("mu_x", np.float32, (num_samples, latent_size)),
+            ("z_e", np.float32, (num_samples, latent_size)),
+            ("codes", np.int64, (num_samples,)),
+            ("labels", np.int64, (num_samples,)),
+        )
+    }
+
+    count = 0
+    for data, target in loader:
+        if count >= num_samples:
+            break
+        take = min(len(target), num_samples - count)
+        data, target = data[:take].to(device), target[:take].to(device)
+        mu_x, _ = model.image_encoder(data)
+        # Encoder and code search directly: the VQ layer's forward would update usage statistics
+        z_e = semantic_encoder.encoder(class_embeddings(target))
+        codes = semantic_encoder.vq_layer.nearest_codes(z_e)
+
+        rows = slice(count, count + take)
+        arrays["mu_x"][rows] = mu_x.float().cpu().numpy()
+        arrays["z_e"][rows] = z_e.float().cpu().numpy()
+        arrays["codes"][rows] = codes.cpu().numpy()
+        arrays["labels"][rows] = target.cpu().numpy()
+        count += take
+
+    for array in arrays.values():
+        array.flush()
+    del arrays
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump({"count": count, "latent_size": latent_size}, f)
+    return LatentExport(out_dir)
+
+
+class LatentExport:
+    """Read-only, memory-mapped view of a directory written by ``export_latents``.
+
+    ``mu_x``, ``z_e``, ``codes`` and ``labels`` are trimmed to the number of
+    rows actually written; nothing is read from disk until indexed.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        count = self.meta["count"]
+        for name in LATENT_FIELDS:
+            setattr(self, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")[:count])
+
+    def __len__(self):
+        return self.meta["count"]
+
+    def sample(self, field="z_e", per_class=500, seed=0):
+        """``(latents, labels)`` of a stratified subsample of ``field``."""
+        indices = stratified_sample(self.labels, per_class, seed)
+        return np.asarray(getattr(self, field)[indices]), np.asarray(self.labels[indices])
+
+
+def stratified_sample(labels, per_class, seed=0):
+    """Sorted indices of at most ``per_class`` random samples of every label.
+
+    Sorting keeps reads from a memory-mapped array sequential.
+    """
+    labels = np.asarray(labels)
+    rng = np.random.default_rng(seed)
+    chosen = []
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        if len(members) > per_class:
+            members = rng.choice(members, per_class, replace=False)
+        chosen.append(members)
+    return np.sort(np.concatenate(chosen))
+
+
+def project(latents, method="tsne", pca_components=50, seed=0, **kwargs):
+    """2-D projection of ``latents`` with ``method`` in ``{"tsne", "pca"}``.
+
+    With ``method="tsne"`` the latents are first reduced to ``pca_components``
+    dimensions when they have more (``None`` disables this). Extra keyword
+    arguments go to ``sklearn.manifold.TSNE``.
+    """
+    from sklearn.decomposition import PCA
+
+    latents = np.asarray(latents, dtype=np.float32)
+    if method == "pca":
+        return PCA(n_components=2, random_state=seed).fit_transform(latents)
+    if method != "tsne":
+        raise ValueError(f"unknown projection method {method!r}")
+
+    from sklearn.manifold import TSNE
+
+    if pca_components is not None and latents.shape[1] > pca_components:
+        latents = PCA(n_components=pca_components, random_state=seed).fit_transform(latents)
+    return TSNE(n_components=2, random_state=seed, **kwargs).fit_transform(latents)
@@ -0,0 +1,247 @@
+"""Loss functions of the CADA-VAE objective."""
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.utils.checkpoint import checkpoint
+
+# Names of the values returned by cada_vae_loss, in order (also the keys of the
+# train_losses/val_losses dicts)
+LOSS_COMPONENTS = ('total_loss', 'vae_loss', 'cada_loss', 'ca_loss', 'da_loss', 'vq_vae_loss', 'loss_c', 'loss_x')
+
+
+def vae_loss(recon, target, mu, logvar, beta=1.0):
+    # Compute reconstruction loss (MSE) between the input and reconstructed output
+    # Reshape tensors to (batch_size, channels*height*width) for pixel-wise comparison
+    recon_loss = F.mse_loss(recon.view(-1, 28*28), target.view(-1,28*28), reduction='sum')
+
+    # Compute KL divergence loss between the learned distribution and standard normal distribution
+    # Formula: -0.5 * sum(1 + log(sigma^2) - mu^2 - sigma^2)
+    kld_loss = -0.5 * torch.sum(1 + logvar - mu.pow(2) - logvar.exp())
+
+    # Return weighted sum of reconstruction and KL divergence losses
+    # Beta parameter controls the importance of the KL divergence term
+    return recon_loss + beta * kld_loss
+
+MMD_ESTIMATORS = ("biased", "unbiased", "linear")
+
+
+def _row_blocks(x, block_size, fn, *args):
+    """Sum of ``fn(start, x_block, *args)`` over row blocks of ``x``.
+
+    Each block is recomputed in backward instead of keeping its ``(block,
+    N)`` intermediates alive, so peak memory is ``O(block_size * N)`` in both
+    passes. A single block runs without recomputation.
+    """
+    if len(x) <= block_size:
+        return fn(0, x, *args)
+    total = 0
+    recompute = torch.is_grad_enabled() and any(t.requires_grad for t in (x,) + args if torch.is_tensor(t))
+    for start in range(0, len(x), block_size):
+        block = x[start:start + block_size]
+        if recompute:
+            total = total + checkpoint(fn, start, block, *args, use_reentrant=False)
+        else:
+            total = total + fn(start, block, *args)
+    return total
+
+
+def _sq_dists(x, y, y_sq):
+    # ||x - y||^2 = ||x||^2 + ||y||^2 - 2 x.y, without the (N, M, D) difference tensor
+    return (x.pow(2).sum(1, keepdim=True) + y_sq - 2 * x @ y.T).clamp_min(0)
+
+
+def _rbf_sum(start, x, y, y_sq, gamma, exclude_diagonal):
+    kernel = torch.exp(-gamma * _sq_dists(x, y, y_sq))
+    total = kernel.sum()
+    if exclude_diagonal:
+        # Block rows are samples start..start+b of y, i.e. entries (i, start + i)
+        total = total - kernel.diagonal(offset=start).sum()
+    return total
+
+
+def rbf_kernel_sum(x, y, gamma=1.0, exclude_diagonal=False, block_size=1024):
+    """``sum_ij exp(-gamma ||x_i - y_j||^2)`` in row blocks of ``x``.
+
+    With ``exclude_diagonal=True`` (``x`` and ``y`` the same samples) the
+    ``i == j`` terms are left out.
+    """
+    return _row_blocks(x, block_size, _rbf_sum, y, y.pow(2).sum(1), gamma, exclude_diagonal)
+
+
+def mmd_loss(x_samples, y_samples, kernel='rbf', gamma=1.0, estimator="biased", block_size=1024):
+    """Squared maximum mean discrepancy between two samples under an RBF kernel.
+
+    A drop-in replacement for the meta-learning notebook's ``mmd_loss``
+    (``estimator="biased"`` gives the same value) that never builds the
+    ``(B, B, D)`` difference tensor: distances come from the norm expansion
+    and kernel sums run in row blocks of ``block_size``.
+
+    Args:
+        estimator: ``"biased"`` (V-statistic, includes ``k(x_i, x_i)``),
+            ``"unbiased"`` (U-statistic, excludes it) or ``"linear"``
+            (Gretton et al.'s linear-time estimate over disjoint sample pairs;
+            ``O(B D)`` memory, noisier).
+    """
+    if kernel != 'rbf':
+        raise ValueError(f"only the 'rbf' kernel is supported, got {kernel!r}")
+    if estimator not in MMD_ESTIMATORS:
+        raise ValueError(f"estimator must be one of {MMD_ESTIMATORS}, got {estimator!r}")
+    x, y = x_samples.float(), y_samples.float()
+
+    if estimator == "linear":
+        pairs = min(len(x), len(y)) // 2
+        x1, x2 = x[:pairs], x[pairs:2 * pairs]
+        y1, y2 = y[:pairs], y[pairs:2 * pairs]
+
+        def k(a, b):
+            return torch.exp(-gamma * (a - b).pow(2).sum(1))
+
+        return (k(x1, x2) + k(y1, y2) - k(x1, y2) - k(x2, y1)).mean()
+
+    m, n = len(x), len(y)
+    unbiased = estimator == "unbiased"
+    xx = rbf_kernel_sum(x, x, gamma, exclude_diagonal=unbiased, block_size=block_size)
+    yy = rbf_kernel_sum(y, y, gamma, exclude_diagonal=unbiased, block_size=block_size)
+    xy = rbf_kernel_sum(x, y, gamma, block_size=block_size)
+    if unbiased:
+        return xx / (m * (m - 1)) + yy / (n * (n - 1)) - 2 * xy / (m * n)
+    return xx / (m * m) + yy / (n * n) - 2 * xy / (m * n)
+
+
+def _contrastive_rows(start, features_block, features, labels, temperature):
+    similarity = features_block @ features.T / temperature
+    rows = torch.arange(start, start + len(features_block), device=features.device)
+    self_mask = rows.unsqueeze(1) == torch.arange(len(features), device=features.device).unsqueeze(0)
+    # log sum_{j != i} exp(s_ij), stabilized like the notebook's max subtraction
+    log_denominator = torch.logsumexp(similarity.masked_fill(self_mask, float('-inf')), dim=1, keepdim=True)
+    log_prob = similarity - log_denominator
+
+    positive = (labels[start:start + len(features_block)].unsqueeze(1) == labels.unsqueeze(0)) & ~self_mask
+    positive_log_prob = torch.where(positive, log_prob, torch.zeros_like(log_prob)).sum(1)
+    return (positive_log_prob / (positive.sum(1) + 1e-8)).sum()
+
+
+def contrastive_loss(features, labels, temperature=0.5, block_size=1024):
+    """Supervised contrastive loss of ``features`` with class ``labels``.
+
+    A drop-in replacement for the meta-learning notebook's
+    ``contrastive_loss`` that builds the similarity matrix and masks one
+    block of ``block_size`` rows at a time (recomputed in backward) instead
+    of several dense ``B x B`` matrices.
+    """
+    features = F.normalize(features.float(), dim=1)
+    return -_row_blocks(features, block_size, _contrastive_rows, features, labels, temperature) / len(features)
+
+
+def cada_vae_loss(recon_x_from_x, x, recon_c_from_c, c, recon_x_from_c, recon_c_from_x,
+                  mu_x, logvar_x, z_e, quantization_loss, commitment_loss, beta, gamma, delta,
+                  mmd_gamma=None, mmd_estimator="biased", labels=None, lambda_contrast=0.0, block_size=1024):
+    """CADA-VAE objective; returns the components in ``LOSS_COMPONENTS`` order.
+
+    With ``mmd_gamma`` the distribution alignment is ``mmd_loss(mu_x, z_e)``
+    instead of ``||mu_x - z_e||^2``; with ``labels`` and ``lambda_contrast``
+    the total also includes ``lambda_contrast * contrastive_loss(mu_x,
+    labels)`` (as in the meta-learning notebook).
+    """
+    # Standard VAE loss for input reconstruction
+    loss_x = vae_loss(recon_x_from_x, x, mu_x, logvar_x, beta)
+
+    # MSE loss for class embedding reconstruction
+    loss_c = F.mse_loss(recon_c_from_c, c)
+
+    # Cross-aligned auto-encoder loss
+    ca_loss = F.mse_loss(recon_x_from_c, x) + F.mse_loss(recon_c_from_x, c)
+
+    # Distribution-aligned loss
+    if mmd_gamma is None:
+        da_loss = torch.norm(mu_x - z_e) ** 2
+    else:
+        da_loss = mmd_loss(mu_x, z_e, gamma=mmd_gamma, estimator=mmd_estimator, block_size=block_size)
+
+    # Vector quantization loss from VQ-VAE
+    vq_vae_loss = quantization_loss + commitment_loss
+
+    # Total loss combines all individual losses with respective weights
+    total_loss = loss_x + gamma * ca_loss + delta * da_loss + vq_vae_loss + loss_c
+    if lambda_contrast:
+        total_loss = total_loss + lambda_contrast * contrastive_loss(mu_x, labels, block_size=block_size)
+
+    # Return total loss and individual components
+    return total_loss, loss_x, loss_c, ca_loss, da_loss, vq_vae_loss , loss_c , loss_x
+
+
+class CADALoss(nn.Module):
+    """Single-pass CADA-VAE objective over the outputs of ``CADA_VAE.forward``.
+
+    Computes the same terms as ``cada_vae_loss`` (image VAE reconstruction
+    and KL, semantic reconstruction, cross-alignment, distribution alignment
+    and VQ) but reuses intermediates and returns every component stacked into
+    one tensor ordered like ``LOSS_COMPONENTS``, so reading them back is a
+    single transfer. There is no data-dependent control flow, which keeps it
+    friendly to ``torch.compile``.
+
+    Args:
+        beta, gamma, delta: Weights of the KL, cross-alignment and
+            distribution-alignment terms.
+        cross_reconstruction: Use the true cross-modal reconstructions
+            (image decoded from the semantic latent and vice versa); the model
+            must then be called with ``cross_reconstruction=True``. When False
+            the same-modality reconstructions are reused, which reproduces
+            ``cada_vae_loss`` as the training script called it.
+        mmd_gamma: Align ``mu_x`` and ``z_e`` with ``mmd_loss`` (this RBF
+            bandwidth) instead of the squared distance.
+        mmd_estimator: ``"biased"``, ``"unbiased"`` or ``"linear"``.
+        lambda_contrast: Weight of ``contrastive_loss(mu_x, labels)`` in the
+            total; ``forward`` then needs the batch ``labels``.
+        block_size: Row block size of the MMD and contrastive losses.
+    """
+
+    def __init__(self, beta=1.0, gamma=2.0, delta=1.0, cross_reconstruction=True, mmd_gamma=None,
+                 mmd_estimator="biased", lambda_contrast=0.0, block_size=1024):
+        super(CADALoss, self).__init__()
+        self.beta = beta
+        self.gamma = gamma
+        self.delta = delta
+        self.cross_reconstruction = cross_reconstruction
+        self.mmd_gamma = mmd_gamma
+        self.mmd_estimator = mmd_estimator
+        self.lambda_contrast = lambda_contrast
+        self.block_size = block_size
+
+    def forward(self, outputs, x, c, labels=None):
+        # Reductions run in float32 even when the forward pass ran under autocast
+        outputs = [t.float() for t in outputs]
+        recon_x, recon_c, mu_x, logvar_x, mu_c, logvar_c, z_e, quantization_loss, commitment_loss = outputs[:9]
+        x = x.float().view_as(recon_x)
+        c = c.float()
+
+        # Image VAE: summed squared error plus KL to the standard normal
+        recon_sq_sum = (recon_x - x).pow(2).sum()
+        kld_loss = -0.5 * torch.sum(1 + logvar_x - mu_x.pow(2) - logvar_x.exp())
+        loss_x = recon_sq_sum + self.beta * kld_loss
+
+        loss_c = (recon_c - c).pow(2).mean()
+
+        if self.cross_reconstruction:
+            recon_x_from_c, recon_c_from_x = outputs[9], outputs[10]
+            ca_loss = (recon_x_from_c - x).pow(2).mean() + (recon_c_from_x - c).pow(2).mean()
+        else:
+            # Same-modality reconstructions: both terms are already computed above
+            ca_loss = recon_sq_sum / x.numel() + loss_c
+
+        if self.mmd_gamma is None:
+            # ||mu_x - z_e||^2 without the sqrt/square round trip of torch.norm
+            da_loss = (mu_x - z_e).pow(2).sum()
+        else:
+            da_loss = mmd_loss(mu_x, z_e, gamma=self.mmd_gamma, estimator=self.mmd_estimator,
+                               block_size=self.block_size)
+        vq_vae_loss = quantization_loss + commitment_loss
+
+        total_loss = loss_x + self.gamma * ca_loss + self.delta * da_loss + vq_vae_loss + loss_c
+        if self.lambda_contrast:
+            if labels is None:
+                raise ValueError("lambda_contrast needs the batch labels")
+            total_loss = total_loss + self.lambda_contrast * contrastive_loss(mu_x, labels,
+                                                                             block_size=self.block_size)
+        return torch.stack([total_loss, loss_x, loss_c, ca_loss, da_loss, vq_vae_loss, loss_c, loss_x])
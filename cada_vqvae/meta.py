@@ -0,0 +1,185 @@
+"""Episodic few-shot sampling and batched multi-task meta-training.
+
+The meta-learning notebook's ``sample_task`` scans the targets with
+``np.where`` for every class of every task, ``meta_train`` then gathers the
+samples one ``dataset[i]`` at a time into fresh ``DataLoader``s, and tasks run
+one after another. ``EpisodeSampler`` builds per-class index tables once and
+draws a whole batch of tasks as ``(T, way * shot, 784)`` tensors with a single
+gather. ``meta_train_step`` runs all ``T`` tasks through ``CADA_VAE`` in one
+forward pass and evaluates the task-local loss with ``torch.func.vmap``, so
+the cost per task shrinks as ``T`` grows.
+"""
+
+import collections
+import time
+
+import torch
+from torch.func import vmap
+
+from cada_vqvae.losses import LOSS_COMPONENTS, CADALoss
+
+Episode = collections.namedtuple("Episode", ["support_x", "support_y", "query_x", "query_y"])
+
+
+def _images_and_targets(dataset):
+    """uint8 ``(N, H*W)`` images and long targets of a MNIST-family dataset or a ``Subset`` of one."""
+    indices = None
+    if hasattr(dataset, "indices") and hasattr(dataset, "dataset"):
+        indices = torch.as_tensor(dataset.indices, dtype=torch.long)
+        dataset = dataset.dataset
+    images = torch.as_tensor(dataset.data)
+    targets = torch.as_tensor(dataset.targets, dtype=torch.long)
+    if indices is not None:
+        images, targets = images[indices], targets[indices]
+    return images.reshape(len(images), -1).contiguous(), targets
+
+
+class EpisodeSampler:
+    """Draws batches of N-way K-shot tasks with vectorized index math.
+
+    Args:
+        dataset: A torchvision MNIST-family dataset or a ``Subset`` of one
+            (e.g. the notebook's ``create_balanced_dataset``). Its transform
+            is bypassed; images come out as ``ToTensor()`` would make them,
+            flattened.
+        way: Classes per task.
+        shot: Support samples per class.
+        query: Query samples per class.
+        generator: Optional ``torch.Generator`` for reproducible tasks.
+        device: Keep the images and index tables on this device.
+
+    Classes with fewer than ``shot + query`` samples are drawn with
+    replacement, like ``sample_task``.
+    """
+
+    def __init__(self, dataset, way=5, shot=3, query=10, generator=None, device=None):
+        images, targets = _images_and_targets(dataset)
+        self.images = images.to(device) if device is not None else images
+        self.targets = targets.to(self.images.device)
+        self.way = way
+        self.shot = shot
+        self.query = query
+        self.generator = generator
+
+        # classes: (C,); class_table: (C, max_count) sample indices padded with 0; class_counts: (C,)
+        self.classes, self.class_counts = torch.unique(targets, return_counts=True)
+        if len(self.classes) < way:
+            raise ValueError(f"Only {len(self.classes)} classes available, but {way} requested")
+        order = torch.argsort(targets, stable=True)
+        starts = torch.cumsum(self.class_counts, 0) - self.class_counts
+        positions = torch.arange(int(self.class_counts.max()))
+        valid = positions < self.class_counts.unsqueeze(1)
+        table = torch.where(valid, starts.unsqueeze(1) + positions, torch.zeros_like(positions))
+        self.class_table = order[table].to(self.images.device)
+        self.class_counts = self.class_counts.to(self.images.device)
+        self.classes = self.classes.to(self.images.device)
+
+    def _rand(self, *shape):
+        # Drawn on the CPU so a CPU generator works with any device
+        return torch.rand(*shape, generator=self.generator).to(self.images.device)
+
+    def sample_indices(self, num_tasks):
+        """``(T, way, shot + query)`` dataset indices of ``num_tasks`` tasks."""
+        per_class = self.shot + self.query
+        num_classes, max_count = self.class_table.shape
+
+        # Random class subset per task: the first `way` entries of a random permutation
+        task_classes = self._rand(num_tasks, num_classes).argsort(dim=1)[:, :self.way]
+        counts = self.class_counts[task_classes]
+
+        # Without replacement: top-k of random keys over each class's valid positions
+        keys = self._rand(num_tasks, self.way, max_count)
+        keys = keys.masked_fill(torch.arange(max_count, device=keys.device) >= counts.unsqueeze(-1), -1.0)
+        positions = keys.topk(min(per_class, max_count), dim=-1).indices
+        if positions.shape[-1] < per_class:
+            positions = torch.cat([positions, positions.new_zeros(positions.shape[:-1] + (per_class - max_count,))],
+                                  dim=-1)
+        # With replacement where a class is too small
+        fallback = (self._rand(num_tasks, self.way, per_class) * counts.unsqueeze(-1)).long()
+        positions = torch.where(counts.unsqueeze(-1) >= per_class, positions, fallback)
+        return self.class_table[task_classes.unsqueeze(-1), positions]
+
+    def sample(self, num_tasks):
+        """An ``Episode`` of ``num_tasks`` tasks.
+
+        ``support_x`` is ``(T, way * shot, H*W)`` and ``query_x`` is
+        ``(T, way * query, H*W)``, float in ``[0, 1]``; the labels are the
+        original class labels.
+        """
+        indices = self.sample_indices(num_tasks)
+        support = indices[:, :, :self.shot].reshape(num_tasks, -1)
+        query = indices[:, :, self.shot:].reshape(num_tasks, -1)
+        both = torch.cat([support, query], dim=1)
+        images = self.images[both].float().div_(255)
+        targets = self.targets[both]
+        split = support.shape[1]
+        return Episode(images[:, :split], targets[:, :split], images[:, split:], targets[:, split:])
+
+
+def task_losses(model, x, y, class_embeddings, criterion):
+    """Per-task loss components of a ``(T, N, 784)`` batch of tasks, shape ``(T, len(LOSS_COMPONENTS))``.
+
+    Every ``CADA_VAE`` layer acts on rows independently, so all tasks share a
+    single forward over the ``T * N`` flattened samples (the VQ layer updates
+    its codebook statistics once for the whole batch). ``criterion`` is then
+    mapped over the task dimension, keeping batch-level terms such as the KL
+    and alignment sums local to each task.
+    """
+    num_tasks, task_size = x.shape[:2]
+    flat_x = x.reshape(num_tasks * task_size, -1)
+    flat_c = class_embeddings(y.reshape(-1))
+    outputs = model(flat_x, flat_c, cross_reconstruction=criterion.cross_reconstruction)
+
+    # quantization_loss and commitment_loss are batch means; with equal-sized
+    # tasks their value is the mean of the per-task values
+    per_task = tuple(o.reshape(num_tasks, task_size, *o.shape[1:]) if o.dim() else o for o in outputs)
+    in_dims = tuple(0 if o.dim() else None for o in outputs)
+    return vmap(criterion, in_dims=(in_dims, 0, 0, 0))(per_task, x, flat_c.reshape(num_tasks, task_size, -1), y)
+
+
+def meta_train_step(model, episode, class_embeddings, optimizer, criterion):
+    """One optimizer step on the support sets of a batch of tasks, then evaluate their query sets.
+
+    The step minimizes the mean support loss over tasks. Returns the detached
+    ``(T, components)`` support and query losses (no host sync).
+    """
+    model.train()
+    optimizer.zero_grad(set_to_none=True)
+    support_losses = task_losses(model, episode.support_x, episode.support_y, class_embeddings, criterion)
+    support_losses[:, 0].mean().backward()
+    optimizer.step()
+
+    model.eval()
+    with torch.no_grad():
+        query_losses = task_losses(model, episode.query_x, episode.query_y, class_embeddings, criterion)
+    return support_losses.detach(), query_losses
+
+
+def meta_train(model, sampler, class_embeddings, optimizer, num_steps, tasks_per_step=16, criterion=None,
+               log_interval=100, log_fn=print):
+    """Meta-train for ``num_steps`` steps of ``tasks_per_step`` tasks each.
+
+    Returns the notebook-style loss dictionary: ``support_<component>`` and
+    ``query_<component>`` lists with one value per task, plus ``tasks_per_sec``.
+    """
+    criterion = criterion if criterion is not None else CADALoss()
+    device = next(model.parameters()).device
+    support_history, query_history = [], []
+    start = time.perf_counter()
+    for step in range(1, num_steps + 1):
+        episode = Episode(*(t.to(device, non_blocking=True) for t in sampler.sample(tasks_per_step)))
+        support_losses, query_losses = meta_train_step(model, episode, class_embeddings, optimizer, criterion)
+        support_history.append(support_losses)
+        query_history.append(query_losses)
+        if log_interval and step % log_interval == 0:
+            log_fn(f'Step {step}, support loss {support_losses[:, 0].mean().item():.4f}, '
+                   f'query loss {query_losses[:, 0].mean().item():.4f}')
+    elapsed = time.perf_counter() - start
+
+    loss_dict = {}
+    for prefix, history in (("support", support_history), ("query", query_history)):
+        values = torch.cat(history).cpu().T.tolist()
+        for name, column in zip(LOSS_COMPONENTS, values):
+            loss_dict[f"{prefix}_{name}"] = column
+    loss_dict["tasks_per_sec"] = num_steps * tasks_per_step / elapsed
+    return loss_dict
@@ -0,0 +1,386 @@
+"""CADA-VAE model with a VQ-VAE semantic branch.
+
+The image branch is a plain VAE over flattened 28x28 images; the semantic
+branch encodes 100-d word vectors, quantizes the encoding against a learned
+codebook and decodes it back to a word vector.
+"""
+
+import os
+
+import torch
+import torch.distributed as dist
+import torch.nn as nn
+import torch.nn.functional as F
+
+from cada_vqvae.codebook_search import CodebookSearch
+
+
+def _distributed():
+    return dist.is_available() and dist.is_initialized() and dist.get_world_size() > 1
+
+# Image Encoder
+class ImageEncoder(nn.Module):
+    def __init__(self, latent_size):
+        super(ImageEncoder, self).__init__()
+        self.encoder = nn.Sequential(
+            nn.Linear(28*28, 400),  # Input: flattened image (3x32x32)
+            nn.ELU(),
+            nn.Linear(400, 200),
+            nn.ELU(),
+        )
+        self.fc_mu = nn.Linear(200, latent_size)       # Mean for latent space
+        self.fc_logvar = nn.Linear(200, latent_size)   # Log variance for latent space
+
+    def forward(self, x):
+        h1 = self.encoder(x)  # Flatten the input
+        mu = self.fc_mu(h1)                          # Mean of latent space
+        logvar = self.fc_logvar(h1)                  # Log variance of latent space
+        return mu, logvar
+
+# Image Decoder
+class ImageDecoder(nn.Module):
+    def __init__(self, latent_size):
+        super(ImageDecoder, self).__init__()
+        self.decoder = nn.Sequential(
+            nn.Linear(latent_size, 200),   # Input: latent space
+            nn.ELU(),
+            nn.Linear(200, 400),
+            nn.ELU(),
+            nn.Linear(400, 28*28),  # Output: flattened 3x32x32 image
+            nn.Tanh(),                     # Output range between -1 and 1 due to normalization
+        )
+
+    def forward(self, z):
+        return self.decoder(z)             # Decode latent vector to reconstruct image
+
+# Vector Quantizer for VQ-VAE
+class VectorQuantizer(nn.Module):
+    """Vector quantizer with an optional EMA-updated codebook.
+
+    Args:
+        num_embeddings: Number of codes in the codebook.
+        embedding_dim: Dimension of every code.
+        commitment_cost: Weight of the commitment loss.
+        search: ``CodebookSearch`` used to find the nearest codes.
+        use_ema: Update the codebook with exponential moving averages of the
+            encoder outputs assigned to each code instead of through the
+            gradient of ``quantization_loss``. The codebook then needs no
+            optimizer state (its weight has ``requires_grad=False``).
+        decay: EMA decay of the cluster sizes and sums.
+        epsilon: Laplace smoothing of the cluster sizes.
+        dead_code_threshold: When set, codes whose decayed usage falls below
+            this value are re-initialized from recent encoder outputs every
+            ``reset_interval`` training steps.
+        reset_interval: Training steps between dead-code resets.
+        recent_size: Number of recent encoder outputs kept for resets.
+
+    Per-code usage counts and the perplexity of the latest batch are tracked
+    on-device in training mode; ``codebook_stats()`` reads them back.
+
+    Under ``torch.distributed`` the per-batch code counts and EMA sums are
+    all-reduced and dead codes are re-initialized from rank 0's recent inputs,
+    so the codebook and its buffers stay identical on every rank.
+    """
+
+    def __init__(self, num_embeddings, embedding_dim, commitment_cost=0.25, search=None, use_ema=False,
+                 decay=0.99, epsilon=1e-5, dead_code_threshold=None, reset_interval=100, recent_size=1024):
+        super(VectorQuantizer, self).__init__()
+        self.num_embeddings = num_embeddings
+        self.embedding_dim = embedding_dim
+        self.commitment_cost = commitment_cost
+
+        # Initialize the codebook (embedding table)
+        self.embedding = nn.Embedding(self.num_embeddings, self.embedding_dim)
+        self.embedding.weight.data.uniform_(-1/self.num_embeddings, 1/self.num_embeddings)
+
+        # Nearest-code search: blocked exact search with cached codebook norms by default.
+        # Replace with CodebookSearch(approximate=True) for approximate search at inference.
+        self.search = search if search is not None else CodebookSearch()
+
+        self.use_ema = use_ema
+        self.decay = decay
+        self.epsilon = epsilon
+        self.dead_code_threshold = dead_code_threshold
+        self.reset_interval = reset_interval
+        if use_ema:
+            self.embedding.weight.requires_grad_(False)
+        if use_ema or dead_code_threshold is not None:
+            # Decayed number of inputs assigned to each code (and their sum for EMA updates).
+            # Starting at one keeps unused codes at their initial value and gives every
+            # code a grace period before it counts as dead.
+            self.register_buffer("cluster_size", torch.ones(num_embeddings))
+        if use_ema:
+            self.register_buffer("ema_embed_sum", self.embedding.weight.detach().clone())
+        if dead_code_threshold is not None:
+            # Saved with the model so a resumed run resets the same codes from the same inputs.
+            # The counters are mirrored in host ints so slicing the ring buffer needs no device sync.
+            self.register_buffer("recent_inputs", torch.zeros(recent_size, embedding_dim))
+            self.register_buffer("recent_position", torch.zeros((), dtype=torch.long))
+            self.register_buffer("recent_filled", torch.zeros((), dtype=torch.long))
+            self.register_buffer("steps_since_reset", torch.zeros((), dtype=torch.long))
+            self._recent_position = 0
+            self._recent_filled = 0
+            self._steps_since_reset = 0
+        self.register_load_state_dict_post_hook(VectorQuantizer._after_load)
+
+        # Utilization metrics, accumulated on-device and only read by codebook_stats()
+        self.register_buffer("code_usage", torch.zeros(num_embeddings, dtype=torch.long), persistent=False)
+        self.register_buffer("batch_perplexity", torch.zeros(()), persistent=False)
+
+    def nearest_codes(self, flat_inputs):
+        """Codebook index of every row of ``flat_inputs``.
+
+        In training mode the codebook changes every step, so the search keeps
+        no cached state; approximate search is only used in eval mode.
+        """
+        if self.training:
+            return self.search.search(flat_inputs, self.embedding.weight, approximate=False, cache=False)
+        return self.search.search(flat_inputs, self.embedding.weight)
+
+    def train(self, mode=True):
+        # The codebook may have changed since the search cached its norms/index
+        self.search.invalidate()
+        return super(VectorQuantizer, self).train(mode)
+
+    def forward(self, inputs):
+        flat_inputs = inputs.view(-1, self.embedding_dim)
+        encoding_indices = self.nearest_codes(flat_inputs)
+        quantized = self.embedding(encoding_indices).view_as(inputs)
+
+        commitment_loss = self.commitment_cost * F.mse_loss(quantized.detach(), inputs)
+        # With EMA updates this carries no gradient and is only reported
+        quantization_loss = F.mse_loss(quantized, inputs.detach())
+        quantized = inputs + (quantized - inputs).detach()
+
+        if self.training:
+            self._update_codebook(flat_inputs.detach(), encoding_indices)
+
+        return quantized, quantization_loss, commitment_loss
+
+    @torch.no_grad()
+    def _update_codebook(self, flat_inputs, encoding_indices):
+        # Fixed-shape count (bincount's output size is data-dependent and breaks torch.compile graphs)
+        counts = torch.zeros(self.num_embeddings, dtype=torch.long, device=encoding_indices.device).index_add_(
+            0, encoding_indices, torch.ones_like(encoding_indices))
+        if self.use_ema:
+            embed_sum = torch.zeros_like(self.ema_embed_sum).index_add_(0, encoding_indices, flat_inputs.float())
+        if _distributed():
+            # Statistics of the global batch, so every rank applies the same update
+            dist.all_reduce(counts)
+            if self.use_ema:
+                dist.all_reduce(embed_sum)
+        self.code_usage += counts
+        probs = counts.float() / counts.sum()
+        self.batch_perplexity.copy_(torch.exp(-torch.sum(probs * torch.log(probs + 1e-10))))
+
+        if self.use_ema:
+            self.ema_embed_sum.mul_(self.decay).add_(embed_sum, alpha=1 - self.decay)
+        if hasattr(self, "cluster_size"):
+            self.cluster_size.mul_(self.decay).add_(counts.float(), alpha=1 - self.decay)
+        if self.use_ema:
+            n = self.cluster_size.sum()
+            smoothed = (self.cluster_size + self.epsilon) / (n + self.num_embeddings * self.epsilon) * n
+            self.embedding.weight.copy_(self.ema_embed_sum / smoothed.unsqueeze(1))
+
+        if self.dead_code_threshold is not None:
+            self._track_dead_codes(flat_inputs)
+
+    @torch.compiler.disable
+    def _track_dead_codes(self, flat_inputs):
+        # Host-side counters would specialize a compiled graph on every step; run eagerly
+        self._remember_inputs(flat_inputs)
+        self._steps_since_reset += 1
+        if self._steps_since_reset >= self.reset_interval:
+            self._reset_dead_codes()
+            self._steps_since_reset = 0
+        self.steps_since_reset.fill_(self._steps_since_reset)
+
+    @staticmethod
+    def _after_load(module, incompatible_keys):
+        module.search.invalidate()
+        if module.dead_code_threshold is not None:
+            module._recent_position = int(module.recent_position)
+            module._recent_filled = int(module.recent_filled)
+            module._steps_since_reset = int(module.steps_since_reset)
+
+    def _remember_inputs(self, flat_inputs):
+        # Ring buffer of recent encoder outputs; bookkeeping stays on the host
+        capacity = self.recent_inputs.shape[0]
+        flat_inputs = flat_inputs[-capacity:]
+        n = flat_inputs.shape[0]
+        end = self._recent_position + n
+        if end <= capacity:
+            self.recent_inputs[self._recent_position:end] = flat_inputs
+        else:
+            split = capacity - self._recent_position
+            self.recent_inputs[self._recent_position:] = flat_inputs[:split]
+            self.recent_inputs[:n - split] = flat_inputs[split:]
+        self._recent_position = end % capacity
+        self._recent_filled = min(capacity, self._recent_filled + n)
+        self.recent_position.fill_(self._recent_position)
+        self.recent_filled.fill_(self._recent_filled)
+
+    def _reset_dead_codes(self):
+        if self._recent_filled == 0:
+            return
+        # Computed for the whole codebook with torch.where so no host sync is needed
+        dead = (self.cluster_size < self.dead_code_threshold).unsqueeze(1)
+        weight = self.embedding.weight
+        picks = torch.randint(self._recent_filled, (self.num_embeddings,), device=weight.device)
+        candidates = self.recent_inputs[picks]
+        candidates = candidates + 0.01 * candidates.std() * torch.randn_like(candidates)
+        weight.copy_(torch.where(dead, candidates, weight))
+        self.cluster_size.copy_(torch.where(dead.squeeze(1), torch.ones_like(self.cluster_size), self.cluster_size))
+        if self.use_ema:
+            self.ema_embed_sum.copy_(torch.where(dead, candidates, self.ema_embed_sum))
+        if _distributed():
+            # Recent inputs differ per rank; rank 0's replacements win
+            for tensor in (weight, self.cluster_size) + ((self.ema_embed_sum,) if self.use_ema else ()):
+                dist.broadcast(tensor, src=0)
+
+    @torch.no_grad()
+    def codebook_stats(self):
+        """Usage counts and perplexity accumulated since the last ``reset_usage()``.
+
+        This is the only place the metrics are synchronized to the host. The
+        number of active codes is a data-driven upper bound for ``num_embeddings``.
+        """
+        usage = self.code_usage.float()
+        probs = usage / usage.sum().clamp(min=1)
+        perplexity = torch.exp(-torch.sum(probs * torch.log(probs + 1e-10)))
+        stats = {
+            "num_embeddings": self.num_embeddings,
+            "active_codes": int((usage > 0).sum()),
+            "perplexity": perplexity.item(),
+            "batch_perplexity": self.batch_perplexity.item(),
+            "usage": self.code_usage.cpu(),
+        }
+        if self.dead_code_threshold is not None:
+            stats["dead_codes"] = int((self.cluster_size < self.dead_code_threshold).sum())
+        return stats
+
+    def reset_usage(self):
+        self.code_usage.zero_()
+
+class SemanticEncoderVQVAE(nn.Module):
+    def __init__(self, latent_size, num_embeddings, embedding_dim, **vq_kwargs):
+        super(SemanticEncoderVQVAE, self).__init__()
+        self.encoder = nn.Sequential(
+            nn.Linear(100, 200),
+            nn.ELU(),
+            nn.Linear(200, latent_size),  # Ensure this matches latent_size
+        )
+        # vq_kwargs are forwarded to VectorQuantizer (e.g. use_ema=True, dead_code_threshold=1e-3)
+        self.vq_layer = VectorQuantizer(num_embeddings, latent_size, **vq_kwargs)
+
+        # Adding mu and logvar layers like in the ImageEncoder
+        self.fc_mu = nn.Linear(latent_size, latent_size)
+        self.fc_logvar = nn.Linear(latent_size, latent_size)
+
+    def forward(self, c):
+        z_e = self.encoder(c)  # Continuous latent encoding
+        z_q, quantization_loss, commitment_loss = self.vq_layer(z_e)
+
+        mu_c = self.fc_mu(z_e)
+        logvar_c = self.fc_logvar(z_e)
+
+        return mu_c, logvar_c, z_q, z_e, quantization_loss, commitment_loss
+
+# Semantic Decoder
+class SemanticDecoder(nn.Module):
+    def __init__(self, latent_size):
+        super(SemanticDecoder, self).__init__()
+        self.decoder = nn.Sequential(
+            nn.Linear(latent_size, 200),
+            nn.ELU(),
+            nn.Linear(200, 100),
+            nn.Sigmoid(),
+        )
+
+    def forward(self, z):
+        return self.decoder(z)
+
+class CADA_VAE(nn.Module):
+    def __init__(self, latent_size, num_embeddings, embedding_dim, **vq_kwargs):
+        super(CADA_VAE, self).__init__()
+
+        # Image encoder and decoder
+        self.image_encoder = ImageEncoder(latent_size)
+        self.image_decoder = ImageDecoder(latent_size)
+
+        # Semantic encoder and decoder with VQ-VAE
+        self.semantic_encoder = SemanticEncoderVQVAE(latent_size, num_embeddings, embedding_dim, **vq_kwargs)
+        self.semantic_decoder = SemanticDecoder(latent_size)
+
+    def reparameterize(self, mu, logvar):
+        """Reparameterization trick: sample from latent space using mu and logvar."""
+        std = torch.exp(0.5 * logvar)
+        eps = torch.randn_like(std)
+        return mu + eps * std
+
+    def forward(self, x, c, cross_reconstruction=False):
+        """Run both branches.
+
+        With ``cross_reconstruction=True`` the image decoder also decodes a
+        sample of the semantic latent and the semantic decoder the image
+        latent; each decoder runs once on the concatenated latents and
+        ``recon_x_from_c, recon_c_from_x`` are appended to the outputs.
+        """
+        # Image VAE
+        mu_x, logvar_x = self.image_encoder(x)
+        z_x = self.reparameterize(mu_x, logvar_x)
+
+        # Semantic VQ-VAE
+        mu_c, logvar_c, z_q, z_e, quantization_loss, commitment_loss = self.semantic_encoder(c)
+
+        if not cross_reconstruction:
+            recon_x = self.image_decoder(z_x)
+            recon_c = self.semantic_decoder(z_q)
+            return recon_x, recon_c, mu_x, logvar_x, mu_c, logvar_c, z_e, quantization_loss, commitment_loss
+
+        z_c = self.reparameterize(mu_c, logvar_c)
+        recon_x, recon_x_from_c = self.image_decoder(torch.cat([z_x, z_c])).chunk(2)
+        recon_c, recon_c_from_x = self.semantic_decoder(torch.cat([z_q, z_x])).chunk(2)
+        return (recon_x, recon_c, mu_x, logvar_x, mu_c, logvar_c, z_e, quantization_loss, commitment_loss,
+                recon_x_from_c, recon_c_from_x)
+
+
+DEAD_CODE_BUFFERS = tuple("vq_layer." + name for name in
+                          ("cluster_size", "recent_inputs", "recent_position", "recent_filled", "steps_since_reset"))
+
+
+def model_from_state_dict(state, embedding_dim=100, **vq_kwargs):
+    """``CADA_VAE`` shaped after and loaded from a model ``state_dict()``.
+
+    The codebook size, latent size and EMA setting are taken from ``state``.
+    """
+    num_embeddings, latent_size = state["semantic_encoder.vq_layer.embedding.weight"].shape
+    vq_kwargs.setdefault("use_ema", "semantic_encoder.vq_layer.ema_embed_sum" in state)
+    model = CADA_VAE(latent_size, num_embeddings, embedding_dim, **vq_kwargs)
+    # Dead-code bookkeeping is only needed to continue training
+    expected = model.state_dict()
+    model.load_state_dict({key: value for key, value in state.items()
+                           if key in expected or not key.endswith(DEAD_CODE_BUFFERS)})
+    return model
+
+
+def load_model(checkpoint=None, latent_size=20, num_embeddings=512, embedding_dim=100, device="cpu",
+               **vq_kwargs):
+    """``CADA_VAE`` in eval mode with random weights, or from a checkpoint.
+
+    ``checkpoint`` may be a Trainer checkpoint, a bare state dict, or a
+    ``CheckpointManager`` directory (its ``best.pt``, else the newest
+    checkpoint). The codebook size, latent size and EMA setting are then
+    taken from the checkpoint.
+    """
+    if checkpoint is None:
+        return CADA_VAE(latent_size, num_embeddings, embedding_dim, **vq_kwargs).to(device).eval()
+    if os.path.isdir(checkpoint):
+        from cada_vqvae.checkpoint import CheckpointManager
+        best = os.path.join(checkpoint, "best.pt")
+        checkpoint = best if os.path.exists(best) else CheckpointManager(checkpoint).latest()
+        if checkpoint is None:
+            raise FileNotFoundError("no checkpoint found in the given directory")
+    state = torch.load(checkpoint, map_location="cpu", weights_only=False)
+    model = model_from_state_dict(state.get("model", state), embedding_dim, **vq_kwargs)
+    return model.to(device).eval()
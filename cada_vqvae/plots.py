@@ -0,0 +1,119 @@
+"""Matplotlib figures of the training script (loss curves, latent space, generated images).
+
+Every function imports matplotlib when called, saves to ``path`` when one is
+given and shows the figure otherwise.
+"""
+
+PLOTTED_LOSSES = (
+    ("vae_loss", "VAE Loss"),
+    ("cada_loss", "CADA Loss"),
+    ("ca_loss", "CA Loss"),
+    ("da_loss", "DA Loss"),
+    ("vq_vae_loss", "VQ-VAE Loss"),
+)
+
+# Titles and (train, val) colors of the larger per-loss figure
+DETAILED_LOSSES = (
+    ("vae_loss", "VAE Loss", "VAE Loss Over Epochs", ("blue", "orange")),
+    ("cada_loss", "CADA Loss", "CADA Loss Over Epochs", ("green", "red")),
+    ("ca_loss", "CA Loss", "Cross Alignment (CA) Loss Over Epochs", ("purple", "brown")),
+    ("da_loss", "DA Loss", "Disentanglement (DA) Loss Over Epochs", ("cyan", "magenta")),
+    ("vq_vae_loss", "VQ-VAE Loss", "Vector Quantization VAE (VQ-VAE) Loss Over Epochs", ("darkblue", "darkorange")),
+)
+
+
+def _finish(plt, path, rect=None):
+    plt.tight_layout(rect=rect)
+    if path:
+        plt.savefig(path)
+        plt.close()
+    else:
+        plt.show()
+
+
+def plot_loss_curves(train_losses, val_losses, path=None):
+    """Train/val curves of the loss components, one panel each."""
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(12, 6))
+    for panel, (name, title) in enumerate(PLOTTED_LOSSES, start=2):
+        plt.subplot(2, 3, panel)
+        plt.plot(train_losses[name], label=f'Train {title}')
+        plt.plot(val_losses[name], label=f'Val {title}')
+        plt.title(title)
+        plt.xlabel('Epoch')
+        plt.ylabel('Loss Value')
+        plt.legend()
+    _finish(plt, path)
+
+
+def _styled_panel(plt, train_values, val_values, label, title, colors):
+    plt.plot(train_values, label=f'Train {label}', color=colors[0], linewidth=2)
+    plt.plot(val_values, label=f'Val {label}', color=colors[1], linewidth=2)
+    plt.title(title, fontsize=16)
+    plt.xlabel('Epoch', fontsize=14)
+    plt.ylabel('Loss Value', fontsize=14)
+    plt.xticks(fontsize=12)
+    plt.yticks(fontsize=12)
+    plt.grid(True, linestyle='--', alpha=0.7)
+    plt.legend(fontsize=12)
+
+
+def plot_individual_losses(train_losses, val_losses, path=None):
+    """Larger, styled train/val curves of every loss component under one title."""
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(18, 10))
+    for panel, (name, label, title, colors) in enumerate(DETAILED_LOSSES, start=1):
+        plt.subplot(2, 3, panel)
+        _styled_panel(plt, train_losses[name], val_losses[name], label, title, colors)
+    plt.suptitle("Individual Loss Functions Over Training and Validation Epochs", fontsize=20)
+    _finish(plt, path, rect=[0, 0, 1, 0.95])
+
+
+def plot_total_loss(train_losses, val_losses, path=None):
+    """Train/val curves of the total loss."""
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(18, 10))
+    plt.subplot(2, 2, 1)
+    _styled_panel(plt, train_losses['total_loss'], val_losses['total_loss'], 'Total Loss',
+                  'Training and Validation Total Loss', ('blue', 'orange'))
+    _finish(plt, path)
+
+
+def plot_latent_space(latent_2d, labels, path=None):
+    """Scatter plot of a 2-D projection of the latent space, colored by class."""
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(10, 8))
+    scatter = plt.scatter(latent_2d[:, 0], latent_2d[:, 1], c=labels, cmap='tab10', alpha=0.5)
+    plt.colorbar(scatter, ticks=range(10), label='FashionMNIST Classes')
+    plt.title('t-SNE visualization of the latent space')
+    plt.xlabel('Latent Dimension 1')
+    plt.ylabel('Latent Dimension 2')
+    _finish(plt, path)
+
+
+def plot_generated_images(generated_images, class_names, path=None):
+    """One generated ``(28, 28)`` image per class name on a 2x5 grid."""
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(2, 5, figsize=(15, 6))
+    for image, name, ax in zip(generated_images, class_names, axes.flatten()):
+        ax.imshow(image, cmap='gray')
+        ax.set_title(f'Generated: {name}')
+        ax.axis('off')
+    _finish(plt, path)
+
+
+def plot_generated_image(generated_image, title='Generated Image', path=None):
+    """A single generated ``(28, 28)`` image, clipped to ``[0, 1]``."""
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    plt.figure()
+    plt.imshow(np.clip(generated_image, 0, 1), cmap='gray')
+    plt.axis('off')
+    plt.title(title)
+    _finish(plt, path)
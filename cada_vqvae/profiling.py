@@ -0,0 +1,226 @@
+"""Opt-in instrumentation of ``CADA_VAE`` training steps.
+
+``StepProfiler`` lets the ``Trainer`` time the named phases of each step
+(data, forward, loss, backward, optimizer, sync) and, while its window of
+steps is open, attaches forward and backward hooks to every submodule of the
+model and wraps the VQ code search. Outside the window nothing is attached.
+At the end of the window (or when training stops before it ends) it writes a
+Chrome trace (open in ``chrome://tracing`` or Perfetto) and returns a summary
+table. With ``use_torch_profiler=True`` the window is recorded by
+``torch.profiler`` instead, with operator-level detail and the phases as
+``record_function`` ranges.
+
+Nothing is attached unless profiling is requested, either by passing a
+profiler to ``Trainer`` or through the environment:
+
+    CADA_PROFILE=1                     enable
+    CADA_PROFILE_STEPS=20:40           window of global steps (default 10:30)
+    CADA_PROFILE_TRACE=trace.json      trace output path (default cada_profile_trace.json)
+    CADA_PROFILE_TORCH=1               use torch.profiler for the window
+"""
+
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+import torch
+
+PROFILE_ENV = "CADA_PROFILE"
+
+
+class StepProfiler:
+    """Per-module and per-phase timings for a window of training steps.
+
+    Args:
+        model: The ``CADA_VAE`` (or a wrapper around it) to instrument.
+        start_step, end_step: Record steps ``start_step <= step < end_step``
+            (counting calls to ``step()``).
+        trace_path: Where the Chrome trace is written at the end of the window.
+        use_torch_profiler: Record the window with ``torch.profiler`` (its own
+            Chrome trace at ``trace_path``) instead of the hooks.
+    """
+
+    def __init__(self, model, start_step=10, end_step=30, trace_path="cada_profile_trace.json",
+                 use_torch_profiler=False):
+        self.model = model
+        self.start_step = start_step
+        self.end_step = end_step
+        self.trace_path = trace_path
+        self.use_torch_profiler = use_torch_profiler
+        self.steps = 0
+        self.events = []
+        self.finished = False
+        self._handles = []
+        self._open = {}
+        self._patched = []
+        self._torch_profiler = None
+        self._cuda = torch.cuda.is_available() and next(model.parameters()).is_cuda
+        self._origin = time.perf_counter()
+        self._step_started = None
+        self._entered = False
+        if start_step == 0:
+            self._enter_window()
+
+    @classmethod
+    def from_env(cls, model):
+        """A profiler configured from ``CADA_PROFILE*`` variables, or ``None`` when profiling is off."""
+        if os.environ.get(PROFILE_ENV, "") in ("", "0"):
+            return None
+        start, _, end = os.environ.get("CADA_PROFILE_STEPS", "10:30").partition(":")
+        return cls(model, int(start), int(end),
+                   trace_path=os.environ.get("CADA_PROFILE_TRACE", "cada_profile_trace.json"),
+                   use_torch_profiler=os.environ.get("CADA_PROFILE_TORCH", "") not in ("", "0"))
+
+    @property
+    def active(self):
+        return self.start_step <= self.steps < self.end_step
+
+    def _now_us(self):
+        if self._cuda:
+            torch.cuda.synchronize()
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def _begin(self, key):
+        if self.active and not self.use_torch_profiler:
+            self._open[key] = self._now_us()
+
+    def _end(self, key, name, category):
+        start = self._open.pop(key, None)
+        if start is not None:
+            self.events.append((name, category, start, self._now_us() - start, threading.get_ident()))
+
+    def _attach(self):
+        for name, module in self.model.named_modules():
+            if not name:
+                continue
+            self._handles.append(module.register_forward_pre_hook(
+                lambda m, args, name=name: self._begin(("forward", name))))
+            self._handles.append(module.register_forward_hook(
+                lambda m, args, out, name=name: self._end(("forward", name), name, "forward")))
+            self._handles.append(module.register_full_backward_pre_hook(
+                lambda m, grad_out, name=name: self._begin(("backward", name))))
+            self._handles.append(module.register_full_backward_hook(
+                lambda m, grad_in, grad_out, name=name: self._end(("backward", name), name, "backward")))
+            if hasattr(module, "search") and hasattr(module.search, "search"):
+                self._wrap_search(module.search, f"{name}.search")
+
+    def _wrap_search(self, search, name):
+        # The code search runs under no_grad inside the VQ forward; time it on its own
+        original = search.search
+
+        def timed(*args, **kwargs):
+            self._begin(("search", name))
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self._end(("search", name), name, "vq_search")
+
+        search.search = timed
+        self._patched.append(search)
+
+    def detach(self):
+        """Remove every hook and wrapper."""
+        for handle in self._handles:
+            handle.remove()
+        self._handles.clear()
+        for search in self._patched:
+            del search.search
+        self._patched.clear()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time a named phase of the training step (``data``, ``forward``, ``loss``...)."""
+        if self._torch_profiler is not None:
+            with torch.profiler.record_function(name):
+                yield
+            return
+        self._begin(("phase", name))
+        try:
+            yield
+        finally:
+            self._end(("phase", name), name, "phase")
+
+    def step(self):
+        """Mark the end of a training step. Returns the summary table when the window just closed."""
+        if self.active:
+            if self._step_started is not None:
+                self.events.append(("step", "step", self._step_started, self._now_us() - self._step_started,
+                                    threading.get_ident()))
+            if self._torch_profiler is not None:
+                self._torch_profiler.step()
+        self.steps += 1
+        if self.steps == self.start_step:
+            self._enter_window()
+        elif self.active and not self.use_torch_profiler:
+            self._step_started = self._now_us()
+        if self.steps == self.end_step and not self.finished:
+            return self.finish()
+        return None
+
+    def _enter_window(self):
+        self._entered = True
+        if self._cuda:
+            torch.cuda.reset_peak_memory_stats()
+        if self.use_torch_profiler:
+            self._torch_profiler = torch.profiler.profile(record_shapes=True, profile_memory=True)
+            self._torch_profiler.__enter__()
+        else:
+            self._attach()
+            self._step_started = self._now_us()
+
+    def peak_memory(self):
+        """Peak device memory in bytes (CUDA) or peak resident set size of the process (CPU)."""
+        if self._cuda:
+            return torch.cuda.max_memory_allocated()
+        try:
+            import resource
+        except ImportError:
+            return None
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def finish(self):
+        """Close the window: write the trace, detach the hooks and return the summary table.
+
+        Called by ``step()`` at ``end_step``, and by the ``Trainer`` when
+        training stops earlier; returns ``None`` if the window never opened.
+        """
+        self.finished = True
+        self.detach()
+        if not self._entered:
+            return None
+        if self._torch_profiler is not None:
+            profiler, self._torch_profiler = self._torch_profiler, None
+            profiler.__exit__(None, None, None)
+            if self.trace_path:
+                profiler.export_chrome_trace(self.trace_path)
+            return profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=25)
+        if self.trace_path:
+            self.export_chrome_trace(self.trace_path)
+        return self.summary()
+
+    def export_chrome_trace(self, path):
+        pid = os.getpid()
+        trace = [{"name": name, "cat": category, "ph": "X", "ts": start, "dur": duration, "pid": pid, "tid": tid}
+                 for name, category, start, duration, tid in self.events]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+    def summary(self):
+        """Table of total and mean time per (category, name), with its share of the step time."""
+        totals = collections.defaultdict(lambda: [0, 0.0])
+        for name, category, _, duration, _ in self.events:
+            totals[(category, name)][0] += 1
+            totals[(category, name)][1] += duration
+        step_time = totals.get(("step", "step"), [0, 0.0])[1] or sum(t for _, t in totals.values()) or 1.0
+
+        lines = [f"{'category':<10} {'name':<36} {'calls':>6} {'total ms':>10} {'mean ms':>9} {'% step':>7}"]
+        for (category, name), (calls, total) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{category:<10} {name:<36} {calls:>6} {total / 1e3:>10.2f} "
+                         f"{total / calls / 1e3:>9.3f} {100 * total / step_time:>6.1f}%")
+        peak = self.peak_memory()
+        if peak is not None:
+            lines.append(f"peak memory: {peak / 2**20:.1f} MiB")
+        return "\n".join(lines)
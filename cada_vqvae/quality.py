@@ -0,0 +1,222 @@
+"""Generation quality: per-class accuracy and a Frechet distance on classifier features.
+
+A small MLP classifier is trained once on FashionMNIST and cached on disk. It
+scores generated images two ways: the share of images generated for a class
+that it assigns to that class, and the Frechet distance between the Gaussian
+fits of its penultimate-layer features on real and generated images (FID
+with this classifier in place of Inception, so the numbers are only
+comparable with each other).
+
+The real-side statistics are computed once and cached in ``cache_dir``
+under a key made of the dataset's content hash and the extractor's version
+and weights. Repeated evaluations (e.g. every few epochs of training) then
+only run the generated-side pass:
+
+    evaluator = GenerationEvaluator.from_cache(val_dataset, train_dataset)
+    report = evaluator(model, class_embeddings, samples_per_class=1000)
+"""
+
+import hashlib
+import os
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from cada_vqvae.generation import generate
+
+# Bump when the classifier architecture or its training recipe changes
+EXTRACTOR_VERSION = "mlp-256-128-v1"
+DEFAULT_CACHE_DIR = os.path.join("data", "quality")
+
+
+class FeatureClassifier(nn.Module):
+    """MLP over flattened ``28x28`` images in ``[0, 1]``; ``features`` is its 128-d penultimate layer."""
+
+    def __init__(self, num_classes=10, feature_size=128):
+        super(FeatureClassifier, self).__init__()
+        self.encoder = nn.Sequential(
+            nn.Linear(28*28, 256),
+            nn.ELU(),
+            nn.Linear(256, feature_size),
+            nn.ELU(),
+        )
+        self.head = nn.Linear(feature_size, num_classes)
+
+    def features(self, x):
+        return self.encoder(x)
+
+    def forward(self, x):
+        return self.head(self.features(x))
+
+
+def train_classifier(dataset, epochs=5, batch_size=256, lr=1e-3, seed=0, log_fn=print):
+    """Train a ``FeatureClassifier`` on a FashionMNIST-style dataset (``.data``/``.targets``)."""
+    from cada_vqvae.data import TensorBatchLoader
+
+    torch.manual_seed(seed)
+    classifier = FeatureClassifier(num_classes=int(torch.as_tensor(dataset.targets).max()) + 1)
+    optimizer = torch.optim.Adam(classifier.parameters(), lr=lr)
+    loader = TensorBatchLoader(dataset, batch_size=batch_size, shuffle=True)
+    for epoch in range(epochs):
+        total = torch.zeros(())
+        for data, target in loader:
+            optimizer.zero_grad(set_to_none=True)
+            loss = F.cross_entropy(classifier(data), target)
+            loss.backward()
+            optimizer.step()
+            total += loss.detach()
+        log_fn(f'Classifier epoch {epoch}, loss {total.item() / len(loader):.4f}')
+    return classifier.eval()
+
+
+def _atomic_write(path, write):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def load_or_train_classifier(train_dataset=None, cache_dir=DEFAULT_CACHE_DIR, **train_kwargs):
+    """The cached classifier of ``EXTRACTOR_VERSION``, trained on ``train_dataset`` on first use."""
+    path = os.path.join(cache_dir, f"classifier-{EXTRACTOR_VERSION}.pt")
+    if os.path.exists(path):
+        state = torch.load(path, map_location="cpu")
+        classifier = FeatureClassifier(num_classes=state["head.weight"].shape[0])
+        classifier.load_state_dict(state)
+        return classifier.eval()
+    if train_dataset is None:
+        raise FileNotFoundError(f"no cached classifier at {path}; pass train_dataset to train one")
+    classifier = train_classifier(train_dataset, **train_kwargs)
+    os.makedirs(cache_dir, exist_ok=True)
+    _atomic_write(path, lambda f: torch.save(classifier.state_dict(), f))
+    return classifier
+
+
+def _hash_tensors(*tensors):
+    digest = hashlib.sha1()
+    for tensor in tensors:
+        digest.update(np.ascontiguousarray(torch.as_tensor(tensor).cpu().numpy()).tobytes())
+    return digest.hexdigest()[:16]
+
+
+class FeatureStatistics:
+    """Streaming mean and covariance of feature rows (float64 sums, one batch at a time)."""
+
+    def __init__(self, size):
+        self.count = 0
+        self.sum = np.zeros(size)
+        self.outer = np.zeros((size, size))
+
+    def update(self, features):
+        features = features.double().numpy()
+        self.count += len(features)
+        self.sum += features.sum(axis=0)
+        self.outer += features.T @ features
+
+    def mean_cov(self):
+        mean = self.sum / self.count
+        cov = (self.outer - self.count * np.outer(mean, mean)) / (self.count - 1)
+        return mean, cov
+
+
+def frechet_distance(mean1, cov1, mean2, cov2):
+    """``|m1 - m2|^2 + tr(C1 + C2 - 2 (C1 C2)^(1/2))`` of two Gaussians.
+
+    ``tr((C1 C2)^(1/2))`` is the sum of the square roots of the eigenvalues
+    of the symmetric ``C1^(1/2) C2 C1^(1/2)``, so only ``eigh`` is needed.
+    """
+    values, vectors = np.linalg.eigh(cov1)
+    sqrt_cov1 = (vectors * np.sqrt(np.clip(values, 0, None))) @ vectors.T
+    cross = np.linalg.eigvalsh(sqrt_cov1 @ cov2 @ sqrt_cov1)
+    trace_sqrt = np.sqrt(np.clip(cross, 0, None)).sum()
+    return float(((mean1 - mean2) ** 2).sum() + np.trace(cov1) + np.trace(cov2) - 2 * trace_sqrt)
+
+
+@torch.no_grad()
+def reference_statistics(classifier, dataset, cache_dir=DEFAULT_CACHE_DIR, batch_size=1024):
+    """``(mean, cov)`` of the classifier features over ``dataset``, cached on disk.
+
+    The cache key covers the dataset's images and labels and the classifier's
+    version and weights, so a different split or a retrained classifier gets
+    its own entry.
+    """
+    from cada_vqvae.data import TensorBatchLoader
+
+    key = "-".join([EXTRACTOR_VERSION, _hash_tensors(dataset.data, dataset.targets),
+                    _hash_tensors(*classifier.state_dict().values())])
+    path = os.path.join(cache_dir, f"reference-{key}.npz")
+    if os.path.exists(path):
+        with np.load(path) as cached:
+            return cached["mean"], cached["cov"]
+
+    stats = FeatureStatistics(classifier.head.in_features)
+    for data, _ in TensorBatchLoader(dataset, batch_size=batch_size):
+        stats.update(classifier.features(data))
+    mean, cov = stats.mean_cov()
+    os.makedirs(cache_dir, exist_ok=True)
+    _atomic_write(path, lambda f: np.savez(f, mean=mean, cov=cov))
+    return mean, cov
+
+
+class GenerationEvaluator:
+    """Scores a ``CADA_VAE``'s generations against cached real-image statistics.
+
+    Args:
+        classifier: A trained ``FeatureClassifier``.
+        reference: ``(mean, cov)`` of its features on real images, as
+            returned by ``reference_statistics``.
+    """
+
+    def __init__(self, classifier, reference):
+        self.classifier = classifier.eval()
+        self.reference = reference
+
+    @classmethod
+    def from_cache(cls, val_dataset, train_dataset=None, cache_dir=DEFAULT_CACHE_DIR):
+        """Load (or on first use train and compute) the classifier and ``val_dataset`` statistics."""
+        classifier = load_or_train_classifier(train_dataset, cache_dir)
+        return cls(classifier, reference_statistics(classifier, val_dataset, cache_dir))
+
+    @torch.no_grad()
+    def __call__(self, model, class_embeddings, samples_per_class=1000, seed=0, batch_size=4096):
+        """Generate ``samples_per_class`` images for every class of ``class_embeddings`` and score them.
+
+        Returns a dict with ``accuracy`` (over all images), ``per_class_accuracy``
+        (one value per class, in label order), ``classes`` and ``fid``.
+        """
+        was_training = model.training
+        table = class_embeddings.table
+        images = generate(model, table, samples_per_word=samples_per_class, seed=seed)
+        model.train(was_training)
+
+        num_classes = len(table)
+        flat = torch.from_numpy(np.asarray(images).reshape(-1, 28*28))
+        labels = torch.arange(num_classes).repeat_interleave(samples_per_class)
+        correct = torch.zeros(num_classes)
+        stats = FeatureStatistics(self.classifier.head.in_features)
+        for start in range(0, len(flat), batch_size):
+            features = self.classifier.features(flat[start:start + batch_size])
+            predictions = self.classifier.head(features).argmax(dim=1)
+            correct.index_add_(0, labels[start:start + batch_size],
+                               (predictions == labels[start:start + batch_size]).float())
+            stats.update(features)
+
+        mean, cov = stats.mean_cov()
+        per_class = (correct / samples_per_class).tolist()
+        return {
+            "samples_per_class": samples_per_class,
+            "classes": list(class_embeddings.classes),
+            "per_class_accuracy": per_class,
+            "accuracy": sum(per_class) / num_classes,
+            "fid": frechet_distance(mean, cov, *self.reference),
+        }
+
+
+def format_report(report):
+    lines = [f"{'class':<12} {'accuracy':>8}"]
+    lines += [f"{name:<12} {accuracy:>8.3f}" for name, accuracy in zip(report["classes"], report["per_class_accuracy"])]
+    lines.append(f"{'all':<12} {report['accuracy']:>8.3f}")
+    lines.append(f"FID ({EXTRACTOR_VERSION} features): {report['fid']:.3f}")
+    return "\n".join(lines)
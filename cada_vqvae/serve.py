@@ -0,0 +1,306 @@
+"""Local micro-batching HTTP server for word-to-image generation.
+
+Loads the model and word vectors once and answers generation requests for
+arbitrary words. Requests arriving within ``--max-wait-ms`` of each other are
+merged into one ``semantic_encoder``/``image_decoder`` forward of at most
+``--max-batch-size`` images.
+
+    python -m cada_vqvae.serve --checkpoint checkpoints/best.pt --port 8080
+
+Endpoints:
+    POST /generate  {"words": ["dress", "boot"], "samples": 4, "seed": 0}
+                    -> {"shape": [2, 4, 28, 28], "dtype": "uint8", "data": "<base64>"}
+    GET  /stats     request/image/batch counters, p50/p99 latency, throughput,
+                    latent cache hit/miss counts
+    GET  /healthz
+"""
+
+import argparse
+import asyncio
+import base64
+import collections
+import concurrent.futures
+import json
+import time
+
+import numpy as np
+import torch
+
+from cada_vqvae.generation import IMAGE_SHAPE, as_embeddings
+from cada_vqvae.latent_cache import SemanticLatentCache
+from cada_vqvae.models import load_model
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                500: "Internal Server Error"}
+
+
+class _Request:
+    __slots__ = ("words", "embeddings", "samples", "generator", "future")
+
+    def __init__(self, words, embeddings, samples, generator, future):
+        self.words = words
+        self.embeddings = embeddings
+        self.samples = samples
+        self.generator = generator
+        self.future = future
+
+    @property
+    def num_images(self):
+        return self.embeddings.shape[0] * self.samples
+
+
+class MicroBatcher:
+    """Merges concurrent generation requests into batched forwards.
+
+    Args:
+        model: ``CADA_VAE`` in eval mode.
+        max_batch_size: Maximum number of images per forward. A single request
+            larger than this still runs, alone.
+        max_wait_ms: How long the first request of a batch waits for others.
+        latent_cache: Optional ``SemanticLatentCache``; words already seen
+            skip the semantic encoder.
+    """
+
+    def __init__(self, model, max_batch_size=64, max_wait_ms=5.0, latent_cache=None):
+        self.model = model
+        self.latent_cache = latent_cache
+        self.device = next(model.parameters()).device
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = asyncio.Queue()
+        # A single worker thread keeps forwards ordered and off the event loop
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.batches = 0
+        self.batched_images = 0
+
+    async def generate(self, words, embeddings, samples=1, seed=None):
+        """``(W, samples, 28, 28)`` float array for ``W`` words and their ``(W, 100)`` embeddings."""
+        # Built before the request joins a batch, so an invalid seed only fails this request
+        generator = torch.Generator().manual_seed(seed) if seed is not None else None
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_Request(words, embeddings, samples, generator, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = batch[0].num_images
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(request)
+                size += request.num_images
+
+            try:
+                results = await loop.run_in_executor(self._executor, self._forward, batch)
+            except Exception as exc:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(exc)
+                continue
+            self.batches += 1
+            self.batched_images += size
+            for request, images in zip(batch, results):
+                if not request.future.done():
+                    request.future.set_result(images)
+
+    @torch.no_grad()
+    def _forward(self, batch):
+        embeddings = torch.cat([request.embeddings for request in batch])
+        if self.latent_cache is not None:
+            words = [word for request in batch for word in request.words]
+            mu_c, logvar_c = self.latent_cache.get(words, embeddings=embeddings)[:2]
+        else:
+            mu_c, logvar_c = self.model.semantic_encoder(embeddings.to(self.device))[:2]
+
+        rows, noise, offset = [], [], 0
+        for request in batch:
+            num_words = request.embeddings.shape[0]
+            rows.append(torch.arange(offset, offset + num_words).repeat_interleave(request.samples))
+            noise.append(torch.randn(request.num_images, mu_c.shape[1], generator=request.generator))
+            offset += num_words
+        rows = torch.cat(rows).to(self.device)
+        noise = torch.cat(noise).to(self.device)
+
+        latent_c = mu_c[rows] + noise * torch.exp(0.5 * logvar_c[rows])
+        images = self.model.image_decoder(latent_c).clamp_(0, 1).cpu().numpy()
+
+        results, start = [], 0
+        for request in batch:
+            end = start + request.num_images
+            results.append(images[start:end].reshape((request.embeddings.shape[0], request.samples) + IMAGE_SHAPE))
+            start = end
+        return results
+
+
+class LatencyStats:
+    """Request latencies (sliding window) and throughput counters."""
+
+    def __init__(self, window=10000):
+        self.latencies = collections.deque(maxlen=window)
+        self.requests = 0
+        self.images = 0
+        self.errors = 0
+        self.started = time.monotonic()
+
+    def record(self, seconds, images):
+        self.latencies.append(seconds)
+        self.requests += 1
+        self.images += images
+
+    def summary(self):
+        latencies = np.array(self.latencies) * 1000.0
+        elapsed = time.monotonic() - self.started
+        return {
+            "requests": self.requests,
+            "images": self.images,
+            "errors": self.errors,
+            "latency_ms": {
+                "p50": float(np.percentile(latencies, 50)) if len(latencies) else None,
+                "p99": float(np.percentile(latencies, 99)) if len(latencies) else None,
+            },
+            "requests_per_sec": self.requests / elapsed,
+            "images_per_sec": self.images / elapsed,
+        }
+
+
+class GenerationServer:
+    """asyncio HTTP/1.1 front end (keep-alive) over a ``MicroBatcher``."""
+
+    def __init__(self, model, word_vectors, max_batch_size=64, max_wait_ms=5.0, max_samples=1024, cache_size=4096):
+        self.word_vectors = word_vectors
+        latent_cache = SemanticLatentCache(model, maxsize=cache_size) if cache_size else None
+        self.batcher = MicroBatcher(model, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                                    latent_cache=latent_cache)
+        self.stats = LatencyStats()
+        self.max_samples = max_samples
+        self._lookup_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    async def _generate(self, body):
+        request = json.loads(body or b"{}")
+        if not isinstance(request, dict):
+            raise ValueError("the request body must be a JSON object")
+        words = request.get("words")
+        samples = request.get("samples", 1)
+        seed = request.get("seed")
+        if not words or not isinstance(words, list):
+            raise ValueError('"words" must be a non-empty list')
+        if isinstance(samples, bool) or not isinstance(samples, int) or not 1 <= samples <= self.max_samples:
+            raise ValueError(f'"samples" must be an integer between 1 and {self.max_samples}')
+        if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int) or not 0 <= seed < 2**63):
+            raise ValueError('"seed" must be null or an integer between 0 and 2**63 - 1')
+        # Unknown words may hit the full word-vector model; keep that off the event loop
+        embeddings = await asyncio.get_running_loop().run_in_executor(
+            self._lookup_executor, as_embeddings, words, self.word_vectors)
+        images = await self.batcher.generate(words, embeddings, samples, seed)
+        pixels = (images * 255).round().astype(np.uint8)
+        return {"shape": list(pixels.shape), "dtype": "uint8",
+                "data": base64.b64encode(pixels.tobytes()).decode("ascii")}, pixels.shape[0] * pixels.shape[1]
+
+    async def handle(self, method, path, body):
+        if path == "/healthz":
+            return 200, {"status": "ok"}
+        if path == "/stats":
+            summary = self.stats.summary()
+            summary["batches"] = self.batcher.batches
+            summary["mean_batch_images"] = self.batcher.batched_images / max(self.batcher.batches, 1)
+            if self.batcher.latent_cache is not None:
+                summary["latent_cache"] = self.batcher.latent_cache.stats()
+            return 200, summary
+        if path != "/generate":
+            return 404, {"error": f"unknown path {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+
+        start = time.perf_counter()
+        try:
+            response, num_images = await self._generate(body)
+        except (ValueError, KeyError) as exc:
+            self.stats.errors += 1
+            return 400, {"error": str(exc)}
+        self.stats.record(time.perf_counter() - start, num_images)
+        return 200, response
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                try:
+                    status, payload = await self.handle(method, path.split("?", 1)[0], body)
+                except Exception as exc:
+                    self.stats.errors += 1
+                    status, payload = 500, {"error": repr(exc)}
+                data = json.dumps(payload).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        batch_loop = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self._serve_connection, host, port)
+        print(f"Serving on http://{host}:{port} (max batch {self.batcher.max_batch_size} images, "
+              f"max wait {self.batcher.max_wait * 1000:.1f} ms)", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batch_loop.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-batching word-to-image generation server.")
+    parser.add_argument("--checkpoint", help="Trainer checkpoint or model state dict (random weights if omitted)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-batch-size", type=int, default=64, help="images per batched forward")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--cache-size", type=int, default=4096, help="semantic latent cache entries (0 disables)")
+    parser.add_argument("--latent-size", type=int, default=20)
+    parser.add_argument("--num-embeddings", type=int, default=512)
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    parser.add_argument("--device", default="cpu")
+    args = parser.parse_args(argv)
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    from cada_vqvae.embeddings import FASHION_MNIST_CLASSES
+    from cada_vqvae.word_vectors import load_word_vectors
+
+    model = load_model(args.checkpoint, args.latent_size, args.num_embeddings, device=args.device)
+    word_vectors = load_word_vectors(FASHION_MNIST_CLASSES)
+    server = GenerationServer(model, word_vectors, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms,
+                              cache_size=args.cache_size)
+    asyncio.run(server.serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""Sharded, memory-mapped image dataset for corpora larger than RAM.
+
+A shard directory looks like::
+
+    index.json                  # image shape, vocabulary and shard sizes
+    shard-00000.images.u8       # (N, H*W) uint8 pixels
+    shard-00000.labels.i64      # (N,) int64 class labels
+    shard-00000.words.i32       # (N,) int32 index into index.json's "words"
+    ...
+
+Shards are written by ``ShardWriter`` (or ``python -m cada_vqvae.shards``)
+and streamed by ``ShardedImageDataset`` through ``numpy.memmap``, so memory
+use is bounded by the shuffle buffer and the read-ahead queue no matter how
+large the corpus is.
+
+    python -m cada_vqvae.shards --fashion-mnist ./data --out ./data/fashion-shards
+    python -m cada_vqvae.shards --image-folder ./my_images --out ./data/my-shards --shard-size 50000
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+
+INDEX_FILE = "index.json"
+FORMAT_VERSION = 1
+
+
+def _shard_paths(root, name):
+    base = os.path.join(root, name)
+    return base + ".images.u8", base + ".labels.i64", base + ".words.i32"
+
+
+class ShardWriter:
+    """Stream ``(image, label)`` pairs into fixed-size shards.
+
+    Args:
+        root: Output directory (created if needed).
+        class_words: Word for every class label; repeated words share a
+            vocabulary entry.
+        image_shape: ``(H, W)`` of every image.
+        shard_size: Samples per shard (the last shard may be smaller).
+    """
+
+    def __init__(self, root, class_words, image_shape=(28, 28), shard_size=65536):
+        self.root = root
+        self.image_shape = tuple(image_shape)
+        self.shard_size = shard_size
+        self.words = list(dict.fromkeys(class_words))
+        self._label_to_word = np.array([self.words.index(w) for w in class_words], dtype=np.int32)
+
+        self._images = np.empty((shard_size, int(np.prod(self.image_shape))), dtype=np.uint8)
+        self._labels = np.empty(shard_size, dtype=np.int64)
+        self._count = 0
+        self.shards = []
+        os.makedirs(root, exist_ok=True)
+
+    def add(self, image, label):
+        self._images[self._count] = np.asarray(image, dtype=np.uint8).reshape(-1)
+        self._labels[self._count] = label
+        self._count += 1
+        if self._count == self.shard_size:
+            self._flush()
+
+    def _flush(self):
+        if self._count == 0:
+            return
+        name = f"shard-{len(self.shards):05d}"
+        images_path, labels_path, words_path = _shard_paths(self.root, name)
+        labels = self._labels[:self._count]
+        self._images[:self._count].tofile(images_path)
+        labels.tofile(labels_path)
+        self._label_to_word[labels].tofile(words_path)
+        self.shards.append({"name": name, "num_samples": self._count})
+        self._count = 0
+
+    def close(self):
+        """Write the last partial shard and the index. Returns the index dict."""
+        self._flush()
+        index = {
+            "version": FORMAT_VERSION,
+            "image_shape": list(self.image_shape),
+            "words": self.words,
+            "shards": self.shards,
+        }
+        tmp_path = os.path.join(self.root, INDEX_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.root, INDEX_FILE))
+        return index
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+
+class ShardedImageDataset(IterableDataset):
+    """Iterable dataset over a shard directory written by ``ShardWriter``.
+
+    Yields ``(image, label)`` like ``datasets.FashionMNIST`` with the
+    ``ToTensor`` + flatten transform: ``image`` is a ``(H*W,)`` float tensor in
+    ``[0, 1]``. With ``return_words=True`` the word index is yielded as well.
+
+    Args:
+        root: Shard directory.
+        shuffle: Shuffle the chunk order across all shards and samples
+            through a bounded shuffle buffer.
+        shuffle_buffer: Number of samples held for shuffling.
+        chunk_size: Rows copied out of a memory-mapped shard per read.
+        read_ahead: Number of chunks a background thread reads ahead.
+        seed: Base seed; combined with the epoch set by ``set_epoch``.
+        rank, world_size: This process's share of every epoch; default to
+            the ``torch.distributed`` rank and world size (0 and 1 when it is
+            not initialized).
+
+    The epoch's chunk order is split at the sample level: every rank gets a
+    contiguous ``num_samples // world_size`` samples of it (the remainder is
+    dropped), so all ranks run the same number of steps however few shards
+    there are, and each rank's share is split evenly across its
+    ``DataLoader`` workers. ``len()`` is this rank's share; ``num_samples``
+    is the size of the whole corpus.
+    """
+
+    def __init__(self, root, shuffle=True, shuffle_buffer=8192, chunk_size=1024, read_ahead=4,
+                 seed=0, return_words=False, rank=None, world_size=None):
+        super(ShardedImageDataset, self).__init__()
+        with open(os.path.join(root, INDEX_FILE)) as f:
+            index = json.load(f)
+        if index.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported shard format version {index.get('version')} in {root}")
+        self.root = root
+        self.image_shape = tuple(index["image_shape"])
+        self.words = index["words"]
+        self.shards = index["shards"]
+        self.num_samples = sum(shard["num_samples"] for shard in self.shards)
+        self.shuffle = shuffle
+        self.shuffle_buffer = shuffle_buffer
+        self.chunk_size = chunk_size
+        self.read_ahead = read_ahead
+        self.seed = seed
+        self.return_words = return_words
+        self.rank = rank
+        self.world_size = world_size
+        self.epoch = 0
+
+    def __len__(self):
+        return self.num_samples // self._rank_and_world_size()[1]
+
+    def set_epoch(self, epoch):
+        """Reshuffle differently on the next pass (call once per epoch)."""
+        self.epoch = epoch
+
+    def _chunks(self, rng):
+        """Every ``(shard, start, end)`` chunk, in an order all workers and ranks agree on."""
+        chunks = [(shard, start, min(start + self.chunk_size, shard["num_samples"]))
+                  for shard in self.shards for start in range(0, shard["num_samples"], self.chunk_size)]
+        if self.shuffle:
+            chunks = [chunks[i] for i in rng.permutation(len(chunks))]
+        return chunks
+
+    def _rank_and_world_size(self):
+        rank, world_size = self.rank, self.world_size
+        if rank is None or world_size is None:
+            distributed = torch.distributed.is_available() and torch.distributed.is_initialized()
+            rank = rank if rank is not None else torch.distributed.get_rank() if distributed else 0
+            world_size = world_size if world_size is not None else (
+                torch.distributed.get_world_size() if distributed else 1)
+        return rank, world_size
+
+    def _assigned_chunks(self, rng):
+        rank = self._rank_and_world_size()[0]
+        worker = get_worker_info()
+        num_workers, worker_id = (worker.num_workers, worker.id) if worker is not None else (1, 0)
+
+        # Sample range [begin, end) of the epoch's chunk order read by this worker
+        per_rank = len(self)
+        begin = rank * per_rank + per_rank * worker_id // num_workers
+        end = rank * per_rank + per_rank * (worker_id + 1) // num_workers
+        assigned, offset = [], 0
+        for shard, start, stop in self._chunks(rng):
+            size = stop - start
+            if offset + size > begin and offset < end:
+                assigned.append((shard, start + max(begin - offset, 0), start + min(end - offset, size)))
+            offset += size
+            if offset >= end:
+                break
+        return assigned
+
+    @staticmethod
+    def _put(chunks, item, stop):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _read_chunks(self, assigned, chunks, stop):
+        pixels = int(np.prod(self.image_shape))
+        try:
+            for shard, start, end in assigned:
+                images_path, labels_path, words_path = _shard_paths(self.root, shard["name"])
+                n = shard["num_samples"]
+                images = np.memmap(images_path, dtype=np.uint8, mode="r", shape=(n, pixels))
+                labels = np.memmap(labels_path, dtype=np.int64, mode="r", shape=(n,))
+                words = np.memmap(words_path, dtype=np.int32, mode="r", shape=(n,))
+                chunk = (np.array(images[start:end]), np.array(labels[start:end]), np.array(words[start:end]))
+                del images, labels, words
+                if not self._put(chunks, chunk, stop):
+                    return
+            self._put(chunks, None, stop)
+        except BaseException as exc:  # surfaced in the consuming thread
+            self._put(chunks, exc, stop)
+
+    def _samples(self, chunks):
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield from zip(*chunk)
+
+    def _emit(self, image, label, word):
+        image = torch.from_numpy(image).float().div_(255)
+        if self.return_words:
+            return image, int(label), int(word)
+        return image, int(label)
+
+    def __iter__(self):
+        worker = get_worker_info()
+        worker_id = worker.id if worker is not None else 0
+        # Every worker/rank must agree on the chunk order, so that one is seeded
+        # without the worker id; the shuffle buffer uses its own stream
+        assigned = self._assigned_chunks(np.random.default_rng([self.seed, self.epoch]))
+        rng = np.random.default_rng([self.seed, self.epoch, worker_id, 1])
+
+        chunks = queue.Queue(maxsize=self.read_ahead)
+        stop = threading.Event()
+        reader = threading.Thread(target=self._read_chunks, args=(assigned, chunks, stop), daemon=True)
+        reader.start()
+        try:
+            if not self.shuffle:
+                for sample in self._samples(chunks):
+                    yield self._emit(*sample)
+                return
+
+            buffer = []
+            for sample in self._samples(chunks):
+                if len(buffer) < self.shuffle_buffer:
+                    buffer.append(sample)
+                    continue
+                i = rng.integers(len(buffer))
+                buffer[i], sample = sample, buffer[i]
+                yield self._emit(*sample)
+            rng.shuffle(buffer)
+            for sample in buffer:
+                yield self._emit(*sample)
+        finally:
+            stop.set()
+
+
+def collate_word_targets(batch):
+    """``DataLoader`` collate of ``return_words=True`` samples into ``(images, word indices)`` batches.
+
+    The word index takes the place of the label, so batches index a
+    ``ClassEmbeddingTable`` built over the dataset's ``words``.
+    """
+    images, _, words = zip(*batch)
+    return torch.stack(images), torch.tensor(words, dtype=torch.long)
+
+
+def load_word_targets(root, words=None):
+    """A whole shard directory in memory, with word indices as targets (e.g. a validation set).
+
+    Returns ``SharedImages`` with uint8 ``(N, H, W)`` ``.data``. ``words``
+    re-indexes the targets into another vocabulary, such as the training
+    shards'; a word missing from it raises ``ValueError``.
+    """
+    from cada_vqvae.data import SharedImages
+
+    with open(os.path.join(root, INDEX_FILE)) as f:
+        index = json.load(f)
+    image_shape = tuple(index["image_shape"])
+    images, targets = [], []
+    for shard in index["shards"]:
+        images_path, _, words_path = _shard_paths(root, shard["name"])
+        n = shard["num_samples"]
+        images.append(np.fromfile(images_path, dtype=np.uint8).reshape((n,) + image_shape))
+        targets.append(np.fromfile(words_path, dtype=np.int32))
+    targets = np.concatenate(targets).astype(np.int64)
+    if words is not None:
+        missing = [word for word in index["words"] if word not in words]
+        if missing:
+            raise ValueError(f"words of {root} missing from the vocabulary: {missing}")
+        targets = np.array([words.index(word) for word in index["words"]], dtype=np.int64)[targets]
+    return SharedImages(torch.from_numpy(np.concatenate(images)), torch.from_numpy(targets))
+
+
+def convert_dataset(dataset, root, class_words, shard_size=65536):
+    """Write an indexable ``(image, label)`` dataset (PIL images or arrays) to shards."""
+    first_image, _ = dataset[0]
+    image_shape = np.asarray(first_image).shape
+    with ShardWriter(root, class_words, image_shape=image_shape, shard_size=shard_size) as writer:
+        for i in range(len(dataset)):
+            image, label = dataset[i]
+            writer.add(np.asarray(image), label)
+    return writer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a labelled image dataset into memory-mapped shards.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--fashion-mnist", metavar="ROOT", help="torchvision FashionMNIST root (training split)")
+    source.add_argument("--image-folder", metavar="DIR",
+                        help="ImageFolder-style directory; class folder names are used as words")
+    parser.add_argument("--out", required=True, help="output shard directory")
+    parser.add_argument("--shard-size", type=int, default=65536)
+    parser.add_argument("--image-size", type=int, default=28, help="side length for --image-folder images")
+    args = parser.parse_args(argv)
+
+    from torchvision import datasets, transforms
+
+    if args.fashion_mnist:
+        from cada_vqvae.embeddings import FASHION_MNIST_CLASSES
+        dataset = datasets.FashionMNIST(args.fashion_mnist, train=True, download=True)
+        class_words = FASHION_MNIST_CLASSES
+    else:
+        dataset = datasets.ImageFolder(args.image_folder, transform=transforms.Compose([
+            transforms.Grayscale(),
+            transforms.Resize((args.image_size, args.image_size)),
+        ]))
+        class_words = dataset.classes
+
+    writer = convert_dataset(dataset, args.out, class_words, shard_size=args.shard_size)
+    print(f"Wrote {len(dataset)} samples in {len(writer.shards)} shards to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Parallel hyperparameter sweeps over ``CADA_VAE`` configurations.
+
+Trials run in a process pool with a fixed intra-op thread budget per worker.
+The parent decodes FashionMNIST and builds the class embedding table once and
+moves them into shared memory; workers wrap those tensors instead of loading
+their own copies. After ``grace_epochs``, a trial whose validation loss is
+worse than the median of the other trials at the same epoch is stopped
+(median stopping rule). Results go into one summary table.
+
+    python -m cada_vqvae.sweep --mode random --trials 32 --workers 8 --threads 2 --epochs 10
+    python -m cada_vqvae.sweep --space space.json --out sweep.json
+
+A search space maps parameter names to a list of values (grid and random
+search) or, for random search only, to ``["uniform", low, high]``,
+``["loguniform", low, high]`` or ``["int", low, high]``.
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import time
+
+import torch
+import torch.multiprocessing as mp
+
+DEFAULT_CONFIG = {
+    "beta": 1.0,
+    "gamma": 2.0,
+    "delta": 1.0,
+    "latent_size": 20,
+    "num_embeddings": 512,
+    "lr": 1e-5,
+    "batch_size": 64,
+}
+
+DEFAULT_SPACE = {
+    "beta": [0.5, 1.0, 2.0],
+    "gamma": [1.0, 2.0],
+    "delta": [0.5, 1.0],
+    "latent_size": [16, 20, 32],
+    "num_embeddings": [256, 512],
+    "lr": [1e-5, 1e-4, 1e-3],
+}
+
+_DISTRIBUTIONS = ("uniform", "loguniform", "int")
+
+
+def _is_distribution(values):
+    return isinstance(values, (list, tuple)) and len(values) == 3 and values[0] in _DISTRIBUTIONS
+
+
+def grid_search(space):
+    """Every combination of the listed values, as config dicts."""
+    for name, values in space.items():
+        if _is_distribution(values):
+            raise ValueError(f"grid search needs a list of values for {name!r}, got a distribution")
+    names = list(space)
+    return [dict(zip(names, combination)) for combination in itertools.product(*(space[n] for n in names))]
+
+
+def random_search(space, num_trials, seed=0):
+    """``num_trials`` configs drawn independently from ``space``."""
+    rng = random.Random(seed)
+
+    def draw(values):
+        if not _is_distribution(values):
+            return rng.choice(values)
+        kind, low, high = values
+        if kind == "uniform":
+            return rng.uniform(low, high)
+        if kind == "loguniform":
+            return math.exp(rng.uniform(math.log(low), math.log(high)))
+        return rng.randint(low, high)
+
+    return [{name: draw(values) for name, values in space.items()} for _ in range(num_trials)]
+
+
+def load_shared_data(data_dir="./data"):
+    """FashionMNIST and its class embedding table, moved to shared memory."""
+    from torchvision import datasets
+
+    from cada_vqvae.embeddings import FASHION_MNIST_CLASSES, ClassEmbeddingTable
+    from cada_vqvae.word_vectors import load_word_vectors
+
+    shared = {}
+    for split, train in (("train", True), ("val", False)):
+        dataset = datasets.FashionMNIST(data_dir, train=train, download=True)
+        shared[f"{split}_images"] = dataset.data.contiguous().share_memory_()
+        shared[f"{split}_targets"] = dataset.targets.contiguous().share_memory_()
+    word_vectors = load_word_vectors(FASHION_MNIST_CLASSES)
+    shared["class_table"] = ClassEmbeddingTable(FASHION_MNIST_CLASSES, word_vectors).table.share_memory_()
+    return shared
+
+
+# Per-worker state set by _init_worker
+_worker = {}
+
+
+def _init_worker(shared, history, threads, grace_epochs):
+    torch.set_num_threads(threads)
+    _worker.update(shared=shared, history=history, grace_epochs=grace_epochs)
+
+
+def _should_stop(history, trial_id, epoch, value, grace_epochs):
+    """Median stopping rule over the trials that have reached ``epoch``."""
+    if epoch < grace_epochs:
+        return False
+    others = [losses[epoch] for other_id, losses in history.items() if other_id != trial_id and len(losses) > epoch]
+    if not others:
+        return False
+    others.sort()
+    middle = len(others) // 2
+    median = others[middle] if len(others) % 2 else (others[middle - 1] + others[middle]) / 2
+    return value > median
+
+
+def run_trial(trial_id, config, epochs, seed=0):
+    """Train one configuration in a pool worker; returns its summary row."""
+    from cada_vqvae.data import SharedImages, TensorBatchLoader
+    from cada_vqvae.embeddings import FASHION_MNIST_CLASSES, ClassEmbeddingTable
+    from cada_vqvae.losses import CADALoss
+    from cada_vqvae.models import CADA_VAE
+    from cada_vqvae.trainer import Trainer
+
+    shared, history, grace_epochs = _worker["shared"], _worker["history"], _worker["grace_epochs"]
+    config = {**DEFAULT_CONFIG, **config}
+    torch.manual_seed(seed)
+    train_loader = TensorBatchLoader(SharedImages(shared["train_images"], shared["train_targets"]),
+                                     batch_size=config["batch_size"], shuffle=True)
+    val_loader = TensorBatchLoader(SharedImages(shared["val_images"], shared["val_targets"]),
+                                   batch_size=config["batch_size"])
+    class_embeddings = ClassEmbeddingTable.from_table(FASHION_MNIST_CLASSES, shared["class_table"])
+
+    model = CADA_VAE(config["latent_size"], config["num_embeddings"], 100)
+    optimizer = torch.optim.Adam(model.parameters(), lr=config["lr"])
+    criterion = CADALoss(config["beta"], config["gamma"], config["delta"])
+    trainer = Trainer(model, optimizer, class_embeddings, criterion=criterion, log_interval=0,
+                      log_fn=lambda *_: None)
+
+    start = time.perf_counter()
+    status = "completed"
+    val_history = []
+    for epoch in range(epochs):
+        trainer.fit(train_loader, val_loader, epochs=epoch + 1)
+        val_loss = trainer.val_losses["total_loss"][-1]
+        if not math.isfinite(val_loss):
+            status = "diverged"
+            break
+        val_history.append(val_loss)
+        # Manager dict: reassign the whole list so other workers see the update
+        history[trial_id] = val_history
+        if _should_stop(history, trial_id, epoch, val_loss, grace_epochs):
+            status = "stopped"
+            break
+
+    return {
+        "trial": trial_id,
+        **config,
+        "status": status,
+        "epochs": len(val_history),
+        "best_val_loss": min(val_history) if val_history else float("nan"),
+        "final_val_loss": val_history[-1] if val_history else float("nan"),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def run_sweep(configs, epochs, workers=None, threads=1, grace_epochs=2, shared=None, data_dir="./data", seed=0):
+    """Train ``configs`` in a pool of ``workers`` processes; returns summary rows sorted by best val loss."""
+    workers = workers or max(1, (os.cpu_count() or 1) // threads)
+    shared = shared if shared is not None else load_shared_data(data_dir)
+    context = mp.get_context("spawn")
+    with context.Manager() as manager:
+        history = manager.dict()
+        with context.Pool(workers, initializer=_init_worker,
+                          initargs=(shared, history, threads, grace_epochs)) as pool:
+            pending = [pool.apply_async(run_trial, (i, config, epochs, seed)) for i, config in enumerate(configs)]
+            results = [result.get() for result in pending]
+    return sorted(results, key=lambda row: (math.isnan(row["best_val_loss"]), row["best_val_loss"]))
+
+
+def format_table(rows, columns=None):
+    """Fixed-width text table of summary rows."""
+    columns = columns or list(rows[0])
+    cells = [[f"{row[c]:.4g}" if isinstance(row[c], float) else str(row[c]) for c in columns] for row in rows]
+    widths = [max(len(c), *(len(r[i]) for r in cells)) for i, c in enumerate(columns)]
+    lines = ["  ".join(c.rjust(w) for c, w in zip(columns, widths))]
+    lines += ["  ".join(v.rjust(w) for v, w in zip(r, widths)) for r in cells]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep over CADA_VAE configurations.")
+    parser.add_argument("--space", help="JSON file with the search space (default: a built-in space)")
+    parser.add_argument("--mode", choices=["grid", "random"], default="random")
+    parser.add_argument("--trials", type=int, default=16, help="number of random-search trials")
+    parser.add_argument("--workers", type=int, default=None, help="parallel trials (default: cores / threads)")
+    parser.add_argument("--threads", type=int, default=1, help="intra-op threads per worker")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--grace-epochs", type=int, default=2, help="epochs before early stopping may trigger")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default="./data")
+    parser.add_argument("--out", help="write the summary rows to this JSON file")
+    args = parser.parse_args(argv)
+
+    space = DEFAULT_SPACE
+    if args.space:
+        with open(args.space) as f:
+            space = json.load(f)
+    if args.mode == "grid":
+        configs = grid_search(space)
+    else:
+        configs = random_search(space, args.trials, seed=args.seed)
+
+    rows = run_sweep(configs, args.epochs, workers=args.workers, threads=args.threads,
+                     grace_epochs=args.grace_epochs, data_dir=args.data_dir, seed=args.seed)
+    print(format_table(rows))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+"""Training engine for ``CADA_VAE``.
+
+The module-level loop of the training script called ``total_loss.item()``
+every batch (a host-device sync per step) and recorded the other loss
+components from the last batch of each epoch only. ``Trainer`` accumulates
+every component on-device, synchronizes once per logging interval and once
+per epoch, and optionally runs the step under autocast and ``torch.compile``.
+"""
+
+import contextlib
+import itertools
+import random
+import time
+
+import numpy as np
+import torch
+import torch.distributed as dist
+
+from cada_vqvae.losses import LOSS_COMPONENTS, cada_vae_loss
+from cada_vqvae.profiling import StepProfiler
+
+
+def unwrap_model(model):
+    """Return the bare ``CADA_VAE`` behind ``DistributedDataParallel``/``torch.compile`` wrappers."""
+    model = getattr(model, "_orig_mod", model)
+    return getattr(model, "module", model)
+
+
+def _reduce_across_ranks(totals, *counts):
+    """Sum ``totals`` and the scalar ``counts`` over all ranks (no-op without ``torch.distributed``)."""
+    if not (dist.is_available() and dist.is_initialized()):
+        return (totals,) + counts
+    packed = torch.cat([totals, torch.tensor(counts, dtype=totals.dtype, device=totals.device)])
+    dist.all_reduce(packed)
+    return (packed[:len(totals)],) + tuple(packed[len(totals):].tolist())
+
+
+def get_rng_state():
+    """RNG state of python, numpy, torch and (if present) every CUDA device."""
+    state = {"python": random.getstate(), "numpy": np.random.get_state(), "torch": torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def new_loss_history(steps=False):
+    """Empty ``{component: [per-epoch values]}`` dict, as used for train_losses/val_losses.
+
+    With ``steps=True`` a ``"step"`` list holds the global step of every entry.
+    """
+    history = {name: [] for name in LOSS_COMPONENTS}
+    if steps:
+        history["step"] = []
+    return history
+
+
+class Trainer:
+    """Runs training and validation epochs of a ``CADA_VAE``.
+
+    Args:
+        model: The ``CADA_VAE`` (already on ``device``).
+        optimizer: Optimizer over the model's parameters.
+        class_embeddings: ``ClassEmbeddingTable`` mapping labels to word vectors.
+        beta, gamma, delta: Loss weights passed to ``loss_fn``.
+        loss_fn: Function with the signature of ``cada_vae_loss``.
+        criterion: Optional ``CADALoss``; when given it replaces ``loss_fn``
+            (and its weights replace beta/gamma/delta).
+        device: Device batches are moved to (defaults to the model's).
+        amp_dtype: ``torch.bfloat16`` or ``torch.float16`` to run the forward
+            pass and loss under autocast; ``None`` trains in float32. float16
+            uses a gradient scaler on CUDA.
+        compile: Wrap the forward + loss computation in ``torch.compile``.
+        log_interval: Print running means every this many steps (0 disables).
+        log_fn: Where progress lines go.
+        checkpoint_manager: Optional ``CheckpointManager``; it is asked after
+            every step whether to checkpoint, and gets an end-of-epoch
+            checkpoint with the validation loss as its metric.
+        profiler: Optional ``StepProfiler`` timing the phases of each step
+            (data, forward, loss, backward, optimizer, sync). Defaults to
+            ``StepProfiler.from_env(model)``, i.e. none unless ``CADA_PROFILE``
+            is set.
+        validator: Optional ``BackgroundValidator``. Validation then runs on
+            weight snapshots in its worker process while training continues
+            (``fit`` ignores ``val_loader``); results land in ``val_losses``
+            (full set) and ``val_subset_losses`` (stratified subset) as they
+            arrive, and full-set results score the epoch checkpoints.
+
+    Under ``torch.distributed`` (``model`` wrapped in
+    ``DistributedDataParallel``, loaders split by rank) the per-epoch means
+    and throughput are reduced over all ranks; give only rank 0 a
+    ``checkpoint_manager``, a printing ``log_fn`` and the ``validator``.
+    """
+
+    def __init__(self, model, optimizer, class_embeddings, beta=1.0, gamma=2.0, delta=1.0,
+                 loss_fn=cada_vae_loss, criterion=None, device=None, amp_dtype=None, compile=False,
+                 log_interval=100, log_fn=print, checkpoint_manager=None, profiler=None, validator=None):
+        self.model = model
+        self.optimizer = optimizer
+        self.class_embeddings = class_embeddings
+        self.beta = beta
+        self.gamma = gamma
+        self.delta = delta
+        self.loss_fn = loss_fn
+        self.criterion = criterion
+        self.device = torch.device(device) if device is not None else next(model.parameters()).device
+        self.amp_dtype = amp_dtype
+        self.log_interval = log_interval
+        self.log_fn = log_fn
+        self.checkpoint_manager = checkpoint_manager
+        self.profiler = profiler if profiler is not None else StepProfiler.from_env(model)
+        self.validator = validator
+
+        self.scaler = torch.amp.GradScaler("cuda", enabled=amp_dtype == torch.float16 and self.device.type == "cuda")
+        self.compute_losses = torch.compile(self._compute_losses) if compile else self._compute_losses
+
+        self.epoch = 0
+        self.global_step = 0
+        self.train_losses = new_loss_history()
+        self.val_losses = new_loss_history(steps=True)
+        self.val_subset_losses = new_loss_history(steps=True)
+        self.samples_per_sec = []
+
+        # Position inside the current epoch, so a checkpoint can resume mid-epoch
+        self._step_in_epoch = 0
+        self._epoch_totals = None
+        self._epoch_rng_state = None
+        self._epoch_generator_state = None
+        self._resume = None
+
+    def _phase(self, name):
+        if self.profiler is None:
+            return contextlib.nullcontext()
+        return self.profiler.phase(name)
+
+    def _autocast(self):
+        if self.amp_dtype is None:
+            return contextlib.nullcontext()
+        return torch.autocast(device_type=self.device.type, dtype=self.amp_dtype)
+
+    def _compute_losses(self, data, target):
+        """Forward pass and loss; returns all components stacked into one tensor."""
+        semantic_embeddings = self.class_embeddings(target)
+        if self.criterion is not None:
+            with self._phase("forward"):
+                outputs = self.model(data, semantic_embeddings,
+                                     cross_reconstruction=self.criterion.cross_reconstruction)
+            with self._phase("loss"):
+                return self.criterion(outputs, data, semantic_embeddings, target)
+
+        with self._phase("forward"):
+            recon_x, recon_c, mu_x, logvar_x, mu_c, logvar_c, z_e, quantization_loss, commitment_loss = self.model(
+                data, semantic_embeddings)
+        with self._phase("loss"):
+            losses = self.loss_fn(
+                recon_x, data, recon_c, semantic_embeddings, recon_x, recon_c,
+                mu_x, logvar_x, z_e, quantization_loss, commitment_loss, self.beta, self.gamma, self.delta
+            )
+            return torch.stack([loss.float() for loss in losses])
+
+    def _to_device(self, data, target):
+        return data.to(self.device, non_blocking=True), target.to(self.device, non_blocking=True)
+
+    def train_step(self, data, target):
+        """One optimizer step; returns the detached loss components (no sync)."""
+        self.optimizer.zero_grad(set_to_none=True)
+        with self._autocast():
+            losses = self.compute_losses(data, target)
+        with self._phase("backward"):
+            self.scaler.scale(losses[0]).backward()
+        with self._phase("optimizer"):
+            self.scaler.step(self.optimizer)
+            self.scaler.update()
+        self.global_step += 1
+        return losses.detach()
+
+    def _epoch_batches(self, loader, resume):
+        generator = getattr(loader, "generator", None)
+        if resume is None:
+            # Everything that decides this epoch's batch order, captured before it is consumed
+            self._epoch_rng_state = torch.get_rng_state()
+            self._epoch_generator_state = generator.get_state() if generator is not None else None
+            return iter(loader)
+
+        torch.set_rng_state(resume["epoch_rng_state"])
+        if generator is not None and resume["epoch_generator_state"] is not None:
+            generator.set_state(resume["epoch_generator_state"])
+        self._epoch_rng_state = resume["epoch_rng_state"]
+        self._epoch_generator_state = resume["epoch_generator_state"]
+        skip = resume["step_in_epoch"]
+        if hasattr(loader, "batches"):
+            return loader.batches(start_batch=skip)
+        return itertools.islice(iter(loader), skip, None)
+
+    def train_epoch(self, loader):
+        """Train for one pass over ``loader``; returns ``{component: mean over batches}``.
+
+        A ``loader.dataset`` with ``set_epoch`` (``ShardedImageDataset``) is
+        told the epoch first, so every epoch is shuffled differently.
+        """
+        dataset = getattr(loader, "dataset", None)
+        if hasattr(dataset, "set_epoch"):
+            dataset.set_epoch(self.epoch)
+        self.model.train()
+        resume, self._resume = self._resume, None
+        totals = torch.zeros(len(LOSS_COMPONENTS), device=self.device)
+        window = torch.zeros_like(totals)
+        num_batches = window_batches = num_samples = 0
+        if resume is not None:
+            totals += resume["epoch_totals"].to(self.device)
+            num_batches = resume["step_in_epoch"]
+        self._epoch_totals = totals
+        start = time.perf_counter()
+
+        batches = self._epoch_batches(loader, resume)
+        while True:
+            with self._phase("data"):
+                batch = next(batches, None)
+                if batch is not None:
+                    data, target = self._to_device(*batch)
+            if batch is None:
+                break
+            if resume is not None:
+                # The batch order is re-drawn; from here on continue the saved RNG streams
+                set_rng_state(resume["rng"])
+                resume = None
+            losses = self.train_step(data, target)
+            totals += losses
+            window += losses
+            num_batches += 1
+            window_batches += 1
+            num_samples += data.shape[0]
+            self._step_in_epoch = num_batches
+            if self.profiler is not None:
+                report = self.profiler.step()
+                if report is not None:
+                    self.log_fn(report)
+
+            if self.checkpoint_manager is not None and self.checkpoint_manager.should_save(self.global_step):
+                self.checkpoint_manager.save(self.state_dict(), self.global_step)
+            if self.validator is not None and self.validator.subset_due(self.global_step):
+                self.validator.submit(self, "subset")
+                self._record_validation(self.validator.poll())
+
+            if self.log_interval and self.global_step % self.log_interval == 0:
+                # The only sync inside the epoch
+                with self._phase("sync"):
+                    running = (window / window_batches).tolist()
+                self.log_fn(f'Epoch {self.epoch}, Step {self.global_step}, '
+                            + ', '.join(f'{k}: {v:.4f}' for k, v in zip(LOSS_COMPONENTS, running)))
+                window.zero_()
+                window_batches = 0
+
+        if resume is not None:
+            # Checkpoint was taken after the epoch's last batch
+            set_rng_state(resume["rng"])
+        elapsed = time.perf_counter() - start
+        totals, num_batches, num_samples = _reduce_across_ranks(totals, num_batches, num_samples)
+        means = (totals / max(num_batches, 1)).tolist()
+        self.samples_per_sec.append(num_samples / elapsed)
+        self._step_in_epoch = 0
+        self._epoch_totals = None
+        return dict(zip(LOSS_COMPONENTS, means))
+
+    @torch.no_grad()
+    def evaluate(self, loader):
+        """Mean loss components over ``loader`` in eval mode."""
+        self.model.eval()
+        totals = torch.zeros(len(LOSS_COMPONENTS), device=self.device)
+        num_batches = 0
+        for data, target in loader:
+            data, target = self._to_device(data, target)
+            with self._autocast():
+                totals += self.compute_losses(data, target)
+            num_batches += 1
+        totals, num_batches = _reduce_across_ranks(totals, num_batches)
+        return dict(zip(LOSS_COMPONENTS, (totals / max(num_batches, 1)).tolist()))
+
+    def _record_validation(self, results):
+        """Append background validation results to the loss histories, in step order."""
+        for step, split, metrics in sorted(results, key=lambda result: result[0]):
+            history = self.val_losses if split == "full" else self.val_subset_losses
+            for name, value in metrics.items():
+                history[name].append(value)
+            if "step" in history:
+                history["step"].append(step)
+            self.log_fn(f'Step {step}, Val Loss ({split}): {metrics["total_loss"]:.4f}')
+            if split == "full" and self.checkpoint_manager is not None:
+                self.checkpoint_manager.report_metric(step, metrics["total_loss"])
+
+    def fit(self, train_loader, val_loader, epochs):
+        """Train until ``self.epoch == epochs``, validating after every epoch.
+
+        Per-epoch means are appended to ``self.train_losses``/``self.val_losses``.
+        With a ``validator`` the validation results may arrive later; ``fit``
+        waits for all of them before returning. A profiler whose window is
+        still open when training stops writes its trace then.
+        """
+        try:
+            while self.epoch < epochs:
+                for name, value in self.train_epoch(train_loader).items():
+                    self.train_losses[name].append(value)
+                if self.validator is None:
+                    for name, value in self.evaluate(val_loader).items():
+                        self.val_losses[name].append(value)
+                    if "step" in self.val_losses:
+                        self.val_losses["step"].append(self.global_step)
+                    self.log_fn(f'Epoch {self.epoch}, Train Loss: {self.train_losses["total_loss"][-1]:.4f}, '
+                                f'Val Loss: {self.val_losses["total_loss"][-1]:.4f}, '
+                                f'{self.samples_per_sec[-1]:.0f} samples/s')
+                else:
+                    split = self.validator.epoch_split(self.epoch + 1, last=self.epoch + 1 == epochs)
+                    if split is not None:
+                        self.validator.submit(self, split)
+                    self.log_fn(f'Epoch {self.epoch}, Train Loss: {self.train_losses["total_loss"][-1]:.4f}, '
+                                f'{self.samples_per_sec[-1]:.0f} samples/s')
+
+                # Codebook utilization over this epoch's training steps
+                vq_layer = unwrap_model(self.model).semantic_encoder.vq_layer
+                codebook_stats = vq_layer.codebook_stats()
+                self.log_fn(f'  Codebook: {codebook_stats["active_codes"]}/{codebook_stats["num_embeddings"]} '
+                            f'codes used, perplexity {codebook_stats["perplexity"]:.2f}')
+                vq_layer.reset_usage()
+                self.epoch += 1
+
+                if self.checkpoint_manager is not None:
+                    metric = self.val_losses["total_loss"][-1] if self.validator is None else None
+                    self.checkpoint_manager.save(self.state_dict(), self.global_step, metric=metric)
+                if self.validator is not None:
+                    self._record_validation(self.validator.poll())
+            if self.validator is not None:
+                self._record_validation(self.validator.wait())
+            if self.checkpoint_manager is not None:
+                self.checkpoint_manager.wait()
+            return self.train_losses, self.val_losses
+        finally:
+            if self.profiler is not None and not self.profiler.finished:
+                report = self.profiler.finish()
+                if report is not None:
+                    self.log_fn(report)
+
+    def state_dict(self):
+        """Everything needed to continue training exactly where it stopped.
+
+        The model state includes the VQ codebook (and its EMA buffers).
+        """
+        state = {
+            "model": unwrap_model(self.model).state_dict(),
+            "optimizer": self.optimizer.state_dict(),
+            "scaler": self.scaler.state_dict(),
+            "epoch": self.epoch,
+            "global_step": self.global_step,
+            "train_losses": self.train_losses,
+            "val_losses": self.val_losses,
+            "val_subset_losses": self.val_subset_losses,
+            "samples_per_sec": self.samples_per_sec,
+            "rng": get_rng_state(),
+            "step_in_epoch": self._step_in_epoch,
+        }
+        if self._step_in_epoch:
+            state["epoch_totals"] = self._epoch_totals
+            state["epoch_rng_state"] = self._epoch_rng_state
+            state["epoch_generator_state"] = self._epoch_generator_state
+        return state
+
+    def load_state_dict(self, state):
+        """Restore a ``state_dict()``; a mid-epoch state resumes at the next batch of that epoch."""
+        unwrap_model(self.model).load_state_dict(state["model"])
+        self.optimizer.load_state_dict(state["optimizer"])
+        if state["scaler"]:
+            self.scaler.load_state_dict(state["scaler"])
+        self.epoch = state["epoch"]
+        self.global_step = state["global_step"]
+        self.train_losses = state["train_losses"]
+        self.val_losses = state["val_losses"]
+        self.val_subset_losses = state.get("val_subset_losses", new_loss_history(steps=True))
+        self.samples_per_sec = state["samples_per_sec"]
+        if state["step_in_epoch"]:
+            # The RNG is restored once the epoch's batch order has been re-drawn
+            self._resume = {key: state[key] for key in
+                            ("rng", "step_in_epoch", "epoch_totals", "epoch_rng_state", "epoch_generator_state")}
+        else:
+            set_rng_state(state["rng"])
+
+    def resume_from(self, checkpoint_manager=None):
+        """Load the newest checkpoint of ``checkpoint_manager`` (default: the trainer's). Returns True if found."""
+        manager = checkpoint_manager or self.checkpoint_manager
+        state = manager.load_latest(map_location="cpu")
+        if state is None:
+            return False
+        self.load_state_dict(state)
+        self.log_fn(f'Resumed from step {self.global_step} (epoch {self.epoch})')
+        return True
@@ -0,0 +1,176 @@
+"""Validation in a background process on CPU snapshots of the weights.
+
+``Trainer.evaluate`` stops training for a full pass over the validation set.
+With a ``BackgroundValidator`` the trainer instead copies the model's
+``state_dict()`` to CPU memory and queues it; a worker process (started on the
+first submission) rebuilds the model from the snapshot and computes the loss
+components while training continues. Frequent checks can use a fixed
+stratified subset of the validation set and full passes can run less often:
+
+    validator = BackgroundValidator(val_dataset, subset_per_class=100, subset_every_steps=500,
+                                    full_every_epochs=5)
+    trainer = Trainer(model, optimizer, class_embeddings, criterion=criterion, validator=validator)
+    train_losses, val_losses = trainer.fit(train_loader, None, epochs)
+
+Full-set results are appended to ``trainer.val_losses`` and subset results to
+``trainer.val_subset_losses``, each with the global step of its snapshot in
+their ``"step"`` list.
+"""
+
+import os
+import queue
+import traceback
+
+import torch
+import torch.multiprocessing as mp
+
+from cada_vqvae.checkpoint import snapshot_to_cpu
+from cada_vqvae.embeddings import ClassEmbeddingTable
+
+
+def _validation_worker(images, targets, subset, class_embeddings, loss_kwargs, batch_size, threads, requests,
+                       results):
+    from cada_vqvae.data import SharedImages, TensorBatchLoader
+    from cada_vqvae.models import model_from_state_dict
+    from cada_vqvae.profiling import PROFILE_ENV
+    from cada_vqvae.trainer import Trainer
+
+    torch.set_num_threads(threads)
+    # Profiling is for the training process
+    os.environ.pop(PROFILE_ENV, None)
+    loaders = {"full": TensorBatchLoader(SharedImages(images, targets), batch_size=batch_size)}
+    if subset is not None:
+        loaders["subset"] = TensorBatchLoader(SharedImages(images[subset], targets[subset]), batch_size=batch_size)
+
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        step, split, state = request
+        try:
+            model = model_from_state_dict(state)
+            trainer = Trainer(model, None, class_embeddings, device="cpu", log_interval=0, **loss_kwargs)
+            results.put((step, split, trainer.evaluate(loaders[split]), None))
+        except BaseException:
+            results.put((step, split, None, traceback.format_exc()))
+
+
+class BackgroundValidator:
+    """Computes validation losses of weight snapshots in a worker process.
+
+    Args:
+        dataset: Validation dataset exposing uint8 ``.data`` and integer
+            ``.targets`` (as ``TensorBatchLoader`` expects). Its tensors are
+            moved to shared memory once.
+        subset_per_class: Size per class of the fixed stratified subset used
+            for frequent checks (``None``: no subset).
+        subset_every_steps: Validate on the subset every this many training
+            steps (``None`` disables).
+        full_every_epochs: Validate on the full set every this many epochs
+            (and after the last epoch). Other epochs end with a subset check
+            when there is a subset.
+        batch_size: Validation batch size.
+        threads: Intra-op threads of the worker, taken from training's share
+            of the cores.
+        max_pending: Snapshots queued or in evaluation at most; ``submit``
+            waits for a result beyond that, which bounds memory.
+        seed: Seed of the subset selection.
+
+    Give only rank 0 a validator under ``torch.distributed``. Errors in the
+    worker are re-raised by the next ``poll`` or ``wait``.
+    """
+
+    def __init__(self, dataset, subset_per_class=None, subset_every_steps=None, full_every_epochs=1,
+                 batch_size=1024, threads=1, max_pending=2, seed=0):
+        self.images = dataset.data.contiguous().share_memory_()
+        self.targets = torch.as_tensor(dataset.targets, dtype=torch.long).contiguous().share_memory_()
+        self.subset = None
+        if subset_per_class is not None:
+            from cada_vqvae.latents import stratified_sample
+            self.subset = torch.from_numpy(stratified_sample(self.targets.numpy(), subset_per_class, seed))
+        self.subset_every_steps = subset_every_steps
+        self.full_every_epochs = full_every_epochs
+        self.batch_size = batch_size
+        self.threads = threads
+        self.max_pending = max_pending
+
+        self.pending = 0
+        self._ready = []
+        self._process = None
+        self._requests = None
+        self._results = None
+
+    def subset_due(self, step):
+        return self.subset is not None and bool(self.subset_every_steps) and step % self.subset_every_steps == 0
+
+    def epoch_split(self, epoch, last):
+        """``"full"``, ``"subset"`` or ``None``: what to validate after (1-based) ``epoch``."""
+        if last or epoch % self.full_every_epochs == 0:
+            return "full"
+        return "subset" if self.subset is not None else None
+
+    def _start(self, trainer):
+        loss_kwargs = {"beta": trainer.beta, "gamma": trainer.gamma, "delta": trainer.delta,
+                       "loss_fn": trainer.loss_fn, "criterion": trainer.criterion}
+        table = trainer.class_embeddings
+        class_embeddings = ClassEmbeddingTable.from_table(table.classes, snapshot_to_cpu(table.table),
+                                                          aliases=dict(zip(table.classes, table.words)))
+        context = mp.get_context("spawn")
+        self._requests = context.Queue()
+        self._results = context.Queue()
+        self._process = context.Process(
+            target=_validation_worker,
+            args=(self.images, self.targets, self.subset, class_embeddings, loss_kwargs, self.batch_size,
+                  self.threads, self._requests, self._results),
+            daemon=True)
+        self._process.start()
+
+    def submit(self, trainer, split="full"):
+        """Queue a CPU snapshot of ``trainer``'s model for validation on ``split`` at its current step."""
+        from cada_vqvae.trainer import unwrap_model
+
+        if self._process is None:
+            self._start(trainer)
+        state = snapshot_to_cpu(unwrap_model(trainer.model).state_dict())
+        while self.pending >= self.max_pending:
+            self._receive(block=True)
+        self._requests.put((trainer.global_step, split, state))
+        self.pending += 1
+
+    def _receive(self, block):
+        try:
+            step, split, metrics, error = self._results.get(block=block)
+        except queue.Empty:
+            return False
+        self.pending -= 1
+        if error is not None:
+            raise RuntimeError(f"Background validation of step {step} failed:\n{error}")
+        self._ready.append((step, split, metrics))
+        return True
+
+    def poll(self):
+        """Finished ``(step, split, {component: mean})`` results, without waiting."""
+        while self.pending and self._receive(block=False):
+            pass
+        ready, self._ready = self._ready, []
+        return ready
+
+    def wait(self):
+        """Every outstanding result, waiting for the worker to finish them."""
+        while self.pending:
+            self._receive(block=True)
+        return self.poll()
+
+    def close(self):
+        """Stop the worker process (outstanding results are dropped)."""
+        if self._process is not None:
+            self._requests.put(None)
+            self._process.join()
+            self._process = None
+            self.pending = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
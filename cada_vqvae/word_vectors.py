@@ -0,0 +1,107 @@
+"""Compact on-disk cache of the word vectors used by the model.
+
+Loading ``glove-wiki-gigaword-100`` through gensim pulls ~400k vectors into
+memory although the model only ever looks up a handful of class words.
+``WordVectorStore`` extracts the words it needs once into a small ``.npy``
+matrix that is memory-mapped on later runs, and only falls back to the full
+gensim model for words it has never seen before.
+"""
+
+import json
+import os
+
+import numpy as np
+
+DEFAULT_MODEL = "glove-wiki-gigaword-100"
+DEFAULT_CACHE_DIR = os.path.join("data", "word_vectors")
+
+
+class WordVectorStore:
+    """Dict-like ``word -> vector`` lookup backed by a memory-mapped cache.
+
+    The cache is two files in ``cache_dir``: ``<model_name>.npy`` holding a
+    ``(num_words, vector_size)`` float32 matrix and ``<model_name>.vocab.json``
+    holding the word of every row. Words missing from the cache are fetched
+    from the full gensim model (loaded lazily, at most once) and appended.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL, cache_dir=DEFAULT_CACHE_DIR):
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self._vectors_path = os.path.join(cache_dir, model_name + ".npy")
+        self._vocab_path = os.path.join(cache_dir, model_name + ".vocab.json")
+        self._full_model = None
+        self._words = []
+        self._index = {}
+        self._vectors = None
+        self._open()
+
+    def _open(self):
+        if not (os.path.exists(self._vocab_path) and os.path.exists(self._vectors_path)):
+            return
+        with open(self._vocab_path) as f:
+            self._words = json.load(f)
+        self._index = {word: i for i, word in enumerate(self._words)}
+        self._vectors = np.load(self._vectors_path, mmap_mode="r")
+
+    def _load_full_model(self):
+        if self._full_model is None:
+            import gensim.downloader as api
+            self._full_model = api.load(self.model_name)
+        return self._full_model
+
+    def _write(self, words, vectors):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Vectors go first and the vocab last: the vocab file is what makes new
+        # rows visible, so a reader never sees a word without its vector.
+        for path, write in ((self._vectors_path, lambda f: np.save(f, vectors)),
+                            (self._vocab_path, lambda f: f.write(json.dumps(words).encode()))):
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                write(f)
+            os.replace(tmp_path, path)
+
+    def add(self, words):
+        """Make sure every word in ``words`` is in the on-disk cache.
+
+        Only touches the full gensim model if at least one word is missing.
+        Raises ``KeyError`` for words the full model does not know either.
+        """
+        missing = list(dict.fromkeys(w for w in words if w not in self._index))
+        if not missing:
+            return
+        full_model = self._load_full_model()
+        new_vectors = np.stack([full_model[w] for w in missing]).astype(np.float32)
+        if self._vectors is not None:
+            new_vectors = np.concatenate([np.asarray(self._vectors), new_vectors], axis=0)
+        self._write(self._words + missing, new_vectors)
+        self._open()
+
+    @property
+    def vector_size(self):
+        if self._vectors is not None:
+            return self._vectors.shape[1]
+        return self._load_full_model().vector_size
+
+    def __contains__(self, word):
+        """True if ``word`` is already cached (does not consult the full model)."""
+        return word in self._index
+
+    def __len__(self):
+        return len(self._words)
+
+    def __getitem__(self, word):
+        if word not in self._index:
+            self.add([word])
+        return np.array(self._vectors[self._index[word]])
+
+
+def load_word_vectors(words=(), model_name=DEFAULT_MODEL, cache_dir=DEFAULT_CACHE_DIR):
+    """Open the word-vector cache, extracting ``words`` (the allow-list) if needed.
+
+    On a warm cache this only memory-maps a few kilobytes; the full gensim
+    model is loaded only when some word of the allow-list is not cached yet.
+    """
+    store = WordVectorStore(model_name=model_name, cache_dir=cache_dir)
+    store.add(words)
+    return store
@@ -0,0 +1,36 @@
+"""The compiled training step traces into whole graphs."""
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from cada_vqvae.data import TensorBatchLoader
+from cada_vqvae.distributed import SyntheticImages
+from cada_vqvae.embeddings import FASHION_MNIST_CLASSES, ClassEmbeddingTable
+from cada_vqvae.losses import CADALoss
+from cada_vqvae.models import CADA_VAE
+from cada_vqvae.trainer import Trainer
+
+
+@pytest.mark.parametrize("criterion", [None, CADALoss(cross_reconstruction=True)], ids=["loss_fn", "CADALoss"])
+def test_compiled_steps_have_no_graph_breaks(criterion):
+    from torch._dynamo.utils import counters
+
+    torch._dynamo.reset()
+    counters.clear()
+    torch.manual_seed(0)
+    model = CADA_VAE(20, 64, 100)
+    rng = np.random.default_rng(0)
+    class_embeddings = ClassEmbeddingTable(
+        FASHION_MNIST_CLASSES, {word: rng.standard_normal(100).astype(np.float32) for word in FASHION_MNIST_CLASSES})
+    trainer = Trainer(model, torch.optim.Adam(model.parameters()), class_embeddings, criterion=criterion,
+                      device="cpu", compile=True, log_interval=0, log_fn=lambda line: None)
+    loader = TensorBatchLoader(SyntheticImages(128), batch_size=16, shuffle=True)
+
+    trainer.train_epoch(loader)
+    trainer.evaluate(loader)
+
+    assert not counters["graph_break"], dict(counters["graph_break"])
+    # One graph for training and one for evaluation
+    assert counters["stats"]["unique_graphs"] <= 2
@@ -0,0 +1,22 @@
+"""Rank splits of ``TensorBatchLoader``."""
+
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from cada_vqvae.data import SharedImages, TensorBatchLoader
+
+
+def _targets(loader):
+    return [t for _, targets in loader for t in targets.tolist()]
+
+
+def test_unpadded_rank_split_covers_every_sample_once():
+    dataset = SharedImages(torch.zeros(11, 2, 2, dtype=torch.uint8), torch.arange(11))
+    shares = [_targets(TensorBatchLoader(dataset, batch_size=4, rank=rank, world_size=3, pad=False))
+              for rank in range(3)]
+    assert sorted(t for share in shares for t in share) == list(range(11))
+    assert [len(share) for share in shares] == [4, 4, 3]
+
+    padded = [_targets(TensorBatchLoader(dataset, batch_size=4, rank=rank, world_size=3)) for rank in range(3)]
+    assert [len(share) for share in padded] == [4, 4, 4]
@@ -0,0 +1,72 @@
+"""A run resumed from a mid-epoch checkpoint matches the uninterrupted run exactly."""
+
+import copy
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from cada_vqvae.checkpoint import snapshot_to_cpu
+from cada_vqvae.data import TensorBatchLoader
+from cada_vqvae.distributed import SyntheticImages
+from cada_vqvae.embeddings import FASHION_MNIST_CLASSES, ClassEmbeddingTable
+from cada_vqvae.models import CADA_VAE
+from cada_vqvae.trainer import Trainer
+
+
+class CaptureAt:
+    """Stands in for a ``CheckpointManager``: keeps a copy of the state at one step."""
+
+    def __init__(self, step):
+        self.step = step
+        self.state = None
+
+    def should_save(self, step):
+        return step == self.step
+
+    def save(self, state, step, metric=None):
+        if step == self.step:
+            self.state = copy.deepcopy(snapshot_to_cpu(state))
+
+    def report_metric(self, step, metric):
+        pass
+
+    def wait(self):
+        pass
+
+
+def _trainer(checkpoint_manager=None):
+    torch.manual_seed(0)
+    # Every unused code counts as dead right away, so codes are reset every other step
+    model = CADA_VAE(20, 16, 100, dead_code_threshold=0.99, reset_interval=2, recent_size=24)
+    rng = np.random.default_rng(0)
+    class_embeddings = ClassEmbeddingTable(
+        FASHION_MNIST_CLASSES, {word: rng.standard_normal(100).astype(np.float32) for word in FASHION_MNIST_CLASSES})
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+    return Trainer(model, optimizer, class_embeddings, device="cpu", log_interval=0, log_fn=lambda line: None,
+                   checkpoint_manager=checkpoint_manager)
+
+
+def _loaders():
+    train = TensorBatchLoader(SyntheticImages(96), batch_size=16, shuffle=True,
+                              generator=torch.Generator().manual_seed(0))
+    return train, TensorBatchLoader(SyntheticImages(32, seed=1), batch_size=16)
+
+
+def test_resume_with_dead_code_reset_matches_uninterrupted_run():
+    capture = CaptureAt(step=9)
+    uninterrupted = _trainer(capture)
+    uninterrupted.fit(*_loaders(), epochs=3)
+    assert capture.state is not None
+
+    resumed = _trainer()
+    resumed.load_state_dict(capture.state)
+    resumed.fit(*_loaders(), epochs=3)
+
+    expected = uninterrupted.model.state_dict()
+    actual = resumed.model.state_dict()
+    assert expected.keys() == actual.keys()
+    for key in expected:
+        assert torch.equal(expected[key], actual[key]), key
+    assert resumed.train_losses == uninterrupted.train_losses
@@ -0,0 +1,95 @@
+"""Sample-level splitting of a shard directory across DataLoader workers and ranks."""
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from torch.utils.data import DataLoader
+
+from cada_vqvae.shards import ShardedImageDataset, ShardWriter, collate_word_targets, load_word_targets
+
+
+def _write_shards(root, num_samples, shard_size):
+    # The first two pixels encode the sample index, so every sample can be identified
+    with ShardWriter(root, ["a", "b"], image_shape=(2, 2), shard_size=shard_size) as writer:
+        for i in range(num_samples):
+            writer.add(np.array([i % 256, i // 256, 0, 0], dtype=np.uint8), i % 2)
+
+
+def _sample_ids(loader):
+    ids = []
+    for images, _ in loader:
+        pixels = (images * 255).round().long()
+        ids += (pixels[:, 0] + 256 * pixels[:, 1]).tolist()
+    return ids
+
+
+@pytest.mark.parametrize("shuffle", [True, False])
+def test_single_shard_is_split_across_two_workers_and_two_ranks(tmp_path, shuffle):
+    # One shard only, as with the default shard size on FashionMNIST-sized data
+    _write_shards(str(tmp_path), 1001, shard_size=65536)
+
+    per_rank = []
+    for rank in range(2):
+        dataset = ShardedImageDataset(str(tmp_path), shuffle=shuffle, shuffle_buffer=64, chunk_size=64,
+                                      rank=rank, world_size=2)
+        assert dataset.num_samples == 1001 and len(dataset) == 500
+        loader = DataLoader(dataset, batch_size=50, num_workers=2)
+        per_rank.append(_sample_ids(loader))
+
+    # Every rank runs the same number of steps, without overlap
+    assert len(per_rank[0]) == len(per_rank[1]) == 500
+    assert len(set(per_rank[0]) | set(per_rank[1])) == 1000
+    for rank in range(2):
+        dataset = ShardedImageDataset(str(tmp_path), shuffle=shuffle, chunk_size=64, rank=rank, world_size=2)
+        workers = [[] for _ in range(2)]
+        for i, (_, label) in enumerate(DataLoader(dataset, batch_size=None, num_workers=2)):
+            # DataLoader takes one sample from each worker in turn
+            workers[i % 2].append(label)
+        assert all(len(worker) == 250 for worker in workers)
+
+
+def test_word_targets_follow_the_shard_vocabulary(tmp_path):
+    root = str(tmp_path)
+    with ShardWriter(root, ["cat", "dog", "cat"], image_shape=(2, 2), shard_size=4) as writer:
+        for label in [0, 1, 2, 1, 0]:
+            writer.add(np.zeros(4, dtype=np.uint8), label)
+
+    dataset = ShardedImageDataset(root, shuffle=False, return_words=True)
+    assert dataset.words == ["cat", "dog"]
+    _, words = next(iter(DataLoader(dataset, batch_size=5, collate_fn=collate_word_targets)))
+    assert words.tolist() == [0, 1, 0, 1, 0]
+
+    # Re-indexed into a larger vocabulary, e.g. the training shards'
+    val = load_word_targets(root, words=["bird", "dog", "cat"])
+    assert val.data.shape == (5, 2, 2)
+    assert val.targets.tolist() == [2, 1, 2, 1, 2]
+    with pytest.raises(ValueError):
+        load_word_targets(root, words=["dog"])
+
+
+def test_trainer_reshuffles_shards_every_epoch(tmp_path):
+    from cada_vqvae.embeddings import FASHION_MNIST_CLASSES, ClassEmbeddingTable
+    from cada_vqvae.models import CADA_VAE
+    from cada_vqvae.trainer import Trainer
+
+    root = str(tmp_path)
+    with ShardWriter(root, FASHION_MNIST_CLASSES, image_shape=(28, 28), shard_size=64) as writer:
+        for i in range(256):
+            writer.add(np.full(28 * 28, i % 256, dtype=np.uint8), i % 10)
+    dataset = ShardedImageDataset(root, shuffle=True, shuffle_buffer=16, chunk_size=8)
+
+    rng = np.random.default_rng(0)
+    class_embeddings = ClassEmbeddingTable(
+        FASHION_MNIST_CLASSES, {word: rng.standard_normal(100).astype(np.float32) for word in FASHION_MNIST_CLASSES})
+    model = CADA_VAE(20, 16, 100)
+    trainer = Trainer(model, torch.optim.Adam(model.parameters()), class_embeddings, device="cpu", log_interval=0,
+                      log_fn=lambda line: None)
+    orders = []
+    for epoch in range(2):
+        trainer.epoch = epoch
+        trainer.train_epoch(DataLoader(dataset, batch_size=32))
+        assert dataset.epoch == epoch
+        orders.append(_sample_ids(DataLoader(dataset, batch_size=32)))
+    assert orders[0] != orders[1]